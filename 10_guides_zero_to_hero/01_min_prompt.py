@@ -48,13 +48,22 @@ class SimpleLLM:
         self.total_tokens_used = 0
         self.total_requests = 0
         
+        # Load the tokenizer once; fall back to an estimate without tiktoken
+        try:
+            import tiktoken
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            self.encoding = None
+    
     def count_tokens(self, text: str) -> int:
         """
-        Count tokens in text using a very simple approximation.
-        In production, use the tokenizer specific to your model.
+        Count tokens in text using tiktoken's cl100k_base encoding.
+        Falls back to a rough approximation when tiktoken isn't installed.
         """
-        # This is an extremely rough approximation, use a proper tokenizer in practice
-        return len(text.split())
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        # Rough approximation: 1 token ≈ 4 chars in English
+        return len(text) // 4
     
     def generate(self, prompt: str) -> str:
         """
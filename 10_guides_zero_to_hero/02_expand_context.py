@@ -34,10 +34,12 @@ Let's first import the necessary libraries:
 import os
 import json
 import time
+import hashlib
 import tiktoken  # OpenAI's tokenizer
 import numpy as np
 import matplotlib.pyplot as plt
 from typing import Dict, List, Tuple, Any, Optional, Union
+from collections import OrderedDict
 
 # Load environment variables (you'll need to add your API key in a .env file)
 # For OpenAI API key
@@ -59,12 +61,28 @@ else:
 # Token counter setup
 tokenizer = tiktoken.encoding_for_model(MODEL) if USE_OPENAI else None
 
+# Token counts keyed by a hash of the text, least recently used evicted first
+TOKEN_COUNT_CACHE_SIZE = 4096
+_token_count_cache: "OrderedDict[bytes, int]" = OrderedDict()
+
 def count_tokens(text: str) -> int:
     """Count tokens in a string using the appropriate tokenizer."""
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    count = _token_count_cache.get(key)
+    if count is not None:
+        _token_count_cache.move_to_end(key)
+        return count
+    
     if tokenizer:
-        return len(tokenizer.encode(text))
-    # Fallback for non-OpenAI models (rough approximation)
-    return len(text.split()) * 1.3  # Rough approximation
+        count = len(tokenizer.encode(text, disallowed_special=()))
+    else:
+        # Fallback for non-OpenAI models (rough approximation: 1 token ≈ 4 chars)
+        count = len(text) // 4
+    
+    _token_count_cache[key] = count
+    if len(_token_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+        _token_count_cache.popitem(last=False)
+    return count
 
 def measure_latency(func, *args, **kwargs) -> Tuple[Any, float]:
     """Measure execution time of a function."""
@@ -726,6 +744,48 @@ evaluation_criteria = [
 # # Show quality scores for each configuration
 # for config, data in pruning_results.items():
 #     print(f"{config}: Quality = {data['quality']:.2f}, Tokens = {data['tokens']}")
+
+def allocate_context_layers(base_prompt: str, layers: Dict[str, str], utilities: Dict[str, float],
+                            max_tokens: int) -> Tuple[str, List[str]]:
+    """
+    Choose context layers under a token budget without any model calls.
+    
+    Each layer costs its token count and is worth its utility score; a 0/1
+    knapsack over the remaining budget picks the most valuable subset.
+    
+    Args:
+        base_prompt: Core instruction (always kept)
+        layers: Dictionary of context layer name -> content
+        utilities: Dictionary of context layer name -> utility score
+        max_tokens: Token budget for the whole prompt
+    
+    Returns:
+        Tuple of (prompt, names of dropped layers)
+    """
+    names = list(layers)
+    # Each layer also costs the "\n\n" separator in front of it
+    costs = [count_tokens(f"\n\n{layers[name]}") for name in names]
+    capacity = max(0, max_tokens - count_tokens(base_prompt))
+    
+    # best[c] = highest utility reachable with c tokens; chosen[c] = layers used
+    best = [0.0] * (capacity + 1)
+    chosen = [[] for _ in range(capacity + 1)]
+    for index, (name, cost) in enumerate(zip(names, costs)):
+        utility = utilities.get(name, 1.0)
+        for c in range(capacity, cost - 1, -1):
+            if best[c - cost] + utility > best[c]:
+                best[c] = best[c - cost] + utility
+                chosen[c] = chosen[c - cost] + [index]
+    
+    kept = set(chosen[capacity])
+    prompt = "\n\n".join([base_prompt] + [layers[names[i]] for i in sorted(kept)])
+    dropped = [name for i, name in enumerate(names) if i not in kept]
+    return prompt, dropped
+
+# Budget-based selection runs instantly, no LLM calls needed
+layer_utilities = {"role": 2.0, "audience": 3.0, "structure": 3.0, "style": 2.0, "unnecessary": 0.1}
+budgeted_prompt, dropped_layers = allocate_context_layers(pruning_test_prompt, pruning_layers, layer_utilities, max_tokens=120)
+print(f"Budgeted prompt: {count_tokens(budgeted_prompt)} tokens, dropped layers: {dropped_layers}")
 ```
 
 ## 9. Context Expansion with Retrieval
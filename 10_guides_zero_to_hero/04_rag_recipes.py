@@ -28,10 +28,18 @@ import os
 import re
 import json
 import time
+import random
+import hashlib
 import numpy as np
+from array import array
 import logging
+import sqlite3
+import threading
 import tiktoken
 from typing import Dict, List, Tuple, Any, Optional, Union, Callable, TypeVar
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
 from dataclasses import dataclass
 import matplotlib.pyplot as plt
 from IPython.display import display, Markdown, HTML
@@ -85,9 +93,15 @@ DEFAULT_MODEL = "gpt-3.5-turbo"
 DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MAX_TOKENS = 500
+MAX_RETRIES = 5
 DEFAULT_CHUNK_SIZE = 1000
 DEFAULT_CHUNK_OVERLAP = 200
 DEFAULT_TOP_K = 3
+DEFAULT_SEARCH_BLOCK_SIZE = 4096
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_BATCH_TOKENS = 64000
+EMBEDDING_CONCURRENCY = 4
+EMBEDDING_RETRY_DELAY = 0.5
 
 
 # Basic Data Structures
@@ -115,13 +129,20 @@ class Document:
 # Helper Functions
 # ===============
 
-def setup_client(api_key=None, model=DEFAULT_MODEL):
+# Clients by (api_key, base_url), so repeated setup_client() calls share one connection pool
+_clients: Dict[Tuple[Optional[str], Optional[str]], Any] = {}
+
+
+def setup_client(api_key=None, model=DEFAULT_MODEL, base_url=None):
     """
     Set up the API client for LLM interactions.
+    Clients are created once and reused; the SDK retries rate-limit and
+    server errors with jittered exponential backoff.
 
     Args:
         api_key: API key (if None, will look for OPENAI_API_KEY in env)
         model: Model name to use
+        base_url: Alternative API endpoint, such as a local stub server
 
     Returns:
         tuple: (client, model_name)
@@ -132,13 +153,39 @@ def setup_client(api_key=None, model=DEFAULT_MODEL):
             logger.warning("No API key found. Set OPENAI_API_KEY env var or pass api_key param.")
     
     if OPENAI_AVAILABLE:
-        client = OpenAI(api_key=api_key)
-        return client, model
+        key = (api_key, base_url)
+        if key not in _clients:
+            _clients[key] = OpenAI(api_key=api_key, base_url=base_url, max_retries=MAX_RETRIES)
+        return _clients[key], model
     else:
         logger.error("OpenAI package required. Install with: pip install openai")
         return None, model
 
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL):
+    """
+    Load the tiktoken encoding for a model once and reuse it.
+    
+    Args:
+        model: Model name to use for tokenization
+    
+    Returns:
+        tiktoken Encoding, or None if tiktoken doesn't support the model
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # Fallback for when tiktoken doesn't support the model
+        logger.warning(f"Could not use tiktoken for {model}: {e}")
+        return None
+
+
+# Token counts keyed by (model, hash of text), least recently used evicted first
+TOKEN_COUNT_CACHE_SIZE = 4096
+_token_count_cache: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+
+
 def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     """
     Count tokens in text string using the appropriate tokenizer.
@@ -150,14 +197,217 @@ def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     Returns:
         int: Token count
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except Exception as e:
-        # Fallback for when tiktoken doesn't support the model
-        logger.warning(f"Could not use tiktoken for {model}: {e}")
-        # Rough approximation: 1 token ≈ 4 chars in English
-        return len(text) // 4
+    return count_tokens_batch([text], model)[0]
+
+
+def count_tokens_batch(texts: List[str], model: str = DEFAULT_MODEL) -> List[int]:
+    """
+    Count tokens for several strings, encoding only those not already cached.
+    
+    Args:
+        texts: Texts to tokenize
+        model: Model name to use for tokenization
+    
+    Returns:
+        list: Token count per text
+    """
+    counts = []
+    missing = {}
+    for i, text in enumerate(texts):
+        key = (model, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        count = _token_count_cache.get(key)
+        if count is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            _token_count_cache.move_to_end(key)
+        counts.append(count)
+    
+    if missing:
+        pending = [texts[positions[0]] for positions in missing.values()]
+        encoding = get_encoding(model)
+        if encoding is not None:
+            new_counts = [len(tokens) for tokens in encoding.encode_batch(pending, disallowed_special=())]
+        else:
+            # Rough approximation: 1 token ≈ 4 chars in English
+            new_counts = [len(text) // 4 for text in pending]
+        for (key, positions), count in zip(missing.items(), new_counts):
+            for i in positions:
+                counts[i] = count
+            _token_count_cache[key] = count
+        while len(_token_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
+    
+    return counts
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings keyed by (model, sha256 of text).
+    
+    Recent vectors live in an in-memory LRU; with a path, every vector is also
+    stored as a float32 blob in a SQLite file, so re-adding a corpus or
+    restarting a process does not pay for the same embeddings twice.
+    """
+    
+    def __init__(self, max_size: int = 4096, path: Optional[str] = None):
+        """
+        Initialize the embedding cache.
+        
+        Args:
+            max_size: Maximum number of vectors kept in memory
+            path: SQLite file for the on-disk tier (if None, memory only)
+        """
+        self.max_size = max_size
+        self.path = path
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, digest BLOB NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, digest))"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def digest(text: str) -> bytes:
+        """SHA-256 digest of the text, the content half of a cache key."""
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+    
+    def _remember(self, key: Tuple[str, bytes], vector: np.ndarray) -> None:
+        """Insert a vector into the in-memory tier, evicting the least recently used."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached embeddings for several texts.
+        
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+        
+        Returns:
+            list: Embedding per text, or None where the text is not cached
+        """
+        keys = [(model, self.digest(text)) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        
+        with self._lock:
+            missing = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._memory.move_to_end(key)
+                    vectors[i] = vector
+                    self.memory_hits += 1
+            
+            if missing and self._db is not None:
+                digests = [key[1] for key in missing]
+                for start in range(0, len(digests), 500):
+                    chunk = digests[start:start + 500]
+                    rows = self._db.execute(
+                        "SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN "
+                        f"({', '.join('?' * len(chunk))})",
+                        [model, *chunk]
+                    ).fetchall()
+                    for digest, blob in rows:
+                        key = (model, bytes(digest))
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        for i in missing.pop(key):
+                            vectors[i] = vector
+                            self.disk_hits += 1
+            
+            self.misses += sum(len(positions) for positions in missing.values())
+        
+        return [None if vector is None else vector.tolist() for vector in vectors]
+    
+    def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        """
+        Store embeddings for several texts.
+        
+        Args:
+            model: Embedding model name
+            texts: Texts that were embedded
+            embeddings: Embedding per text
+        """
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = (model, self.digest(text))
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((model, key[1], vector.tobytes()))
+            
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, digest, vector) VALUES (?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+    
+    def clear(self) -> None:
+        """Remove every cached embedding from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+    
+    def close(self) -> None:
+        """Close the on-disk tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def cache_info(self) -> Dict[str, Any]:
+        """
+        Get hit and miss counts for the cache.
+        
+        Returns:
+            dict: Hit counts per tier, misses, and current in-memory size
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_size": len(self._memory),
+                "path": self.path
+            }
+
+
+# Shared by generate_embedding and extract_document_batch_embeddings
+_embedding_cache: Optional[EmbeddingCache] = EmbeddingCache()
+
+
+def set_embedding_cache(cache: Optional[EmbeddingCache]) -> None:
+    """
+    Replace the embedding cache used by the embedding helpers.
+    
+    Args:
+        cache: EmbeddingCache to use, e.g. EmbeddingCache(path="embeddings.db"),
+            or None to disable caching
+    """
+    global _embedding_cache
+    _embedding_cache = cache
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get the embedding cache used by the embedding helpers."""
+    return _embedding_cache
 
 
 def generate_embedding(
@@ -176,6 +426,12 @@ def generate_embedding(
     Returns:
         list: Embedding vector
     """
+    cache = _embedding_cache
+    if cache is not None:
+        cached = cache.get_many(model, [text])[0]
+        if cached is not None:
+            return cached
+    
     if client is None:
         client, _ = setup_client()
         if client is None:
@@ -187,7 +443,10 @@ def generate_embedding(
             model=model,
             input=[text]
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        if cache is not None:
+            cache.set_many(model, [text], [embedding])
+        return embedding
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         # Return dummy embedding on error
@@ -347,9 +606,8 @@ def text_to_chunks(
         return []
     
     # Get tokenizer
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except:
+    encoding = get_encoding(model)
+    if encoding is None:
         logger.warning(f"Could not get tokenizer for {model}. Using approximate chunking.")
         return _approximate_text_to_chunks(text, chunk_size, chunk_overlap)
     
@@ -453,20 +711,123 @@ def _approximate_text_to_chunks(
     return chunks
 
 
+def _token_batches(
+    texts: List[str],
+    token_counts: List[int],
+    max_batch_tokens: int,
+    max_batch_size: int
+) -> List[List[str]]:
+    """
+    Group texts into batches bounded by total tokens and number of inputs.
+    
+    Args:
+        texts: Texts to group, in order
+        token_counts: Token count per text
+        max_batch_tokens: Maximum total tokens per batch
+        max_batch_size: Maximum number of texts per batch
+    
+    Returns:
+        list: Batches of texts (a text larger than max_batch_tokens gets its own batch)
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for text, tokens in zip(texts, token_counts):
+        if batch and (batch_tokens + tokens > max_batch_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embed_texts(client, model: str, texts: List[str], delay: float = 0.0) -> List[List[float]]:
+    """
+    Embed one batch of texts, raising if the response does not cover every text.
+    
+    Args:
+        client: API client
+        model: Embedding model to use
+        texts: Texts to embed
+        delay: Seconds to wait before the request (backoff for retries)
+    
+    Returns:
+        list: Embedding per text
+    """
+    if delay > 0:
+        time.sleep(delay)
+    response = client.embeddings.create(model=model, input=texts)
+    if len(response.data) != len(texts):
+        raise ValueError(f"Expected {len(texts)} embeddings, got {len(response.data)}")
+    return [item.embedding for item in response.data]
+
+
+def _embedding_error_action(error: Exception) -> str:
+    """
+    Decide how to handle a failed embedding request.
+    
+    Args:
+        error: Exception raised by the request
+    
+    Returns:
+        str: "retry" to resend the same batch after a backoff, "split" to
+        resend it as two halves, or "fail" to give up on it
+    """
+    status = None
+    for source in (error, getattr(error, "response", None)):
+        value = getattr(source, "status_code", None)
+        if isinstance(value, int):
+            status = value
+            break
+    
+    # Rate limits, timeouts and server errors say nothing about the inputs
+    if status in (408, 409, 429) or (status is not None and status >= 500):
+        return "retry"
+    # Rejected inputs, such as a batch over the token limit, may succeed in smaller pieces
+    if status in (400, 413, 422):
+        return "split"
+    if status is not None:
+        return "fail"  # Authentication, permission and other client errors
+    # No status (a dropped connection, or an error whose text merely mentions
+    # tokens): the inputs were never judged, so only resend them
+    return "retry"
+
+
 def extract_document_batch_embeddings(
     documents: List[Document],
     client=None,
     model: str = DEFAULT_EMBEDDING_MODEL,
-    batch_size: int = 10
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+    max_concurrency: int = EMBEDDING_CONCURRENCY,
+    max_retries: int = 3,
+    checkpoint_path: Optional[str] = None,
+    retry_delay: float = EMBEDDING_RETRY_DELAY
 ) -> List[Document]:
     """
     Generate embeddings for a batch of documents efficiently.
     
+    Texts are grouped into batches by token count and several batches are
+    kept in flight at once. Rate limits, timeouts and server errors resend
+    the whole batch after a jittered exponential backoff, up to max_retries
+    times. A batch the API rejects, for example for having too many tokens,
+    is split in half instead, so one bad input cannot sink its neighbours.
+    
+    With checkpoint_path, each completed batch is written to a SQLite
+    EmbeddingCache file. Running the same ingestion again after an
+    interruption restores those embeddings and only embeds the rest.
+    
     Args:
         documents: List of Document objects to embed
         client: API client (if None, will create one)
         model: Embedding model to use
-        batch_size: Number of documents to embed in each API call
+        batch_size: Maximum number of texts in each API call
+        max_batch_tokens: Maximum total tokens in each API call
+        max_concurrency: Maximum number of API calls in flight
+        max_retries: Retries for a batch before giving up on it
+        checkpoint_path: SQLite file recording progress (optional)
+        retry_delay: Backoff ceiling for the first retry, in seconds
         
     Returns:
         list: Updated Document objects with embeddings
@@ -474,36 +835,206 @@ def extract_document_batch_embeddings(
     if not documents:
         return []
     
-    if client is None:
-        client, _ = setup_client()
-        if client is None:
-            logger.error("No API client available for embeddings")
+    # Fill cached embeddings first; only distinct uncached texts go to the API
+    cache = _embedding_cache
+    cached = cache.get_many(model, [doc.content for doc in documents]) if cache is not None else [None] * len(documents)
+    pending: Dict[str, List[Document]] = {}
+    for doc, embedding in zip(documents, cached):
+        if embedding is not None:
+            doc.embedding = embedding
+        else:
+            pending.setdefault(doc.content, []).append(doc)
+    
+    checkpoint = EmbeddingCache(max_size=0, path=checkpoint_path) if checkpoint_path else None
+    try:
+        if pending and checkpoint is not None:
+            restored_texts, restored_embeddings = [], []
+            for text, embedding in zip(list(pending), checkpoint.get_many(model, list(pending))):
+                if embedding is not None:
+                    for doc in pending.pop(text):
+                        doc.embedding = embedding
+                    restored_texts.append(text)
+                    restored_embeddings.append(embedding)
+            if restored_texts:
+                logger.info(f"Restored {len(restored_texts)} embeddings from checkpoint {checkpoint_path}")
+                if cache is not None:
+                    cache.set_many(model, restored_texts, restored_embeddings)
+    
+        if not pending:
             return documents
     
-    # Process in batches
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i:i+batch_size]
-        batch_texts = [doc.content for doc in batch]
-        
-        try:
-            # Generate embeddings for the batch
-            response = client.embeddings.create(
-                model=model,
-                input=batch_texts
+        if client is None:
+            client, _ = setup_client()
+            if client is None:
+                logger.error("No API client available for embeddings")
+                return documents
+        
+        texts = list(pending)
+        batches = deque(
+            (batch, 0) for batch in _token_batches(
+                texts,
+                count_tokens_batch(texts, model),
+                max_batch_tokens,
+                batch_size
             )
+        )
             
-            # Update documents with embeddings
-            for j, doc in enumerate(batch):
-                if j < len(response.data):
-                    doc.embedding = response.data[j].embedding
-                else:
-                    logger.warning(f"Missing embedding for document {i+j}")
-        except Exception as e:
-            logger.error(f"Error generating batch embeddings: {e}")
+        embedded, failed, next_report = 0, 0, 0.1
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            running = {}
+            while batches or running:
+                while batches and len(running) < max_concurrency:
+                    batch, attempt = batches.popleft()
+                    delay = random.uniform(0, min(30.0, retry_delay * 2 ** (attempt - 1))) if attempt else 0.0
+                    running[executor.submit(_embed_texts, client, model, batch, delay)] = (batch, attempt)
+            
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch, attempt = running.pop(future)
+                    try:
+                        embeddings = future.result()
+                    except Exception as e:
+                        action = _embedding_error_action(e)
+                        if action == "split" and len(batch) > 1:
+                            # Retry as two halves, ahead of the untouched batches
+                            half = len(batch) // 2
+                            logger.warning(f"Embedding batch of {len(batch)} rejected, retrying as two halves: {e}")
+                            batches.appendleft((batch[half:], 0))
+                            batches.appendleft((batch[:half], 0))
+                        elif action == "retry" and attempt < max_retries:
+                            logger.warning(f"Embedding batch of {len(batch)} failed, retrying: {e}")
+                            batches.append((batch, attempt + 1))
+                        else:
+                            logger.error(f"Could not embed {len(batch)} texts after {attempt + 1} attempts: {e}")
+                            failed += len(batch)
+                        continue
+                    
+                    # Update documents with embeddings
+                    for text, embedding in zip(batch, embeddings):
+                        for doc in pending[text]:
+                            doc.embedding = embedding
+                    if cache is not None:
+                        cache.set_many(model, batch, embeddings)
+                    if checkpoint is not None:
+                        checkpoint.set_many(model, batch, embeddings)
+                    
+                    embedded += len(batch)
+                    if embedded >= next_report * len(texts):
+                        logger.info(f"Embedded {embedded}/{len(texts)} texts")
+                        next_report = embedded / len(texts) + 0.1
+        
+        if failed:
+            logger.error(f"{failed} of {len(texts)} texts could not be embedded")
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
     
     return documents
 
 
+def example_embedding_retries():
+    """
+    Run extract_document_batch_embeddings against a local fake embeddings server.
+    
+    The server rate limits its first two requests and rejects any request
+    containing an oversized text, like the API does for inputs over the
+    token limit. Rate-limited batches must be resent whole and only the
+    rejected batch may be split, so the request count is fixed.
+    
+    Returns:
+        dict: Request and embedding counts
+    """
+    import http.client
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from types import SimpleNamespace
+    from urllib.parse import urlparse
+    
+    class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+        lock = threading.Lock()
+        requests = 0
+        
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with FakeEmbeddingsHandler.lock:
+                FakeEmbeddingsHandler.requests += 1
+                request_number = FakeEmbeddingsHandler.requests
+            
+            if request_number <= 2:
+                status, body = 429, {"error": {"message": "Rate limit reached"}}
+            elif any("OVERSIZED" in text for text in payload["input"]):
+                status, body = 400, {"error": {"message": "Input exceeds the maximum number of tokens"}}
+            else:
+                status, body = 200, {"data": [
+                    {"index": i, "embedding": [float(len(text)), float(i)]}
+                    for i, text in enumerate(payload["input"])
+                ]}
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    class FakeAPIError(Exception):
+        def __init__(self, status_code: int, message: str):
+            super().__init__(f"Error code: {status_code} - {message}")
+            self.status_code = status_code
+    
+    class FakeEmbeddingsClient:
+        """Just enough of the OpenAI client for embeddings.create()."""
+        
+        def __init__(self, base_url: str):
+            self.url = urlparse(base_url)
+            self.embeddings = self
+        
+        def create(self, model: str, input: List[str]) -> Any:
+            connection = http.client.HTTPConnection(self.url.hostname, self.url.port)
+            try:
+                connection.request("POST", "/v1/embeddings", json.dumps({"model": model, "input": input}),
+                                   {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                body = json.loads(response.read())
+            finally:
+                connection.close()
+            if response.status != 200:
+                raise FakeAPIError(response.status, body["error"]["message"])
+            return SimpleNamespace(data=[SimpleNamespace(**item) for item in body["data"]])
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEmbeddingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = FakeEmbeddingsClient(f"http://127.0.0.1:{server.server_port}")
+    
+    # Four batches of four; the second batch holds the oversized text
+    documents = [Document(content=f"Document {i} about retrieval") for i in range(16)]
+    documents[5].content = "OVERSIZED document"
+    
+    previous_cache = get_embedding_cache()
+    set_embedding_cache(None)
+    try:
+        extract_document_batch_embeddings(
+            documents, client=client, batch_size=4, max_concurrency=4, retry_delay=0.01
+        )
+    finally:
+        set_embedding_cache(previous_cache)
+        server.shutdown()
+        server.server_close()
+    
+    embedded = sum(doc.embedding is not None for doc in documents)
+    stats = {"requests": FakeEmbeddingsHandler.requests, "embedded": embedded}
+    print(f"{embedded}/{len(documents)} documents embedded with {stats['requests']} requests")
+    
+    # 4 batches, 2 rate-limited retries, and splitting the rejected batch
+    # costs 2 requests per level (4 -> 2 + 2 -> 1 + 1)
+    assert stats["requests"] == 4 + 2 + 4, stats
+    assert documents[5].embedding is None
+    assert embedded == len(documents) - 1
+    assert all(doc.embedding[0] == len(doc.content) for doc in documents if doc.embedding is not None)
+    return stats
+
+
 def similarity_search(
     query_embedding: List[float],
     documents: List[Document],
@@ -531,26 +1062,92 @@ def similarity_search(
         logger.warning("No documents with embeddings found")
         return []
     
-    # Convert embeddings to numpy arrays
-    query_embedding_np = np.array(query_embedding).reshape(1, -1)
-    doc_embeddings = np.array([doc.embedding for doc in docs_with_embeddings])
+    doc_embeddings = np.array([doc.embedding for doc in docs_with_embeddings], dtype=np.float32)
+    indices, scores = top_k_similarity([query_embedding], doc_embeddings, top_k)
     
-    # Calculate cosine similarities
-    if SKLEARN_AVAILABLE:
-        similarities = cosine_similarity(query_embedding_np, doc_embeddings)[0]
-    else:
-        # Fallback to manual cosine similarity calculation
-        norm_query = np.linalg.norm(query_embedding_np)
-        norm_docs = np.linalg.norm(doc_embeddings, axis=1)
-        dot_products = np.dot(query_embedding_np, doc_embeddings.T)[0]
-        similarities = dot_products / (norm_query * norm_docs)
+    return [
+        (docs_with_embeddings[i], float(score))
+        for i, score in zip(indices[0], scores[0])
+    ]
     
-    # Create (document, similarity) pairs
-    doc_sim_pairs = list(zip(docs_with_embeddings, similarities))
     
-    # Sort by similarity (descending) and take top_k
-    sorted_pairs = sorted(doc_sim_pairs, key=lambda x: x[1], reverse=True)
-    return sorted_pairs[:top_k]
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row of a float32 matrix; all-zero rows are left as zeros.
+    
+    Args:
+        embeddings: Matrix with one embedding per row
+    
+    Returns:
+        np.ndarray: Normalized float32 copy of the matrix
+    """
+    embeddings = np.array(embeddings, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    embeddings /= norms
+    return embeddings
+
+
+def top_k_similarity(
+    query_embeddings: Union[np.ndarray, List[List[float]]],
+    doc_embeddings: Union[np.ndarray, List[List[float]]],
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_SEARCH_BLOCK_SIZE,
+    normalized: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the top_k most similar documents for many queries at once.
+    
+    Documents are scored one block at a time: each block is a single
+    (queries x block) matmul, and argpartition keeps only the running top_k
+    per query. Memory stays bounded by the block size however large the
+    corpus is, and a memory-mapped matrix is read block by block.
+    
+    Args:
+        query_embeddings: Matrix with one query embedding per row
+        doc_embeddings: Matrix with one document embedding per row
+        top_k: Number of results per query
+        block_size: Number of documents scored per matmul
+        normalized: Whether both matrices already have unit-length rows
+    
+    Returns:
+        tuple: (indices, scores) arrays of shape (num_queries, k), best first,
+            where k is top_k capped at the number of documents
+    """
+    queries = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+    if not normalized:
+        queries = normalize_rows(queries)
+    
+    num_docs = len(doc_embeddings)
+    k = min(top_k, num_docs)
+    best_indices = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    if k <= 0:
+        return best_indices, best_scores
+    
+    for start in range(0, num_docs, block_size):
+        block = np.asarray(doc_embeddings[start:start + block_size], dtype=np.float32)
+        if not normalized:
+            block = normalize_rows(block)
+        
+        scores = queries @ block.T
+        indices = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+        
+        # Merge the block into the running top_k for every query
+        scores = np.concatenate([best_scores, scores], axis=1)
+        indices = np.concatenate([best_indices, indices], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            indices = np.take_along_axis(indices, keep, axis=1)
+        best_scores, best_indices = scores, indices
+    
+    # Only the k survivors per query get sorted
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best_indices, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1)
+    )
 
 
 def create_faiss_index(documents: List[Document]) -> Any:
@@ -639,6 +1236,333 @@ def faiss_similarity_search(
     return results
 
 
+# Embedding Store
+# ===============
+
+class EmbeddingStore:
+    """
+    Document embeddings kept in one float32 matrix instead of per-Document lists.
+    
+    Rows are L2-normalized once at insert time, so queries only need a
+    blocked matmul and an argpartition over the scores (see top_k_similarity).
+    Capacity doubles as documents are added, and the matrix can be saved to
+    a .npy file and reopened memory-mapped by a restarted process.
+    """
+    
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024):
+        """
+        Initialize the embedding store.
+        
+        Args:
+            dim: Embedding dimension (if None, taken from the first insert)
+            capacity: Number of rows to preallocate
+        """
+        self.dim = dim
+        self.capacity = max(1, capacity)
+        self.size = 0
+        self.documents: List[Document] = []
+        self._matrix = None
+        self._stored = set()
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __contains__(self, document: Document) -> bool:
+        return id(document) in self._stored
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """Normalized embeddings of the stored documents, one row per document."""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:self.size]
+    
+    def _reserve(self, count: int) -> None:
+        """
+        Make room for count more rows, doubling capacity as needed.
+        
+        A memory-mapped matrix from load() is read-only, so the first
+        insert after loading copies it into a writable array.
+        """
+        needed = self.size + count
+        if self._matrix is not None and needed <= self.capacity and self._matrix.flags.writeable:
+            return
+        
+        while self.capacity < needed:
+            self.capacity *= 2
+        
+        matrix = np.empty((self.capacity, self.dim), dtype=np.float32)
+        if self._matrix is not None and self.size:
+            matrix[:self.size] = self._matrix[:self.size]
+        self._matrix = matrix
+    
+    def add(self, documents: List[Document]) -> int:
+        """
+        Add documents with embeddings to the store.
+        
+        Documents without an embedding or already in the store are skipped.
+        
+        Args:
+            documents: List of Document objects
+        
+        Returns:
+            int: Number of documents added
+        """
+        new_docs = [
+            doc for doc in documents
+            if doc.embedding is not None and id(doc) not in self._stored
+        ]
+        if not new_docs:
+            return 0
+        
+        # Normalize once so search only needs a dot product
+        embeddings = normalize_rows([doc.embedding for doc in new_docs])
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {embeddings.shape[1]}")
+        
+        self._reserve(len(new_docs))
+        self._matrix[self.size:self.size + len(new_docs)] = embeddings
+        self.size += len(new_docs)
+        
+        self.documents.extend(new_docs)
+        self._stored.update(id(doc) for doc in new_docs)
+        return len(new_docs)
+    
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = DEFAULT_TOP_K
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the stored documents most similar to a query embedding.
+        
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+        
+        Returns:
+            list: List of (document, cosine_similarity) tuples, best first
+        """
+        return self.search_batch([query_embedding], top_k)[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: Union[np.ndarray, List[List[float]]],
+        top_k: int = DEFAULT_TOP_K,
+        block_size: int = DEFAULT_SEARCH_BLOCK_SIZE
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Find the most similar stored documents for many queries at once.
+        
+        Args:
+            query_embeddings: Matrix with one query embedding per row
+            top_k: Number of results per query
+            block_size: Number of stored rows scored per matmul
+        
+        Returns:
+            list: For each query, a list of (document, cosine_similarity) tuples
+        """
+        queries = normalize_rows(query_embeddings)
+        if self.size == 0 or top_k <= 0:
+            return [[] for _ in queries]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected queries of dimension {self.dim}, got {queries.shape[1]}")
+        
+        indices, scores = top_k_similarity(
+            queries, self.matrix, top_k,
+            block_size=block_size,
+            normalized=True
+        )
+        
+        return [
+            [(self.documents[i], float(score)) for i, score in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+    
+    @staticmethod
+    def _paths(path: str) -> Tuple[str, str]:
+        """Matrix and metadata file paths for a store saved at path."""
+        base = path[:-4] if path.endswith(".npy") else path
+        return base + ".npy", base + ".json"
+    
+    def save(self, path: str) -> None:
+        """
+        Save the store to disk.
+        
+        The embeddings go to <path>.npy and the document contents and
+        metadata to <path>.json. Both are written to temporary files first
+        and then renamed, so a crash never leaves a half-written store.
+        
+        Args:
+            path: Base path for the store files
+        """
+        matrix_path, meta_path = self._paths(path)
+        
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, self.matrix)
+        
+        meta = {
+            "dim": self.dim,
+            "documents": [
+                {"id": doc.id, "content": doc.content, "metadata": doc.metadata}
+                for doc in self.documents
+            ]
+        }
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(meta_path + ".tmp", meta_path)
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "EmbeddingStore":
+        """
+        Load a store saved with save().
+        
+        With the default mmap_mode the matrix stays on disk and pages are read
+        on demand, so a large store serves queries without loading it into RAM.
+        Loaded documents have no per-Document embedding lists.
+        
+        Args:
+            path: Base path the store was saved to
+            mmap_mode: numpy memory-map mode, or None to read into memory
+        
+        Returns:
+            EmbeddingStore: The loaded store
+        """
+        matrix_path, meta_path = cls._paths(path)
+        
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(matrix_path, mmap_mode=mmap_mode)
+        
+        store = cls(dim=meta["dim"], capacity=max(1, len(matrix)))
+        store.documents = [
+            Document(content=d["content"], metadata=d["metadata"], id=d["id"])
+            for d in meta["documents"]
+        ]
+        if len(store.documents) != len(matrix):
+            raise ValueError(f"Store at {path} has {len(matrix)} embeddings but {len(store.documents)} documents")
+        
+        store._matrix = matrix
+        store.size = len(matrix)
+        store._stored = {id(doc) for doc in store.documents}
+        return store
+
+
+# Keyword Index
+# =============
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring for keyword retrieval.
+    
+    Each term maps to compact postings: an array of document indices and an
+    array of term frequencies. Documents are added incrementally, and a
+    query only reads the postings of its own terms.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"\w+")
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize the index.
+        
+        Args:
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_lengths = array("I")
+        self.total_length = 0
+    
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+    
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """Split text into lowercase word tokens."""
+        return cls.TOKEN_PATTERN.findall(text.lower())
+    
+    def add(self, texts: List[str]) -> None:
+        """
+        Index texts; they get document indices following those already indexed.
+        
+        Args:
+            texts: Texts to index, in order
+        """
+        for text in texts:
+            doc_index = len(self.doc_lengths)
+            tokens = self.tokenize(text)
+            
+            term_counts: Dict[str, int] = {}
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+            
+            for term, count in term_counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array("I"), array("I"))
+                postings[0].append(doc_index)
+                postings[1].append(count)
+            
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+    
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Tuple[int, float]]:
+        """
+        Score documents against a query with BM25.
+        
+        Args:
+            query: Query string
+            top_k: Number of results to return
+        
+        Returns:
+            list: List of (document_index, bm25_score) tuples, best first,
+                covering only documents that contain a query term
+        """
+        num_docs = len(self.doc_lengths)
+        terms = set(self.tokenize(query))
+        if num_docs == 0 or top_k <= 0 or not terms:
+            return []
+        
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        avg_length = self.total_length / num_docs or 1.0
+        
+        # Score each posting, then sum per document over the matched documents
+        # only, so the cost follows the postings read rather than the corpus size
+        posting_docs, posting_scores = [], []
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            doc_indices = np.frombuffer(postings[0], dtype=np.uint32)
+            frequencies = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float64)
+            
+            doc_freq = len(doc_indices)
+            idf = np.log(1.0 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[doc_indices] / avg_length)
+            posting_docs.append(doc_indices)
+            posting_scores.append(idf * frequencies * (self.k1 + 1.0) / (frequencies + norm))
+        
+        if not posting_docs:
+            return []
+        candidates, positions = np.unique(np.concatenate(posting_docs), return_inverse=True)
+        scores = np.bincount(positions, weights=np.concatenate(posting_scores), minlength=len(candidates))
+        
+        # Candidates are in document order, so the stable sort breaks ties by index
+        best = np.arange(len(candidates))
+        if len(best) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+
 # RAG System Base Class
 # =====================
 
@@ -678,6 +1602,7 @@ class RAGSystem:
         self.verbose = verbose
         
         # Initialize document store
+        self.document_generation = 0
         self.documents = []
         
         # Initialize history and metrics tracking
@@ -691,6 +1616,18 @@ class RAGSystem:
             "queries": 0
         }
     
+    @property
+    def documents(self) -> List[Document]:
+        """Documents in the store."""
+        return self._documents
+    
+    @documents.setter
+    def documents(self, documents: List[Document]) -> None:
+        # Replacing the list, rather than extending it through add_documents,
+        # starts a new generation so indexes over the old list are rebuilt
+        self._documents = documents
+        self.document_generation += 1
+    
     def _log(self, message: str) -> None:
         """
         Log a message if verbose mode is enabled.
@@ -1024,6 +1961,9 @@ class SimpleRAG(RAGSystem):
         # Whether documents have been embedded
         self.documents_embedded = False
     
+        # Normalized embeddings of the documents, used for retrieval
+        self.store = EmbeddingStore()
+    
     def add_documents(self, documents: List[Document]) -> None:
         """
         Add documents to the document store and reset embedding flag.
@@ -1039,7 +1979,10 @@ class SimpleRAG(RAGSystem):
         if self.documents_embedded:
             return
         
-        docs_to_embed = [doc for doc in self.documents if doc.embedding is None]
+        docs_to_embed = [
+            doc for doc in self.documents
+            if doc.embedding is None and doc not in self.store
+        ]
         
         if docs_to_embed:
             self._log(f"Generating embeddings for {len(docs_to_embed)} documents")
@@ -1049,6 +1992,29 @@ class SimpleRAG(RAGSystem):
                 model=self.embedding_model
             )
         
+        self.store.add(self.documents)
+        self.documents_embedded = True
+    
+    def save_store(self, path: str) -> None:
+        """
+        Save the embedded documents so another process can load them.
+        
+        Args:
+            path: Base path for the store files (see EmbeddingStore.save)
+        """
+        self._ensure_documents_embedded()
+        self.store.save(path)
+    
+    def load_store(self, path: str, mmap_mode: Optional[str] = "r") -> None:
+        """
+        Replace the document store with one saved by save_store().
+        
+        Args:
+            path: Base path the store was saved to
+            mmap_mode: numpy memory-map mode, or None to read into memory
+        """
+        self.store = EmbeddingStore.load(path, mmap_mode=mmap_mode)
+        self.documents = list(self.store.documents)
         self.documents_embedded = True
     
     def _retrieve(
@@ -1081,11 +2047,7 @@ class SimpleRAG(RAGSystem):
         )
         
         # Perform similarity search
-        results = similarity_search(
-            query_embedding,
-            self.documents,
-            top_k
-        )
+        results = self.store.search(query_embedding, top_k)
         
         return results
 
@@ -1203,12 +2165,8 @@ class ChunkedRAG(SimpleRAG):
                 top_k
             )
         else:
-            # Fall back to basic similarity search
-            results = similarity_search(
-                query_embedding,
-                self.documents,
-                top_k
-            )
+            # Fall back to the embedding store
+            results = self.store.search(query_embedding, top_k)
         
         return results
 
@@ -1234,6 +2192,21 @@ class HybridRAG(ChunkedRAG):
         self.keyword_weight = max(0.0, min(1.0, keyword_weight))
         self.embedding_weight = 1.0 - self.keyword_weight
     
+        # BM25 index over self.documents, kept in step by add_documents
+        self.keyword_index = BM25Index()
+        self.keyword_index_generation = self.document_generation
+    
+    def add_documents(self, documents: List[Document]) -> None:
+        """
+        Add documents to the store and index their chunks for keyword search.
+        
+        Args:
+            documents: List of Document objects to add
+        """
+        start = len(self.documents)
+        super().add_documents(documents)
+        self.keyword_index.add([doc.content for doc in self.documents[start:]])
+    
     def _keyword_search(
         self,
         query: str,
@@ -1241,7 +2214,7 @@ class HybridRAG(ChunkedRAG):
         top_k: int = DEFAULT_TOP_K
     ) -> List[Tuple[Document, float]]:
         """
-        Perform keyword search on documents.
+        Perform BM25 keyword search on documents.
         
         Args:
             query: Query string
@@ -1249,24 +2222,26 @@ class HybridRAG(ChunkedRAG):
             top_k: Number of results to return
             
         Returns:
-            list: List of (document, similarity_score) tuples
+            list: List of (document, similarity_score) tuples, with BM25 scores
+                divided by the best score so they fuse with cosine similarities
         """
-        # Simple keyword matching
-        query_terms = set(query.lower().split())
+        if documents is self.documents:
+            # Rebuild if the store was replaced, e.g. by load_store()
+            if self.keyword_index_generation != self.document_generation:
+                self.keyword_index = BM25Index()
+                self.keyword_index.add([doc.content for doc in self.documents])
+                self.keyword_index_generation = self.document_generation
+            index = self.keyword_index
+        else:
+            index = BM25Index()
+            index.add([doc.content for doc in documents])
         
-        results = []
-        for doc in documents:
-            content = doc.content.lower()
-            
-            # Count matching terms and calculate score
-            matches = sum(1 for term in query_terms if term in content)
-            score = matches / len(query_terms) if query_terms else 0.0
-            
-            results.append((doc, score))
+        hits = index.search(query, top_k)
+        if not hits:
+            return []
         
-        # Sort by score (descending) and take top_k
-        sorted_results = sorted(results, key=lambda x: x[1], reverse=True)
-        return sorted_results[:top_k]
+        best_score = hits[0][1]
+        return [(documents[i], score / best_score) for i, score in hits]
     
     def _retrieve(
         self,
@@ -35,6 +35,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from dataclasses import dataclass, field, asdict
 from typing import Dict, List, Tuple, Any, Optional, Union, Callable, TypeVar, Set
+from collections import OrderedDict
+from functools import lru_cache
 from IPython.display import display, Markdown, HTML, JSON
 
 # Configure logging
@@ -71,18 +73,26 @@ except ImportError:
 DEFAULT_MODEL = "gpt-3.5-turbo"
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MAX_TOKENS = 1000
+MAX_RETRIES = 5
 
 
 # Helper Functions
 # ===============
 
-def setup_client(api_key=None, model=DEFAULT_MODEL):
+# Clients by (api_key, base_url), so repeated setup_client() calls share one connection pool
+_clients: Dict[Tuple[Optional[str], Optional[str]], Any] = {}
+
+
+def setup_client(api_key=None, model=DEFAULT_MODEL, base_url=None):
     """
     Set up the API client for LLM interactions.
+    Clients are created once and reused; the SDK retries rate-limit and
+    server errors with jittered exponential backoff.
 
     Args:
         api_key: API key (if None, will look for OPENAI_API_KEY in env)
         model: Model name to use
+        base_url: Alternative API endpoint, such as a local stub server
 
     Returns:
         tuple: (client, model_name)
@@ -93,13 +103,39 @@ def setup_client(api_key=None, model=DEFAULT_MODEL):
             logger.warning("No API key found. Set OPENAI_API_KEY env var or pass api_key param.")
     
     if OPENAI_AVAILABLE:
-        client = OpenAI(api_key=api_key)
-        return client, model
+        key = (api_key, base_url)
+        if key not in _clients:
+            _clients[key] = OpenAI(api_key=api_key, base_url=base_url, max_retries=MAX_RETRIES)
+        return _clients[key], model
     else:
         logger.error("OpenAI package required. Install with: pip install openai")
         return None, model
 
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL):
+    """
+    Load the tiktoken encoding for a model once and reuse it.
+    
+    Args:
+        model: Model name to use for tokenization
+    
+    Returns:
+        tiktoken Encoding, or None if tiktoken doesn't support the model
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # Fallback for when tiktoken doesn't support the model
+        logger.warning(f"Could not use tiktoken for {model}: {e}")
+        return None
+
+
+# Token counts keyed by (model, hash of text), least recently used evicted first
+TOKEN_COUNT_CACHE_SIZE = 4096
+_token_count_cache: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+
+
 def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     """
     Count tokens in text string using the appropriate tokenizer.
@@ -111,14 +147,47 @@ def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     Returns:
         int: Token count
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except Exception as e:
-        # Fallback for when tiktoken doesn't support the model
-        logger.warning(f"Could not use tiktoken for {model}: {e}")
-        # Rough approximation: 1 token ≈ 4 chars in English
-        return len(text) // 4
+    return count_tokens_batch([text], model)[0]
+
+
+def count_tokens_batch(texts: List[str], model: str = DEFAULT_MODEL) -> List[int]:
+    """
+    Count tokens for several strings, encoding only those not already cached.
+    
+    Args:
+        texts: Texts to tokenize
+        model: Model name to use for tokenization
+    
+    Returns:
+        list: Token count per text
+    """
+    counts = []
+    missing = {}
+    for i, text in enumerate(texts):
+        key = (model, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        count = _token_count_cache.get(key)
+        if count is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            _token_count_cache.move_to_end(key)
+        counts.append(count)
+    
+    if missing:
+        pending = [texts[positions[0]] for positions in missing.values()]
+        encoding = get_encoding(model)
+        if encoding is not None:
+            new_counts = [len(tokens) for tokens in encoding.encode_batch(pending, disallowed_special=())]
+        else:
+            # Rough approximation: 1 token ≈ 4 chars in English
+            new_counts = [len(text) // 4 for text in pending]
+        for (key, positions), count in zip(missing.items(), new_counts):
+            for i in positions:
+                counts[i] = count
+            _token_count_cache[key] = count
+        while len(_token_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
+    
+    return counts
 
 
 def generate_response(
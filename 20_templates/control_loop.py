@@ -19,11 +19,29 @@ Usage:
     result = control_loop.run(input_data="What is the square root of 144?")
 """
 
+import sys
 import time
+import asyncio
 import json
+import copy
+import mmap
+import re
+import zlib
+import struct
+import math
+import random
+import heapq
+import bisect
+import hashlib
+import sqlite3
+import threading
 import logging
-from typing import Dict, List, Any, Optional, Callable, Union, Tuple
+from typing import Dict, List, Any, Optional, Callable, Union, Tuple, Set, Iterable, Iterator, AsyncIterator
 from abc import ABC, abstractmethod
+from array import array
+from collections import deque, OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait as wait_futures
 
 # Configure logging
 logging.basicConfig(
@@ -36,570 +54,3640 @@ logger = logging.getLogger("control_loop")
 # Model Interface
 # ------------------------------------------------------------------------------
 
+class PromptParts:
+    """
+    A prompt split into a stable prefix, repeated across calls, and a
+    volatile suffix. Providers with prompt caching can reuse the prefix.
+    """
+    
+    def __init__(self, prefix: str, suffix: str):
+        """
+        Initialize the prompt parts.
+        
+        Args:
+            prefix: Text that stays the same from call to call
+            suffix: Text that changes on every call
+        """
+        self.prefix = prefix
+        self.suffix = suffix
+    
+    @property
+    def text(self) -> str:
+        """The full prompt."""
+        return self.prefix + self.suffix
+    
+    def __repr__(self) -> str:
+        return f"PromptParts(prefix={len(self.prefix)} chars, suffix={len(self.suffix)} chars)"
+
+async def _to_thread(function: Callable[..., Any], *args) -> Any:
+    """
+    Run a blocking call in a worker thread, like asyncio.to_thread().
+    
+    A thread cannot be interrupted, so when the caller is cancelled this
+    waits for the call to return before re-raising. Batches that bound
+    their concurrency then see an abandoned call as in flight until it ends.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(function, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait({future})
+        if not future.cancelled():
+            future.exception()  # Mark the outcome retrieved; nobody is waiting for it
+        raise
+
 class ModelInterface(ABC):
     """Abstract base class for language model interfaces."""
     
+    # Whether the provider can cache a repeated prompt prefix
+    supports_prompt_caching = False
+    
     @abstractmethod
     def generate(self, context: str, max_tokens: int = 1000) -> str:
         """Generate a response from the model given a context."""
         pass
+    
+    async def agenerate(self, context: str, max_tokens: int = 1000) -> str:
+        """
+        Generate a response without blocking the event loop.
+        Runs generate() in a worker thread unless a subclass provides a
+        native async implementation.
+        """
+        return await _to_thread(self.generate, context, max_tokens)
+    
+    def stream(self, context: str, max_tokens: int = 1000) -> Iterator[str]:
+        """
+        Generate a response as a stream of text chunks.
+        Closing the iterator early cancels the generation; interfaces without
+        a streaming API yield the whole response as one chunk.
+        """
+        yield self.generate(context, max_tokens)
+    
+    async def astream(self, context: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """Async version of stream()."""
+        yield await self.agenerate(context, max_tokens)
+
+    def generate_with_prefix(self, prefix: str, suffix: str,
+                             max_tokens: int = 1000) -> Tuple[str, Optional[int]]:
+        """
+        Generate a response for a prompt split into a stable prefix and a
+        volatile suffix. Interfaces with provider-side prompt caching mark
+        the prefix as cacheable; others send the joined prompt.
+        
+        Returns:
+            Tuple of (response, prompt tokens served from the provider's
+            cache for this call, or None if not reported)
+        """
+        return self.generate(prefix + suffix, max_tokens), None
+    
+    async def agenerate_with_prefix(self, prefix: str, suffix: str,
+                                    max_tokens: int = 1000) -> Tuple[str, Optional[int]]:
+        """Async version of generate_with_prefix()."""
+        return await _to_thread(self.generate_with_prefix, prefix, suffix, max_tokens)
+
+    async def _threaded_astream(self, open_stream: Callable[[], Any],
+                                chunk_text: Callable[[Any], Optional[str]]) -> AsyncIterator[str]:
+        """
+        Drive a blocking SDK stream from a worker thread and yield its text.
+        
+        Args:
+            open_stream: Opens the SDK stream (runs in a worker thread)
+            chunk_text: Extracts the text of one stream event, or None
+        
+        Closing the generator closes the SDK response, which drops the HTTP
+        stream and ends the worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        closed = threading.Event()
+        response = await _to_thread(open_stream)
+        
+        def put(item: Tuple[str, Any]) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # The event loop is gone; nobody is listening
+        
+        def pump() -> None:
+            try:
+                for event in response:
+                    if closed.is_set():
+                        break
+                    text = chunk_text(event)
+                    if text:
+                        put(("chunk", text))
+            except Exception as e:
+                if not closed.is_set():
+                    put(("error", e))
+            finally:
+                put(("done", None))
+        
+        worker = loop.run_in_executor(None, pump)
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+        finally:
+            closed.set()
+            if hasattr(response, "close"):
+                response.close()
+            try:
+                await worker
+            except Exception:
+                pass  # Reading a closed stream may fail; the caller has stopped listening
+
+class AsyncModelInterface(ModelInterface):
+    """Base class for language model interfaces with a native async API."""
+    
+    @abstractmethod
+    async def agenerate(self, context: str, max_tokens: int = 1000) -> str:
+        """Generate a response from the model given a context."""
+        pass
+    
+    def generate(self, context: str, max_tokens: int = 1000) -> str:
+        """Generate a response synchronously (not usable inside a running event loop)."""
+        return asyncio.run(self.agenerate(context, max_tokens))
+
+    async def agenerate_with_prefix(self, prefix: str, suffix: str,
+                                    max_tokens: int = 1000) -> Tuple[str, Optional[int]]:
+        """Async version of generate_with_prefix()."""
+        return await self.agenerate(prefix + suffix, max_tokens), None
 
 class OpenAIInterface(ModelInterface):
     """OpenAI API interface for language models."""
     
-    def __init__(self, model_name: str, api_key: Optional[str] = None):
+    # OpenAI caches long repeated prefixes automatically
+    supports_prompt_caching = True
+    
+    def __init__(self, model_name: str, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None, registry: Optional["ClientRegistry"] = None):
         """
         Initialize the OpenAI interface.
         
         Args:
             model_name: Name of the OpenAI model to use
             api_key: OpenAI API key (optional if set in environment)
+            base_url: Alternative API endpoint, such as a local stub server
+            registry: Client registry (shared process-wide registry if None)
         """
-        try:
-            import openai
-            self.openai = openai
-            if api_key:
-                openai.api_key = api_key
-            self.model_name = model_name
-        except ImportError:
-            raise ImportError("OpenAI package not installed. Install with 'pip install openai'")
+        self.registry = registry or get_client_registry()
+        self.client = self.registry.client("openai", api_key=api_key, base_url=base_url)
+        self.model_name = model_name
+    
+    def _request(self, context: str, max_tokens: int, **kwargs) -> Any:
+        """Send a chat completion request through the registry's limiter and retries."""
+        return self.registry.call(
+            self.model_name,
+            self.client.chat.completions.create,
+            model=self.model_name,
+            messages=[{"role": "user", "content": context}],
+            max_tokens=max_tokens,
+            n=1,
+            temperature=0.7,
+            tokens=get_token_counter(self.model_name).count(context) + max_tokens,
+            **kwargs
+        )
     
     def generate(self, context: str, max_tokens: int = 1000) -> str:
         """Generate a response using the OpenAI API."""
+        return self._complete(context, max_tokens)[0]
+    
+    def generate_with_prefix(self, prefix: str, suffix: str,
+                             max_tokens: int = 1000) -> Tuple[str, Optional[int]]:
+        """Generate a response; OpenAI caches the repeated prefix on its own."""
+        return self._complete(prefix + suffix, max_tokens)
+    
+    def _complete(self, context: str, max_tokens: int) -> Tuple[str, Optional[int]]:
+        """Return the response text and the cached prompt tokens the API reported."""
         try:
-            response = self.openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": context}],
-                max_tokens=max_tokens,
-                n=1,
-                temperature=0.7,
-            )
-            return response.choices[0].message.content
+            response = self._request(context, max_tokens)
+            details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+            return response.choices[0].message.content, getattr(details, "cached_tokens", None)
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            raise
+
+    def _open_stream(self, context: str, max_tokens: int) -> Any:
+        """Open a streaming request."""
+        try:
+            return self._request(context, max_tokens, stream=True)
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             raise
+        
+    @staticmethod
+    def _chunk_text(chunk: Any) -> Optional[str]:
+        """Text carried by one stream event."""
+        return chunk.choices[0].delta.content if chunk.choices else None
+    
+    def stream(self, context: str, max_tokens: int = 1000) -> Iterator[str]:
+        """Stream a response from the OpenAI API."""
+        response = self._open_stream(context, max_tokens)
+        try:
+            for chunk in response:
+                content = self._chunk_text(chunk)
+                if content:
+                    yield content
+        finally:
+            # Drops the HTTP stream when the caller stops early
+            if hasattr(response, "close"):
+                response.close()
+    
+    def astream(self, context: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """Stream a response from the OpenAI API without blocking the event loop."""
+        return self._threaded_astream(lambda: self._open_stream(context, max_tokens), self._chunk_text)
 
 class AnthropicInterface(ModelInterface):
     """Anthropic API interface for Claude models."""
     
-    def __init__(self, model_name: str, api_key: Optional[str] = None):
+    # Prefixes marked with cache_control are cached by the Messages API
+    supports_prompt_caching = True
+    
+    def __init__(self, model_name: str, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None, registry: Optional["ClientRegistry"] = None):
         """
         Initialize the Anthropic interface.
         
         Args:
             model_name: Name of the Anthropic model to use
             api_key: Anthropic API key (optional if set in environment)
+            base_url: Alternative API endpoint, such as a local stub server
+            registry: Client registry (shared process-wide registry if None)
         """
-        try:
-            import anthropic
-            self.anthropic = anthropic
-            self.client = anthropic.Anthropic(api_key=api_key)
-            self.model_name = model_name
-        except ImportError:
-            raise ImportError("Anthropic package not installed. Install with 'pip install anthropic'")
+        self.registry = registry or get_client_registry()
+        self.client = self.registry.client("anthropic", api_key=api_key, base_url=base_url)
+        self.model_name = model_name
+    
+    def _request(self, context: str, max_tokens: int, **kwargs) -> Any:
+        """Send a completion request through the registry's limiter and retries."""
+        return self.registry.call(
+            self.model_name,
+            self.client.completions.create,
+            model=self.model_name,
+            prompt=f"\n\nHuman: {context}\n\nAssistant:",
+            max_tokens_to_sample=max_tokens,
+            temperature=0.7,
+            tokens=get_token_counter(self.model_name).count(context) + max_tokens,
+            **kwargs
+        )
     
     def generate(self, context: str, max_tokens: int = 1000) -> str:
         """Generate a response using the Anthropic API."""
         try:
-            response = self.client.completion(
+            response = self._request(context, max_tokens)
+            return response.completion
+        except Exception as e:
+            logger.error(f"Anthropic API error: {e}")
+            raise
+    
+    def generate_with_prefix(self, prefix: str, suffix: str,
+                             max_tokens: int = 1000) -> Tuple[str, Optional[int]]:
+        """Generate a response, asking the Messages API to cache the prefix."""
+        if not prefix:
+            return self.generate(suffix, max_tokens), None
+        
+        content = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+        if suffix:
+            content.append({"type": "text", "text": suffix})
+        try:
+            response = self.registry.call(
+                self.model_name,
+                self.client.messages.create,
                 model=self.model_name,
-                prompt=f"\n\nHuman: {context}\n\nAssistant:",
-                max_tokens_to_sample=max_tokens,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=max_tokens,
                 temperature=0.7,
+                tokens=get_token_counter(self.model_name).count(prefix + suffix) + max_tokens
             )
-            return response.completion
+            text = "".join(block.text for block in response.content if getattr(block, "type", None) == "text")
+            return text, getattr(response.usage, "cache_read_input_tokens", None)
+        except Exception as e:
+            logger.error(f"Anthropic API error: {e}")
+            raise
+
+    def _open_stream(self, context: str, max_tokens: int) -> Any:
+        """Open a streaming request."""
+        try:
+            return self._request(context, max_tokens, stream=True)
         except Exception as e:
             logger.error(f"Anthropic API error: {e}")
             raise
+        
+    @staticmethod
+    def _chunk_text(event: Any) -> Optional[str]:
+        """Text carried by one stream event."""
+        return event.completion
+    
+    def stream(self, context: str, max_tokens: int = 1000) -> Iterator[str]:
+        """Stream a response from the Anthropic API."""
+        response = self._open_stream(context, max_tokens)
+        try:
+            for event in response:
+                content = self._chunk_text(event)
+                if content:
+                    yield content
+        finally:
+            # Drops the HTTP stream when the caller stops early
+            if hasattr(response, "close"):
+                response.close()
+    
+    def astream(self, context: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """Stream a response from the Anthropic API without blocking the event loop."""
+        return self._threaded_astream(lambda: self._open_stream(context, max_tokens), self._chunk_text)
+
+class FakeAsyncModel(AsyncModelInterface):
+    """
+    Local async model for offline testing and benchmarking.
+    Sleeps for a fixed latency, then cycles through canned responses.
+    """
+    
+    def __init__(self, responses: Optional[List[str]] = None, latency: float = 0.1,
+                 chunk_size: int = 16):
+        """
+        Initialize the fake model.
+        
+        Args:
+            responses: Responses returned in turn (echoes the context if None)
+            latency: Simulated seconds per call
+            chunk_size: Characters per chunk when streaming; the latency is
+                spread evenly over the chunks
+        """
+        self.responses = responses
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.streamed_chars = 0
+    
+    def _next_response(self, context: str, max_tokens: int) -> str:
+        index = self.calls
+        self.calls += 1
+        if not self.responses:
+            return context[-max_tokens:]
+        return self.responses[index % len(self.responses)]
+    
+    def _chunks(self, response: str) -> List[str]:
+        return [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)] or [""]
+    
+    async def agenerate(self, context: str, max_tokens: int = 1000) -> str:
+        """Return the next canned response after the simulated latency."""
+        response = self._next_response(context, max_tokens)
+        await asyncio.sleep(self.latency)
+        return response
+    
+    def stream(self, context: str, max_tokens: int = 1000) -> Iterator[str]:
+        """Yield the next canned response chunk by chunk."""
+        chunks = self._chunks(self._next_response(context, max_tokens))
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            self.streamed_chars += len(chunk)
+            yield chunk
+    
+    async def astream(self, context: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """Async version of stream()."""
+        chunks = self._chunks(self._next_response(context, max_tokens))
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            self.streamed_chars += len(chunk)
+            yield chunk
 
 # ------------------------------------------------------------------------------
-# Context Management
+# Token Counting
 # ------------------------------------------------------------------------------
 
-class ContextManager:
-    """Manages the context for language model interactions."""
+class TokenCounter:
+    """
+    Token counting service shared by budgeting and pruning code.
+    Loads the model's tiktoken encoding once, caches counts in an LRU keyed
+    by a hash of the text, and falls back to a character-based estimate when
+    tiktoken is not installed or does not know the model. The cache is
+    guarded by a lock, since model interfaces count tokens from worker
+    threads; encoding happens outside it.
+    """
     
-    def __init__(self, 
-                 initial_context: Dict[str, Any] = None, 
-                 max_tokens: int = 4000,
-                 reserved_tokens: int = 1000):
+    def __init__(self, model: str = "gpt-4", cache_size: int = 4096, chars_per_token: float = 4.0):
         """
-        Initialize the context manager.
+        Initialize the token counter.
         
         Args:
-            initial_context: Initial context dictionary
-            max_tokens: Maximum number of tokens in context
-            reserved_tokens: Tokens reserved for model response
+            model: Model whose tokenizer to use
+            cache_size: Maximum number of cached counts
+            chars_per_token: Characters per token for the fallback estimate
         """
-        self.context = initial_context or {}
-        self.max_tokens = max_tokens
-        self.reserved_tokens = reserved_tokens
-        self.history: List[Dict[str, Any]] = []
+        self.model = model
+        self.cache_size = cache_size
+        self.chars_per_token = chars_per_token
+        self.encoding = self._load_encoding(model)
+        self._cache: 'OrderedDict[bytes, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
     
-    def update(self, key: str, value: Any) -> None:
-        """Update a specific context element."""
-        self.context[key] = value
+    @staticmethod
+    def _load_encoding(model: str) -> Any:
+        """Load the tiktoken encoding for a model, or None if unavailable."""
+        try:
+            import tiktoken
+        except ImportError:
+            logger.info("tiktoken not installed, estimating token counts from text length")
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            logger.warning(f"No tiktoken encoding for {model}, using cl100k_base")
+            return tiktoken.get_encoding("cl100k_base")
     
-    def get_context_str(self, template: Optional[str] = None) -> str:
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    
+    def estimate(self, text: str) -> int:
+        """Estimate the token count from text length."""
+        return math.ceil(len(text) / self.chars_per_token)
+    
+    def count(self, text: str) -> int:
         """
-        Get the formatted context string based on template or default format.
+        Count the tokens in a string.
         
         Args:
-            template: Optional template string with {placeholders}
-            
+            text: Input text
+        
         Returns:
-            Formatted context string
+            Token count
         """
-        if template:
-            try:
-                return template.format(**self.context)
-            except KeyError as e:
-                logger.warning(f"Template key error: {e}. Using default format.")
-                # Fall back to default formatting
-        
-        # Default formatting
-        parts = []
-        
-        # Add system instructions if present
-        if "system" in self.context:
-            parts.append(f"# Instructions\n{self.context['system']}\n\n")
-        
-        # Add goal if present
-        if "goal" in self.context:
-            parts.append(f"# Goal\n{self.context['goal']}\n\n")
-        
-        # Add context elements
-        for key, value in self.context.items():
-            if key not in ["system", "goal", "history", "current_input"]:
-                parts.append(f"# {key.replace('_', ' ').title()}\n{value}\n\n")
-        
-        # Add history if present
-        if "history" in self.context and self.context["history"]:
-            parts.append("# Previous Steps\n")
-            for i, entry in enumerate(self.context["history"]):
-                parts.append(f"Step {i+1}: {entry}\n")
-            parts.append("\n")
+        key = self._key(text)
+        with self._lock:
+            count = self._cache.get(key)
+            if count is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return count
+            self.misses += 1
+        
+        if self.encoding is not None:
+            count = len(self.encoding.encode(text, disallowed_special=()))
+        else:
+            count = self.estimate(text)
+        self._store(key, count)
+        return count
+    
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens in several strings.
+        Cached strings are looked up and the rest are encoded in one batch.
         
-        # Add current input if present
-        if "current_input" in self.context:
-            parts.append(f"# Current Task\n{self.context['current_input']}\n\n")
+        Args:
+            texts: Input texts
         
-        # Ensure the context isn't too long
-        context_str = "".join(parts)
-        self._prune_if_needed(context_str)
+        Returns:
+            Token count per text
+        """
+        counts: List[Optional[int]] = []
+        missing: Dict[bytes, List[int]] = {}
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            for i, key in enumerate(keys):
+                count = self._cache.get(key)
+                if count is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self.hits += 1
+                    self._cache.move_to_end(key)
+                counts.append(count)
+            self.misses += len(missing)
+        
+        if missing:
+            pending = [texts[positions[0]] for positions in missing.values()]
+            if self.encoding is not None:
+                new_counts = [len(t) for t in self.encoding.encode_batch(pending, disallowed_special=())]
+            else:
+                new_counts = [self.estimate(text) for text in pending]
+            for (key, positions), count in zip(missing.items(), new_counts):
+                for i in positions:
+                    counts[i] = count
+                self._store(key, count)
         
-        return context_str
+        return counts
     
-    def _prune_if_needed(self, context_str: str) -> str:
+    def calibrate(self, texts: List[str], counts: Optional[List[int]] = None) -> float:
         """
-        Prune context if it exceeds the maximum token limit.
+        Fit the fallback estimate's characters-per-token ratio.
         
         Args:
-            context_str: The current context string
-            
+            texts: Sample texts
+            counts: Known token counts for the samples (counted with the
+                loaded encoding if None)
+        
         Returns:
-            Pruned context string
+            The new characters-per-token ratio
         """
-        # Estimate token count (rough approximation)
-        estimated_tokens = len(context_str.split())
-        
-        if estimated_tokens > (self.max_tokens - self.reserved_tokens):
-            logger.warning(f"Context too long ({estimated_tokens} words). Pruning...")
-            
-            # Simple pruning strategy: remove oldest history entries
-            if "history" in self.context and self.context["history"]:
-                self.context["history"] = self.context["history"][1:]
-                logger.info("Removed oldest history entry")
-                
-                # Recursively check if we need to prune more
-                return self._prune_if_needed(self.get_context_str())
-        
-        return context_str
+        if counts is None:
+            if self.encoding is None:
+                raise ValueError("Token counts are required when tiktoken is unavailable")
+            counts = [len(t) for t in self.encoding.encode_batch(texts, disallowed_special=())]
+        total_tokens = sum(counts)
+        if total_tokens:
+            self.chars_per_token = sum(len(text) for text in texts) / total_tokens
+        return self.chars_per_token
     
-    def add_to_history(self, entry: Any) -> None:
-        """Add an entry to the interaction history."""
-        if "history" not in self.context:
-            self.context["history"] = []
-        
-        self.context["history"].append(entry)
-        self.history.append({"timestamp": time.time(), "entry": entry})
+    def _store(self, key: bytes, count: int) -> None:
+        with self._lock:
+            self._cache[key] = count
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
     
-    def clear_history(self) -> None:
-        """Clear the interaction history."""
-        if "history" in self.context:
-            self.context["history"] = []
+    def cache_info(self) -> Dict[str, int]:
+        """Get cache statistics."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+_token_counters: Dict[str, TokenCounter] = {}
+_token_counters_lock = threading.Lock()
+
+def get_token_counter(model: str = "gpt-4") -> TokenCounter:
+    """Get the shared token counter for a model, creating it on first use."""
+    with _token_counters_lock:
+        counter = _token_counters.get(model)
+        if counter is None:
+            counter = _token_counters[model] = TokenCounter(model)
+        return counter
 
 # ------------------------------------------------------------------------------
-# Evaluation Functions
+# Client Registry
 # ------------------------------------------------------------------------------
 
-class EvaluationFunction(ABC):
-    """Base class for evaluation functions."""
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a per-minute rate.
+    Requests larger than the bucket wait for a full bucket instead of
+    blocking forever.
+    """
     
-    @abstractmethod
-    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
         """
-        Evaluate a model response.
+        Initialize the bucket, starting full.
         
         Args:
-            response: The model's response
-            context: The current context dictionary
-            
-        Returns:
-            Tuple of (success_flag, score, feedback)
+            per_minute: Tokens added per minute
+            capacity: Maximum burst size (defaults to one minute's worth)
         """
-        pass
-
-class SimpleKeywordEvaluator(EvaluationFunction):
-    """Evaluates responses based on keyword presence."""
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
     
-    def __init__(self, required_keywords: List[str], forbidden_keywords: List[str] = None):
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_acquire(self, amount: float = 1.0) -> float:
         """
-        Initialize the keyword evaluator.
+        Take tokens if available.
         
         Args:
-            required_keywords: List of keywords that should be present
-            forbidden_keywords: List of keywords that should not be present
+            amount: Tokens to take
+        
+        Returns:
+            0.0 on success, otherwise the seconds to wait before retrying
         """
-        self.required_keywords = required_keywords
-        self.forbidden_keywords = forbidden_keywords or []
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
     
-    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+    def acquire(self, amount: float = 1.0) -> float:
         """
-        Evaluate based on keyword presence.
+        Take tokens, sleeping until they are available.
         
         Returns:
-            Tuple of (success_flag, score, feedback)
+            Seconds spent waiting
         """
-        response_lower = response.lower()
-        
-        # Check required keywords
-        missing_keywords = [kw for kw in self.required_keywords 
-                           if kw.lower() not in response_lower]
-        
-        # Check forbidden keywords
-        present_forbidden = [kw for kw in self.forbidden_keywords 
-                            if kw.lower() in response_lower]
-        
-        # Calculate score (0.0 to 1.0)
-        if self.required_keywords:
-            required_score = (len(self.required_keywords) - len(missing_keywords)) / len(self.required_keywords)
-        else:
-            required_score = 1.0
-            
-        if self.forbidden_keywords:
-            forbidden_score = (len(self.forbidden_keywords) - len(present_forbidden)) / len(self.forbidden_keywords)
-        else:
-            forbidden_score = 1.0
-            
-        score = (required_score + forbidden_score) / 2.0
-        success = score > 0.8  # Consider successful if score > 80%
-        
-        # Generate feedback
-        feedback = []
-        if missing_keywords:
-            feedback.append(f"Missing required keywords: {', '.join(missing_keywords)}")
-        if present_forbidden:
-            feedback.append(f"Contains forbidden keywords: {', '.join(present_forbidden)}")
-        if not feedback:
-            feedback.append("Response meets keyword criteria")
-            
-        return success, score, "; ".join(feedback)
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(amount)
+            if delay <= 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
 
-class PatternMatchEvaluator(EvaluationFunction):
-    """Evaluates responses based on regex pattern matching."""
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one model."""
     
-    def __init__(self, required_patterns: List[str], forbidden_patterns: List[str] = None):
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
         """
-        Initialize the pattern evaluator.
+        Initialize the rate limiter.
         
         Args:
-            required_patterns: List of regex patterns that should match
-            forbidden_patterns: List of regex patterns that should not match
+            requests_per_minute: Request limit (unlimited if None)
+            tokens_per_minute: Prompt plus completion token limit (unlimited if None)
         """
-        import re
-        self.re = re
-        self.required_patterns = [re.compile(p, re.IGNORECASE) for p in required_patterns]
-        self.forbidden_patterns = [re.compile(p, re.IGNORECASE) for p in (forbidden_patterns or [])]
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.waited = 0.0
     
-    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+    def acquire(self, tokens: int = 0) -> float:
         """
-        Evaluate based on pattern matching.
+        Wait until a request of the given size fits both limits.
+        
+        Args:
+            tokens: Estimated tokens the request will use
         
         Returns:
-            Tuple of (success_flag, score, feedback)
+            Seconds spent waiting
         """
-        # Check required patterns
-        missing_patterns = [p.pattern for p in self.required_patterns 
-                           if not p.search(response)]
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens > 0:
+            waited += self.tokens.acquire(tokens)
+        self.waited += waited
+        return waited
+
+class RetryPolicy:
+    """Retries transient API errors with capped, fully jittered exponential backoff."""
+    
+    # Rate limits, timeouts, conflicts and server errors are worth retrying
+    retryable_statuses = {408, 409, 429, 500, 502, 503, 504}
+    
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Initialize the retry policy.
         
-        # Check forbidden patterns
-        present_forbidden = [p.pattern for p in self.forbidden_patterns 
-                            if p.search(response)]
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff ceiling for the first retry, in seconds
+            max_delay: Largest backoff ceiling, in seconds
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    @staticmethod
+    def status_code(error: Exception) -> Optional[int]:
+        """Find the HTTP status of an SDK or HTTP error, if it has one."""
+        for source in (error, getattr(error, "response", None)):
+            for attribute in ("status_code", "status", "http_status"):
+                value = getattr(source, attribute, None)
+                if isinstance(value, int):
+                    return value
+        return None
+    
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether an error is transient."""
+        status = self.status_code(error)
+        if status is not None:
+            return status in self.retryable_statuses or status >= 500
+        # Connection resets and timeouts surface as these or as SDK classes named after them
+        return (isinstance(error, (ConnectionError, TimeoutError)) or
+                any(word in type(error).__name__ for word in ("Connection", "Timeout")))
+    
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """
+        Seconds to wait before a retry.
+        Honours a Retry-After header when the server sends one.
         
-        # Calculate score
-        if self.required_patterns:
-            required_score = (len(self.required_patterns) - len(missing_patterns)) / len(self.required_patterns)
-        else:
-            required_score = 1.0
-            
-        if self.forbidden_patterns:
-            forbidden_score = (len(self.forbidden_patterns) - len(present_forbidden)) / len(self.forbidden_patterns)
-        else:
-            forbidden_score = 1.0
-            
-        score = (required_score + forbidden_score) / 2.0
-        success = score > 0.8  # Consider successful if score > 80%
+        Args:
+            attempt: Number of the retry, starting at 0
+            error: Error that triggered the retry
+        """
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+def _openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None, **kwargs) -> Any:
+    try:
+        import openai
+    except ImportError:
+        raise ImportError("OpenAI package not installed. Install with 'pip install openai'")
+    # Retries are handled by the registry, so don't let the SDK retry as well
+    return openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0, **kwargs)
+
+def _anthropic_client(api_key: Optional[str] = None, base_url: Optional[str] = None, **kwargs) -> Any:
+    try:
+        import anthropic
+    except ImportError:
+        raise ImportError("Anthropic package not installed. Install with 'pip install anthropic'")
+    return anthropic.Anthropic(api_key=api_key, base_url=base_url, max_retries=0, **kwargs)
+
+class ClientRegistry:
+    """
+    Process-wide registry of API clients.
+    Clients are created once per provider, key and endpoint, so their HTTP
+    connection pools are shared by every interface. Calls go through
+    per-model rate limiters and are retried with jittered backoff.
+    """
+    
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None):
+        """
+        Initialize the registry.
         
-        # Generate feedback
-        feedback = []
-        if missing_patterns:
-            feedback.append(f"Missing required patterns: {', '.join(missing_patterns)}")
-        if present_forbidden:
-            feedback.append(f"Contains forbidden patterns: {', '.join(present_forbidden)}")
-        if not feedback:
-            feedback.append("Response meets pattern criteria")
-            
-        return success, score, "; ".join(feedback)
+        Args:
+            retry_policy: Retry policy for calls (default RetryPolicy())
+        """
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.factories: Dict[str, Callable[..., Any]] = {
+            "openai": _openai_client,
+            "anthropic": _anthropic_client
+        }
+        self._clients: Dict[Tuple, Any] = {}
+        self._limits: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+    
+    def register_factory(self, provider: str, factory: Callable[..., Any]) -> None:
+        """
+        Register how clients for a provider are built.
+        
+        Args:
+            provider: Provider name
+            factory: Called with api_key, base_url and extra keyword arguments
+        """
+        self.factories[provider] = factory
+    
+    def client(self, provider: str, api_key: Optional[str] = None,
+               base_url: Optional[str] = None, **kwargs) -> Any:
+        """
+        Get the shared client for a provider, creating it on first use.
+        
+        Args:
+            provider: Provider name ("openai", "anthropic" or a registered one)
+            api_key: API key (the SDK reads the environment if None)
+            base_url: Alternative endpoint, such as a local stub server
+            **kwargs: Extra arguments for the client factory
+        
+        Returns:
+            Client instance
+        """
+        key = (provider, api_key, base_url, tuple(sorted(kwargs.items())))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if provider not in self.factories:
+                    raise ValueError(f"Unknown provider: {provider}")
+                client = self._clients[key] = self.factories[provider](
+                    api_key=api_key, base_url=base_url, **kwargs
+                )
+            return client
+    
+    def set_rate_limit(self, model: str, requests_per_minute: Optional[float] = None,
+                       tokens_per_minute: Optional[float] = None) -> None:
+        """
+        Limit the request and token rate for a model.
+        
+        Args:
+            model: Model name
+            requests_per_minute: Request limit (unlimited if None)
+            tokens_per_minute: Token limit (unlimited if None)
+        """
+        with self._lock:
+            self._limits[model] = (requests_per_minute, tokens_per_minute)
+            self._limiters.pop(model, None)
+    
+    def limiter(self, model: str) -> RateLimiter:
+        """Get the rate limiter for a model."""
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                limiter = self._limiters[model] = RateLimiter(*self._limits.get(model, (None, None)))
+            return limiter
+    
+    def call(self, model: str, function: Callable[..., Any], /, *args,
+             tokens: int = 0, **kwargs) -> Any:
+        """
+        Call an API function under the model's rate limit, retrying transient errors.
+        
+        Args:
+            model: Model name used to pick the rate limiter
+            function: API function to call
+            *args: Positional arguments for the function
+            tokens: Estimated prompt plus completion tokens of the request
+            **kwargs: Keyword arguments for the function
+        
+        Returns:
+            The function's result
+        """
+        limiter = self.limiter(model)
+        attempt = 0
+        while True:
+            limiter.acquire(tokens)
+            with self._lock:
+                self.calls += 1
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.retry_policy.max_retries or not self.retry_policy.is_retryable(e):
+                    raise
+                delay = self.retry_policy.delay(attempt, e)
+                logger.warning(f"{model} request failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+                with self._lock:
+                    self.retries += 1
+                attempt += 1
+                time.sleep(delay)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return call, retry and rate-limit wait counters."""
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "calls": self.calls,
+                "retries": self.retries,
+                "rate_limit_wait": {model: limiter.waited for model, limiter in self._limiters.items()}
+            }
+    
+    def clear(self) -> None:
+        """Drop all cached clients and rate limiters."""
+        with self._lock:
+            for client in self._clients.values():
+                if hasattr(client, "close"):
+                    client.close()
+            self._clients.clear()
+            self._limiters.clear()
 
-class ModelEvaluator(EvaluationFunction):
-    """Uses a model to evaluate another model's response."""
+# Shared registry used by the model interfaces
+_client_registry = ClientRegistry()
+
+def get_client_registry() -> ClientRegistry:
+    """Get the process-wide client registry."""
+    return _client_registry
+
+# ------------------------------------------------------------------------------
+# Context Management
+# ------------------------------------------------------------------------------
+
+class ContextSection:
+    """A piece of context competing for the token budget."""
     
-    def __init__(self, model_interface: ModelInterface, evaluation_prompt_template: str):
+    def __init__(self,
+                 name: str,
+                 text: str,
+                 utility: float = 1.0,
+                 tokens: Optional[int] = None,
+                 required: bool = False):
         """
-        Initialize the model evaluator.
+        Initialize a context section.
         
         Args:
-            model_interface: ModelInterface instance for evaluation
-            evaluation_prompt_template: Template for evaluation prompt
+            name: Section name, reported when the section is dropped
+            text: Rendered section text
+            utility: Value of keeping the section
+            tokens: Token cost (counted by the allocator if None)
+            required: Whether the section must always be kept
         """
-        self.model = model_interface
-        self.evaluation_prompt_template = evaluation_prompt_template
+        self.name = name
+        self.text = text
+        self.utility = utility
+        self.tokens = tokens
+        self.required = required
     
-    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+    def __repr__(self) -> str:
+        return f"ContextSection({self.name!r}, tokens={self.tokens}, utility={self.utility})"
+
+class BudgetAllocation:
+    """Result of fitting context sections into a token budget."""
+    
+    def __init__(self, sections: List[ContextSection], dropped: List[ContextSection], budget: int):
         """
-        Evaluate using another model.
+        Initialize the allocation.
+        
+        Args:
+            sections: Kept sections, in their original order
+            dropped: Dropped sections, in their original order
+            budget: Token budget the sections were fitted into
+        """
+        self.sections = sections
+        self.dropped = dropped
+        self.budget = budget
+        self.tokens = sum(s.tokens for s in sections)
+        self.utility = sum(s.utility for s in sections)
+    
+    @property
+    def text(self) -> str:
+        """Prompt text made of the kept sections."""
+        return "".join(s.text for s in self.sections)
+    
+    @property
+    def dropped_names(self) -> List[str]:
+        """Names of the dropped sections."""
+        return [s.name for s in self.dropped]
+    
+    def __repr__(self) -> str:
+        return (f"BudgetAllocation(tokens={self.tokens}/{self.budget}, "
+                f"kept={len(self.sections)}, dropped={self.dropped_names})")
+
+class BudgetAllocator:
+    """
+    Chooses which context sections to keep under a token budget.
+    Required sections are always kept; the remaining budget is filled by a
+    0/1 knapsack over section utilities, solved exactly by dynamic
+    programming or approximately by utility-per-token greedy selection.
+    """
+    
+    def __init__(self,
+                 tokenizer: Optional[TokenCounter] = None,
+                 method: str = "dp",
+                 max_cells: int = 2_000_000):
+        """
+        Initialize the allocator.
+        
+        Args:
+            tokenizer: Token counter for sections without a cost
+            method: "dp" (exact knapsack) or "greedy"
+            max_cells: Upper bound on DP table size; token costs are
+                bucketed (rounded up) to stay within it
+        """
+        if method not in ("dp", "greedy"):
+            raise ValueError(f"Unknown allocation method: {method}")
+        self.tokenizer = tokenizer or get_token_counter()
+        self.method = method
+        self.max_cells = max_cells
+    
+    def allocate(self, sections: List[ContextSection], budget: int) -> BudgetAllocation:
+        """
+        Pick the highest-utility subset of sections that fits the budget.
+        
+        Args:
+            sections: Candidate sections, in prompt order
+            budget: Token budget
         
         Returns:
-            Tuple of (success_flag, score, feedback)
+            BudgetAllocation with kept and dropped sections
         """
-        # Create evaluation prompt
-        eval_prompt = self.evaluation_prompt_template.format(
-            response=response,
-            **context
-        )
+        missing = [s for s in sections if s.tokens is None]
+        for section, tokens in zip(missing, self.tokenizer.count_batch([s.text for s in missing])):
+            section.tokens = tokens
+        
+        required_tokens = sum(s.tokens for s in sections if s.required)
+        if required_tokens > budget:
+            logger.warning(f"Required sections need {required_tokens} tokens, over the {budget} token budget")
+        
+        optional = [i for i, s in enumerate(sections) if not s.required]
+        capacity = max(0, budget - required_tokens)
+        if self.method == "dp":
+            chosen = self._knapsack(sections, optional, capacity)
+        else:
+            chosen = self._greedy(sections, optional, capacity)
         
-        # Get evaluation from model
-        try:
-            eval_response = self.model.generate(eval_prompt)
+        kept = [s for i, s in enumerate(sections) if s.required or i in chosen]
+        dropped = [s for i, s in enumerate(sections) if not s.required and i not in chosen]
+        if dropped:
+            logger.info(f"Dropped {len(dropped)} context sections to fit {budget} tokens")
+        return BudgetAllocation(kept, dropped, budget)
+    
+    def _greedy(self, sections: List[ContextSection], candidates: List[int], capacity: int) -> Set[int]:
+        """Take sections by utility per token while they fit."""
+        ranked = sorted(candidates, key=lambda i: sections[i].utility / max(sections[i].tokens, 1), reverse=True)
+        chosen = set()
+        remaining = capacity
+        for i in ranked:
+            if sections[i].utility > 0 and sections[i].tokens <= remaining:
+                chosen.add(i)
+                remaining -= sections[i].tokens
+        
+        # The best single section can beat a greedy fill of small ones
+        fitting = [i for i in candidates if sections[i].tokens <= capacity and sections[i].utility > 0]
+        if fitting:
+            best = max(fitting, key=lambda i: sections[i].utility)
+            if sections[best].utility > sum(sections[i].utility for i in chosen):
+                chosen = {best}
+        return chosen
+    
+    def _knapsack(self, sections: List[ContextSection], candidates: List[int], capacity: int) -> Set[int]:
+        """Solve the 0/1 knapsack exactly over (possibly bucketed) token costs."""
+        items = [i for i in candidates if sections[i].tokens <= capacity and sections[i].utility > 0]
+        if not items:
+            return set()
+        
+        # Zero-cost sections are always worth keeping
+        chosen = {i for i in items if sections[i].tokens == 0}
+        items = [i for i in items if sections[i].tokens > 0]
+        
+        # Bucket costs so the table stays small; rounding up never overflows the budget
+        bucket = max(1, math.ceil(capacity * len(items) / self.max_cells)) if items else 1
+        slots = capacity // bucket
+        costs = [math.ceil(sections[i].tokens / bucket) for i in items]
+        
+        best = [0.0] * (slots + 1)
+        keep = []
+        for cost, i in zip(costs, items):
+            utility = sections[i].utility
+            taken = bytearray(slots + 1)
+            for c in range(slots, cost - 1, -1):
+                value = best[c - cost] + utility
+                if value > best[c]:
+                    best[c] = value
+                    taken[c] = 1
+            keep.append(taken)
+        
+        # Walk back through the choices
+        c = slots
+        for n in range(len(items) - 1, -1, -1):
+            if keep[n][c]:
+                chosen.add(items[n])
+                c -= costs[n]
+        return chosen
+
+class ContextManager:
+    """Manages the context for language model interactions."""
+    
+    def __init__(self, 
+                 initial_context: Dict[str, Any] = None, 
+                 max_tokens: int = 4000,
+                 reserved_tokens: int = 1000,
+                 tokenizer: Optional[TokenCounter] = None):
+        """
+        Initialize the context manager.
+        
+        Args:
+            initial_context: Initial context dictionary
+            max_tokens: Maximum number of tokens in context
+            reserved_tokens: Tokens reserved for model response
+            tokenizer: Token counter (shared default counter if None)
+        """
+        self.context = initial_context or {}
+        self.max_tokens = max_tokens
+        self.reserved_tokens = reserved_tokens
+        self.tokenizer = tokenizer or get_token_counter()
+        self._step_tokens = self.tokenizer.count("Step 1: ")
+        self.history: List[Dict[str, Any]] = []
+    
+        # Rendered sections and history entries with their token counts
+        self._section_cache: Dict[str, Tuple[Any, str, str, int]] = {}
+        self._entry_cache: Dict[int, Tuple[Any, str, int]] = {}
+    
+    def update(self, key: str, value: Any) -> None:
+        """Update a specific context element."""
+        self.context[key] = value
+    
+    def get_context_str(self, template: Optional[str] = None) -> str:
+        """
+        Get the formatted context string based on template or default format.
+        
+        Sections are rendered incrementally: each section and history entry
+        is cached with its token count and only re-rendered when its value
+        changes.
+        
+        Args:
+            template: Optional template string with {placeholders}
             
-            # Try to parse structured response (JSON)
+        Returns:
+            Formatted context string
+        """
+        return self.get_context_parts(template).text
+    
+    def get_context_parts(self, template: Optional[str] = None) -> PromptParts:
+        """
+        Get the formatted context split for prompt caching.
+        The sections before the history form the stable prefix; the history
+        and current input form the suffix. Templated contexts have no prefix.
+        
+        Args:
+            template: Optional template string with {placeholders}
+        
+        Returns:
+            PromptParts whose text equals get_context_str()
+        """
+        if template:
             try:
-                result = json.loads(eval_response)
-                success = result.get("success", False)
-                score = result.get("score", 0.0)
-                feedback = result.get("feedback", "No feedback provided")
-            except json.JSONDecodeError:
-                # If not JSON, try to extract score and feedback heuristically
-                if "score" in eval_response.lower():
-                    # Try to extract score (0-10 or 0-100 scale)
-                    import re
-                    score_match = re.search(r"score\s*(?::|=)\s*(\d+(?:\.\d+)?)", eval_response, re.IGNORECASE)
-                    if score_match:
-                        raw_score = float(score_match.group(1))
-                        # Normalize to 0-1 scale
-                        if raw_score > 10:
-                            score = raw_score / 100.0
-                        else:
-                            score = raw_score / 10.0
-                    else:
-                        score = 0.5  # Default middle score
-                else:
-                    score = 0.5
-                
-                # Simple heuristic for success based on positive language
-                positive_terms = ["good", "great", "excellent", "correct", "accurate", "yes", "pass"]
-                negative_terms = ["bad", "poor", "incorrect", "inaccurate", "wrong", "no", "fail"]
-                
-                pos_count = sum(1 for term in positive_terms if term in eval_response.lower())
-                neg_count = sum(1 for term in negative_terms if term in eval_response.lower())
-                
-                success = pos_count > neg_count
-                feedback = eval_response.strip()
+                return PromptParts("", template.format(**self.context))
+            except KeyError as e:
+                logger.warning(f"Template key error: {e}. Using default format.")
+                # Fall back to default formatting
+        
+        # Sections before the history: instructions, goal, then other context elements
+        head = []
+        if "system" in self.context:
+            head.append(self._render_section("system", "Instructions"))
+        if "goal" in self.context:
+            head.append(self._render_section("goal", "Goal"))
+        for key in self.context:
+            if key not in ["system", "goal", "history", "current_input"]:
+                head.append(self._render_section(key, key.replace('_', ' ').title()))
+        
+        # Current input goes after the history
+        tail = []
+        if "current_input" in self.context:
+            tail.append(self._render_section("current_input", "Current Task"))
+        
+        history = self.context.get("history") or []
+        entries = self._render_history(history)
+        
+        # Ensure the context isn't too long
+        fixed_tokens = sum(tokens for _, tokens in head) + sum(tokens for _, tokens in tail)
+        drop = self._prune_if_needed(fixed_tokens, [tokens for _, tokens in entries])
+        if drop:
+            self.context["history"] = history[drop:]
+            entries = entries[drop:]
+        
+        parts = []
+        if entries:
+            parts.append(self._HISTORY_HEADER)
+            for i, (text, _) in enumerate(entries):
+                parts.append(f"Step {i+1}: {text}\n")
+            parts.append("\n")
+        parts.extend(text for text, _ in tail)
+    
+        return PromptParts("".join(text for text, _ in head), "".join(parts))
+    
+    # Values whose rendering can be cached by identity
+    _IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+    _HISTORY_HEADER = "# Previous Steps\n"
+    
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens with the context manager's tokenizer."""
+        return self.tokenizer.count(text)
+    
+    def _render_section(self, key: str, title: str) -> Tuple[str, int]:
+        """
+        Render a context element as a titled section, reusing the cached
+        rendering if the value has not changed.
+        
+        Returns:
+            Tuple of (section text, token count)
+        """
+        value = self.context[key]
+        cached = self._section_cache.get(key)
+        if (cached is not None and cached[0] is value and cached[1] == title
+                and isinstance(value, self._IMMUTABLE_TYPES)):
+            return cached[2], cached[3]
+        
+        text = f"# {title}\n{value}\n\n"
+        tokens = self._count_tokens(text)
+        self._section_cache[key] = (value, title, text, tokens)
+        return text, tokens
+    
+    def _render_history(self, history: List[Any]) -> List[Tuple[str, int]]:
+        """
+        Render history entries, reusing cached renderings of unchanged entries.
+        
+        Returns:
+            List of (entry text, token count) including the "Step N:" prefix
+        """
+        rendered = []
+        pending = []
+        cache = {}
+        for entry in history:
+            cached = self._entry_cache.get(id(entry))
+            if cached is not None and cached[0] is entry and isinstance(entry, self._IMMUTABLE_TYPES):
+                rendered.append((cached[1], cached[2]))
+            else:
+                pending.append(len(rendered))
+                rendered.append((f"{entry}", 0))
+        
+        # Count new entries in one batch
+        counts = self.tokenizer.count_batch([rendered[i][0] + "\n" for i in pending])
+        for i, count in zip(pending, counts):
+            rendered[i] = (rendered[i][0], count + self._step_tokens)  # "Step N: " prefix
+        
+        for entry, (text, tokens) in zip(history, rendered):
+            cache[id(entry)] = (entry, text, tokens)
+        self._entry_cache = cache
+        return rendered
+    
+    def _prune_if_needed(self, fixed_tokens: int, entry_tokens: List[int]) -> int:
+        """
+        Work out how many of the oldest history entries to drop so the
+        context fits within the token limit, in a single pass.
+        
+        Args:
+            fixed_tokens: Tokens in all sections other than the history
+            entry_tokens: Tokens of each history entry, oldest first
             
-            return success, score, feedback
+        Returns:
+            Number of history entries to drop
+        """
+        budget = self.max_tokens - self.reserved_tokens
+        header_tokens = self._count_tokens(self._HISTORY_HEADER) if entry_tokens else 0
+        estimated_tokens = fixed_tokens + header_tokens + sum(entry_tokens)
+        if estimated_tokens <= budget:
+            return 0
+        
+        logger.warning(f"Context too long ({estimated_tokens} tokens). Pruning...")
             
-        except Exception as e:
-            logger.error(f"Evaluation model error: {e}")
-            return False, 0.0, f"Evaluation failed: {str(e)}"
+        # Simple pruning strategy: remove oldest history entries
+        drop = 0
+        remaining = estimated_tokens
+        while drop < len(entry_tokens) and remaining > budget:
+            remaining -= entry_tokens[drop]
+            drop += 1
+            if drop == len(entry_tokens):
+                remaining -= header_tokens
+                
+        if drop:
+            logger.info(f"Removed {drop} oldest history entries")
+        return drop
+    
+    def allocate_context(self,
+                         extra_sections: Optional[List[ContextSection]] = None,
+                         utilities: Optional[Dict[str, float]] = None,
+                         method: str = "dp") -> BudgetAllocation:
+        """
+        Assemble the context by choosing sections under the token budget.
+        Unlike get_context_str(), which only drops the oldest history entries,
+        every section competes on utility per token. Nothing is removed from
+        the stored context and no model calls are made.
+        
+        Args:
+            extra_sections: Additional sections such as retrieved chunks or a
+                field representation, placed before the current task
+            utilities: Utility per context key; "history" scales the history
+                entries, which rise from 1x to 2x utility with recency
+                (defaults: goal 3.0, other keys 2.0, history 1.0)
+            method: "dp" (exact knapsack) or "greedy"
+        
+        Returns:
+            BudgetAllocation whose text is the prompt and whose dropped_names
+            lists the sections left out
+        """
+        utilities = utilities or {}
+        sections = []
+        
+        # Instructions and the current task are always kept
+        if "system" in self.context:
+            text, tokens = self._render_section("system", "Instructions")
+            sections.append(ContextSection("system", text, tokens=tokens, required=True))
+        if "goal" in self.context:
+            text, tokens = self._render_section("goal", "Goal")
+            sections.append(ContextSection("goal", text, utilities.get("goal", 3.0), tokens))
+        for key in self.context:
+            if key not in ["system", "goal", "history", "current_input"]:
+                text, tokens = self._render_section(key, key.replace('_', ' ').title())
+                sections.append(ContextSection(key, text, utilities.get(key, 2.0), tokens))
+        
+        # History entries, more recent ones worth more
+        history = self.context.get("history") or []
+        entries = self._render_history(history)
+        if entries:
+            sections.append(ContextSection("history_header", self._HISTORY_HEADER,
+                                           tokens=self._count_tokens(self._HISTORY_HEADER), required=True))
+            history_utility = utilities.get("history", 1.0)
+            for i, (text, tokens) in enumerate(entries):
+                sections.append(ContextSection(
+                    f"history[{i}]", f"Step {i+1}: {text}\n",
+                    history_utility * (1 + (i + 1) / len(entries)), tokens
+                ))
+            sections.append(ContextSection("history_footer", "\n", tokens=0, required=True))
+        
+        sections.extend(extra_sections or [])
+        
+        if "current_input" in self.context:
+            text, tokens = self._render_section("current_input", "Current Task")
+            sections.append(ContextSection("current_input", text, tokens=tokens, required=True))
+        
+        allocator = BudgetAllocator(self.tokenizer, method=method)
+        allocation = allocator.allocate(sections, self.max_tokens - self.reserved_tokens)
+        
+        # Leave out the history heading if no entries made it in
+        if not any(s.name.startswith("history[") for s in allocation.sections):
+            kept = [s for s in allocation.sections if s.name not in ("history_header", "history_footer")]
+            allocation = BudgetAllocation(kept, allocation.dropped, allocation.budget)
+        return allocation
+    
+    def add_to_history(self, entry: Any) -> None:
+        """Add an entry to the interaction history."""
+        if "history" not in self.context:
+            self.context["history"] = []
+        
+        self.context["history"].append(entry)
+        self.history.append({"timestamp": time.time(), "entry": entry})
+    
+    def clear_history(self) -> None:
+        """Clear the interaction history."""
+        if "history" in self.context:
+            self.context["history"] = []
+    
+    def copy(self, include_history: bool = True) -> "ContextManager":
+        """
+        Create an independent context manager with the same settings.
+        The context is deep-copied; the token counter is shared.
+        
+        Args:
+            include_history: Whether to carry over the interaction history
+        
+        Returns:
+            New ContextManager
+        """
+        context = {key: value for key, value in self.context.items()
+                   if include_history or key != "history"}
+        manager = ContextManager(copy.deepcopy(context), self.max_tokens,
+                                 self.reserved_tokens, self.tokenizer)
+        if include_history:
+            manager.history = copy.deepcopy(self.history)
+        return manager
 
 # ------------------------------------------------------------------------------
-# Control Loop
+# Evaluation Functions
 # ------------------------------------------------------------------------------
 
-class ControlLoop:
-    """
+class EvaluationFunction(ABC):
+    """Base class for evaluation functions."""
+    
+    # Whether evaluation mostly waits on I/O (such as a model call) rather than CPU
+    io_bound = False
+    
+    # Whether a failure of this evaluator decides the iteration on its own
+    required = True
+    
+    @abstractmethod
+    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+        """
+        Evaluate a model response.
+        
+        Args:
+            response: The model's response
+            context: The current context dictionary
+            
+        Returns:
+            Tuple of (success_flag, score, feedback)
+        """
+        pass
+    
+    async def aevaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+        """
+        Evaluate a model response from async code.
+        Local evaluators run inline; evaluators that call a model override this.
+        """
+        return self.evaluate(response, context)
+
+    def check_partial(self, partial_response: str, context: Dict[str, Any]) -> Optional[str]:
+        """
+        Check a response that is still being generated.
+        Only return a reason when the finished response can no longer pass,
+        since the generation is cancelled on it.
+        
+        Args:
+            partial_response: Text generated so far
+            context: The current context dictionary
+        
+        Returns:
+            Reason to abort the generation, or None to keep going
+        """
+        return None
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton that finds which of many keywords occur in a text
+    with a single pass over it.
+    
+    Matching is plain substring matching; lowercase the keywords and the text
+    for case-insensitive checks. Small keyword sets skip the automaton and use
+    per-keyword ``in`` scans, which run in C and are faster there.
+    """
+    
+    # Below this many keywords the pure-Python automaton loses to ``in`` scans
+    min_keywords = 256
+    
+    def __init__(self, keywords: List[str], min_keywords: Optional[int] = None):
+        """
+        Build the automaton.
+        
+        Args:
+            keywords: Keywords to search for; duplicates are reported separately
+            min_keywords: Smallest keyword count that builds the automaton
+                (defaults to the class attribute)
+        """
+        self.keywords = list(keywords)
+        if min_keywords is not None:
+            self.min_keywords = min_keywords
+        self._always = frozenset(i for i, kw in enumerate(self.keywords) if not kw)
+        self._delta = None
+        self._output = None
+        
+        if len(self.keywords) >= self.min_keywords:
+            self._build()
+    
+    def _build(self) -> None:
+        """Build the trie, failure links and a full transition table."""
+        goto = [{}]
+        output = [set()]
+        for i, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    output.append(set())
+                    goto[state][ch] = nxt
+                state = nxt
+            output[state].add(i)
+        
+        # Breadth-first, so every failure target is finished before it is used;
+        # folding the failure links into the table leaves one lookup per char
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = goto[0]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            output[state] |= output[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                queue.append(nxt)
+        
+        self._delta = delta
+        self._output = [frozenset(o) for o in output]
+    
+    def find(self, text: str) -> Set[int]:
+        """
+        Find the keywords that occur in a text.
+        
+        Args:
+            text: Text to search
+        
+        Returns:
+            Set of indices into ``keywords`` of the keywords found
+        """
+        if self._delta is None:
+            return {i for i, kw in enumerate(self.keywords) if kw in text}
+        
+        delta = self._delta
+        output = self._output
+        found = set(self._always)
+        total = len(self.keywords)
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                found |= output[state]
+                if len(found) == total:
+                    break
+        return found
+
+# Patterns made only of plain characters and escaped punctuation
+_LITERAL_PATTERN = re.compile(r"(?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*")
+
+def _regex_literal(pattern: str) -> Optional[str]:
+    """Return the text an ASCII regex pattern matches literally, or None."""
+    if not pattern.isascii() or not _LITERAL_PATTERN.fullmatch(pattern):
+        return None
+    return re.sub(r"\\(.)", r"\1", pattern)
+
+# Escapes, lookaround openers and single characters of a regex pattern
+_PATTERN_TOKEN = re.compile(r"\\.|\(\?<?[=!]|.", re.DOTALL)
+
+def _regex_lookahead(pattern: str) -> Optional[int]:
+    """
+    Return how many characters past a match a regex pattern inspects,
+    or None if lookarounds or end anchors leave that unbounded.
+    """
+    lookahead = 0
+    for token in _PATTERN_TOKEN.findall(pattern):
+        if token in ("$", "\\Z") or token.startswith("(?"):
+            return None
+        if token in ("\\b", "\\B"):
+            lookahead = 1
+    return lookahead
+
+class SimpleKeywordEvaluator(EvaluationFunction):
+    """Evaluates responses based on keyword presence."""
+    
+    def __init__(self, required_keywords: List[str], forbidden_keywords: List[str] = None):
+        """
+        Initialize the keyword evaluator.
+        
+        Args:
+            required_keywords: List of keywords that should be present
+            forbidden_keywords: List of keywords that should not be present
+        """
+        self.required_keywords = required_keywords
+        self.forbidden_keywords = forbidden_keywords or []
+        self.matcher = KeywordAutomaton(
+            [kw.lower() for kw in self.required_keywords + self.forbidden_keywords]
+        )
+    
+    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+        """
+        Evaluate based on keyword presence.
+        
+        Returns:
+            Tuple of (success_flag, score, feedback)
+        """
+        found = self.matcher.find(response.lower())
+        
+        # Check required keywords
+        missing_keywords = [kw for i, kw in enumerate(self.required_keywords)
+                           if i not in found]
+        
+        # Check forbidden keywords
+        present_forbidden = [kw for i, kw in enumerate(self.forbidden_keywords, len(self.required_keywords))
+                            if i in found]
+        
+        # Calculate score (0.0 to 1.0)
+        if self.required_keywords:
+            required_score = (len(self.required_keywords) - len(missing_keywords)) / len(self.required_keywords)
+        else:
+            required_score = 1.0
+            
+        if self.forbidden_keywords:
+            forbidden_score = (len(self.forbidden_keywords) - len(present_forbidden)) / len(self.forbidden_keywords)
+        else:
+            forbidden_score = 1.0
+            
+        score = (required_score + forbidden_score) / 2.0
+        success = score > 0.8  # Consider successful if score > 80%
+        
+        # Generate feedback
+        feedback = []
+        if missing_keywords:
+            feedback.append(f"Missing required keywords: {', '.join(missing_keywords)}")
+        if present_forbidden:
+            feedback.append(f"Contains forbidden keywords: {', '.join(present_forbidden)}")
+        if not feedback:
+            feedback.append("Response meets keyword criteria")
+            
+        return success, score, "; ".join(feedback)
+
+    def check_partial(self, partial_response: str, context: Dict[str, Any]) -> Optional[str]:
+        """Abort once forbidden keywords rule out a passing score."""
+        if not self.forbidden_keywords:
+            return None
+        found = self.matcher.find(partial_response.lower())
+        present_forbidden = [kw for i, kw in enumerate(self.forbidden_keywords, len(self.required_keywords))
+                            if i in found]
+        
+        # Best case: every required keyword still shows up and nothing else is forbidden
+        forbidden_score = (len(self.forbidden_keywords) - len(present_forbidden)) / len(self.forbidden_keywords)
+        if (1.0 + forbidden_score) / 2.0 > 0.8:
+            return None
+        return f"Contains forbidden keywords: {', '.join(present_forbidden)}"
+
+class PatternMatchEvaluator(EvaluationFunction):
+    """Evaluates responses based on regex pattern matching."""
+    
+    def __init__(self, required_patterns: List[str], forbidden_patterns: List[str] = None):
+        """
+        Initialize the pattern evaluator.
+        
+        Args:
+            required_patterns: List of regex patterns that should match
+            forbidden_patterns: List of regex patterns that should not match
+        """
+        import re
+        self.re = re
+        self.required_patterns = [re.compile(p, re.IGNORECASE) for p in required_patterns]
+        self.forbidden_patterns = [re.compile(p, re.IGNORECASE) for p in (forbidden_patterns or [])]
+    
+        # Literal patterns are matched together by one keyword automaton;
+        # only real regexes need a search of their own
+        self.literal_indices = []
+        self.regex_indices = []
+        literals = []
+        for i, pattern in enumerate(self.required_patterns + self.forbidden_patterns):
+            literal = _regex_literal(pattern.pattern)
+            if literal is None:
+                self.regex_indices.append(i)
+            else:
+                self.literal_indices.append(i)
+                literals.append(literal.lower())
+        self.matcher = KeywordAutomaton(literals)
+    
+        # Forbidden patterns whose hits on a partial response must survive
+        # the rest of the stream, with the text each needs to see past a hit
+        self.partial_forbidden = []
+        for pattern in self.forbidden_patterns:
+            lookahead = _regex_lookahead(pattern.pattern)
+            if lookahead is not None:
+                self.partial_forbidden.append((pattern, lookahead))
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Modules can't be pickled; needed to run in a process pool
+        state = self.__dict__.copy()
+        state.pop("re", None)
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        import re
+        self.__dict__.update(state)
+        self.re = re
+    
+    def _match(self, response: str) -> Set[int]:
+        """Return the indices of the required and forbidden patterns that match."""
+        patterns = self.required_patterns + self.forbidden_patterns
+        if response.isascii():
+            # Lowercasing agrees with IGNORECASE only for ASCII text
+            found = self.matcher.find(response.lower())
+            matched = {self.literal_indices[j] for j in found}
+            remaining = self.regex_indices
+        else:
+            matched = set()
+            remaining = range(len(patterns))
+        
+        matched.update(i for i in remaining if patterns[i].search(response))
+        return matched
+    
+    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+        """
+        Evaluate based on pattern matching.
+        
+        Returns:
+            Tuple of (success_flag, score, feedback)
+        """
+        matched = self._match(response)
+        
+        # Check required patterns
+        missing_patterns = [p.pattern for i, p in enumerate(self.required_patterns)
+                           if i not in matched]
+        
+        # Check forbidden patterns
+        present_forbidden = [p.pattern for i, p in enumerate(self.forbidden_patterns, len(self.required_patterns))
+                            if i in matched]
+        
+        # Calculate score
+        if self.required_patterns:
+            required_score = (len(self.required_patterns) - len(missing_patterns)) / len(self.required_patterns)
+        else:
+            required_score = 1.0
+            
+        if self.forbidden_patterns:
+            forbidden_score = (len(self.forbidden_patterns) - len(present_forbidden)) / len(self.forbidden_patterns)
+        else:
+            forbidden_score = 1.0
+            
+        score = (required_score + forbidden_score) / 2.0
+        success = score > 0.8  # Consider successful if score > 80%
+        
+        # Generate feedback
+        feedback = []
+        if missing_patterns:
+            feedback.append(f"Missing required patterns: {', '.join(missing_patterns)}")
+        if present_forbidden:
+            feedback.append(f"Contains forbidden patterns: {', '.join(present_forbidden)}")
+        if not feedback:
+            feedback.append("Response meets pattern criteria")
+            
+        return success, score, "; ".join(feedback)
+    
+    def check_partial(self, partial_response: str, context: Dict[str, Any]) -> Optional[str]:
+        """
+        Abort once forbidden patterns rule out a passing score.
+        Patterns with lookarounds or end anchors are left to the final
+        evaluation, since later text can undo their hits; word boundaries
+        only count once the following character has arrived.
+        """
+        if not self.forbidden_patterns:
+            return None
+        present_forbidden = []
+        for pattern, lookahead in self.partial_forbidden:
+            match = pattern.search(partial_response)
+            if match is not None and match.end() + lookahead <= len(partial_response):
+                present_forbidden.append(pattern.pattern)
+        
+        # Best case: every required pattern still shows up and nothing else is forbidden
+        forbidden_score = (len(self.forbidden_patterns) - len(present_forbidden)) / len(self.forbidden_patterns)
+        if (1.0 + forbidden_score) / 2.0 > 0.8:
+            return None
+        return f"Contains forbidden patterns: {', '.join(present_forbidden)}"
+
+class EvaluationCache:
+    """
+    Cache of evaluation results keyed by a content hash.
+    An in-memory LRU sits in front of an optional SQLite file, so grades
+    survive across runs; entries older than the TTL count as missing.
+    """
+    
+    def __init__(self, max_size: int = 1024, path: Optional[str] = None, ttl: Optional[float] = None):
+        """
+        Initialize the evaluation cache.
+        
+        Args:
+            max_size: Maximum number of results kept in memory
+            path: SQLite database file for the on-disk tier (memory only if None)
+            ttl: Seconds before a cached result expires (never if None)
+        """
+        self.max_size = max_size
+        self.path = path
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the parts that determine an evaluation into a cache key."""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+    
+    def _remember(self, key: str, value: Tuple[bool, float, str], created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+    
+    def get(self, key: str) -> Optional[Tuple[bool, float, str]]:
+        """
+        Look up a cached evaluation.
+        
+        Args:
+            key: Key from make_key
+        
+        Returns:
+            Cached (success_flag, score, feedback), or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+            
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM evaluations WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1]):
+                        value = tuple(json.loads(row[0]))
+                        self._remember(key, value, row[1])
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM evaluations WHERE key = ?", (key,))
+                    self._db.commit()
+            
+            self.misses += 1
+            return None
+    
+    def set(self, key: str, value: Tuple[bool, float, str]) -> None:
+        """
+        Store an evaluation in both tiers.
+        
+        Args:
+            key: Key from make_key
+            value: (success_flag, score, feedback) to cache
+        """
+        value = tuple(value)
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO evaluations (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), created)
+                )
+                self._db.commit()
+    
+    def purge_expired(self) -> int:
+        """
+        Drop expired entries from both tiers.
+        
+        Returns:
+            Number of on-disk rows removed
+        """
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            for key in [k for k, (_, created) in self._memory.items() if self._expired(created)]:
+                del self._memory[key]
+            if self._db is None:
+                return 0
+            removed = self._db.execute(
+                "DELETE FROM evaluations WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self._db.commit()
+            return removed
+    
+    def clear(self) -> None:
+        """Remove all cached evaluations and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM evaluations")
+                self._db.commit()
+            self.memory_hits = self.disk_hits = self.misses = 0
+    
+    def close(self) -> None:
+        """Close the SQLite connection, keeping the in-memory tier usable."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def cache_info(self) -> Dict[str, Any]:
+        """Return hit and miss counters for each tier."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+            "max_size": self.max_size,
+            "path": self.path,
+            "ttl": self.ttl
+        }
+
+class ModelEvaluator(EvaluationFunction):
+    """Uses a model to evaluate another model's response."""
+    
+    io_bound = True
+    
+    def __init__(self, model_interface: ModelInterface, evaluation_prompt_template: str,
+                 cache: Optional[EvaluationCache] = None):
+        """
+        Initialize the model evaluator.
+        
+        Args:
+            model_interface: ModelInterface instance for evaluation
+            evaluation_prompt_template: Template for evaluation prompt
+            cache: Cache for evaluation results; anything with get(key) and
+                set(key, value) works (no caching if None)
+        """
+        self.model = model_interface
+        self.evaluation_prompt_template = evaluation_prompt_template
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def _cache_key(self, eval_prompt: str) -> str:
+        """Key an evaluation by the grading model, the template and the rendered prompt."""
+        # The rendered prompt holds the response and exactly the context the template uses
+        return EvaluationCache.make_key(
+            type(self.model).__name__,
+            str(getattr(self.model, "model_name", "")),
+            self.evaluation_prompt_template,
+            eval_prompt
+        )
+    
+    def _cached(self, key: Optional[str]) -> Optional[Tuple[bool, float, str]]:
+        """Look up a cached result and update the hit and miss counters."""
+        if key is None:
+            return None
+        result = self.cache.get(key)
+        if result is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return result
+    
+    def cache_info(self) -> Dict[str, Any]:
+        """Return the evaluator's cache hit and miss counters."""
+        info = {"hits": self.cache_hits, "misses": self.cache_misses}
+        if hasattr(self.cache, "cache_info"):
+            info["cache"] = self.cache.cache_info()
+        return info
+    
+    def evaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+        """
+        Evaluate using another model.
+        
+        Returns:
+            Tuple of (success_flag, score, feedback)
+        """
+        # Create evaluation prompt
+        eval_prompt = self.evaluation_prompt_template.format(
+            response=response,
+            **context
+        )
+        
+        key = self._cache_key(eval_prompt) if self.cache is not None else None
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        
+        # Get evaluation from model
+        try:
+            result = self._parse_evaluation(self.model.generate(eval_prompt))
+        except Exception as e:
+            logger.error(f"Evaluation model error: {e}")
+            return False, 0.0, f"Evaluation failed: {str(e)}"
+        
+        if key is not None:
+            self.cache.set(key, result)
+        return result
+    
+    async def aevaluate(self, response: str, context: Dict[str, Any]) -> Tuple[bool, float, str]:
+        """
+        Evaluate using another model without blocking the event loop.
+        
+        Returns:
+            Tuple of (success_flag, score, feedback)
+        """
+        eval_prompt = self.evaluation_prompt_template.format(
+            response=response,
+            **context
+        )
+        
+        key = self._cache_key(eval_prompt) if self.cache is not None else None
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            result = self._parse_evaluation(await self.model.agenerate(eval_prompt))
+        except Exception as e:
+            logger.error(f"Evaluation model error: {e}")
+            return False, 0.0, f"Evaluation failed: {str(e)}"
+        
+        if key is not None:
+            self.cache.set(key, result)
+        return result
+    
+    def _parse_evaluation(self, eval_response: str) -> Tuple[bool, float, str]:
+        """Parse the evaluation model's output into (success_flag, score, feedback)."""
+        # Try to parse structured response (JSON)
+        try:
+            result = json.loads(eval_response)
+            success = result.get("success", False)
+            score = result.get("score", 0.0)
+            feedback = result.get("feedback", "No feedback provided")
+        except json.JSONDecodeError:
+            # If not JSON, try to extract score and feedback heuristically
+            if "score" in eval_response.lower():
+                # Try to extract score (0-10 or 0-100 scale)
+                import re
+                score_match = re.search(r"score\s*(?::|=)\s*(\d+(?:\.\d+)?)", eval_response, re.IGNORECASE)
+                if score_match:
+                    raw_score = float(score_match.group(1))
+                    # Normalize to 0-1 scale
+                    if raw_score > 10:
+                        score = raw_score / 100.0
+                    else:
+                        score = raw_score / 10.0
+                else:
+                    score = 0.5  # Default middle score
+            else:
+                score = 0.5
+            
+            # Simple heuristic for success based on positive language
+            positive_terms = ["good", "great", "excellent", "correct", "accurate", "yes", "pass"]
+            negative_terms = ["bad", "poor", "incorrect", "inaccurate", "wrong", "no", "fail"]
+            
+            pos_count = sum(1 for term in positive_terms if term in eval_response.lower())
+            neg_count = sum(1 for term in negative_terms if term in eval_response.lower())
+            
+            success = pos_count > neg_count
+            feedback = eval_response.strip()
+        
+        return success, score, feedback
+
+def _timed_evaluation(evaluator: EvaluationFunction, response: str,
+                      context: Dict[str, Any]) -> Tuple[Tuple[bool, float, str], float]:
+    """Run an evaluator and measure its latency in seconds."""
+    start = time.perf_counter()
+    outcome = evaluator.evaluate(response, context)
+    return outcome, time.perf_counter() - start
+
+async def _atimed_evaluation(evaluator: EvaluationFunction, response: str,
+                             context: Dict[str, Any]) -> Tuple[Tuple[bool, float, str], float]:
+    """Run an evaluator asynchronously and measure its latency in seconds."""
+    start = time.perf_counter()
+    outcome = await evaluator.aevaluate(response, context)
+    return outcome, time.perf_counter() - start
+
+class EvaluatorExecutor:
+    """
+    Runs a set of evaluators concurrently.
+    I/O-bound evaluators run on a thread pool and CPU-bound ones on a thread
+    pool, a process pool (evaluators and context must be picklable) or
+    inline in the calling thread. When short-circuiting, evaluators that
+    have not started are cancelled as soon as a required one fails, and
+    those already running are waited for, so no evaluation outlives the
+    call that started it.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None, cpu_pool: str = "thread"):
+        """
+        Initialize the executor.
+        
+        Args:
+            max_workers: Worker count per pool (library default if None)
+            cpu_pool: Where CPU-bound evaluators run: "thread", "process" or "inline"
+        """
+        if cpu_pool == "thread":
+            self.cpu_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="evaluator-cpu")
+        elif cpu_pool == "process":
+            self.cpu_pool = ProcessPoolExecutor(max_workers=max_workers)
+        elif cpu_pool == "inline":
+            self.cpu_pool = None
+        else:
+            raise ValueError(f"Unknown CPU pool type: {cpu_pool}")
+        self.io_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="evaluator-io")
+    
+    def evaluate(self,
+                 evaluators: List[EvaluationFunction],
+                 response: str,
+                 context: Dict[str, Any],
+                 short_circuit: bool = False) -> List[Optional[Tuple[Tuple[bool, float, str], float]]]:
+        """
+        Evaluate a response with every evaluator.
+        
+        Args:
+            evaluators: Evaluators to run
+            response: Model response
+            context: Current context dictionary
+            short_circuit: Whether to stop once a required evaluator fails
+        
+        Returns:
+            ((success, score, feedback), latency) per evaluator in order,
+            or None for evaluators skipped by short-circuiting
+        """
+        results: List[Optional[Tuple[Tuple[bool, float, str], float]]] = [None] * len(evaluators)
+        futures = {}
+        inline = []
+        for i, evaluator in enumerate(evaluators):
+            pool = self.io_pool if evaluator.io_bound else self.cpu_pool
+            if pool is None:
+                inline.append(i)
+            else:
+                futures[pool.submit(_timed_evaluation, evaluator, response, context)] = i
+        
+        def failed(i: int) -> bool:
+            return short_circuit and evaluators[i].required and not results[i][0][0]
+        
+        # Inline evaluators run while the pools work
+        stopped = False
+        try:
+            for i in inline:
+                results[i] = _timed_evaluation(evaluators[i], response, context)
+                if failed(i):
+                    stopped = True
+                    break
+        
+            if not stopped:
+                for future in as_completed(futures):
+                    i = futures[future]
+                    results[i] = future.result()
+                    if failed(i):
+                        stopped = True
+                        break
+        finally:
+            # Cancel what has not started and drain what is still running,
+            # also when an evaluator raised
+            running = [future for future in futures if not future.cancel()]
+            wait_futures(running)
+        
+        if stopped:
+            # Keep the evaluations that finished anyway
+            for future, i in futures.items():
+                if results[i] is None and not future.cancelled():
+                    if future.exception() is None:
+                        results[i] = future.result()
+                    else:
+                        logger.warning(f"Evaluator {i} failed after short-circuit: {future.exception()}")
+        return results
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the worker pools."""
+        self.io_pool.shutdown(wait=wait)
+        if self.cpu_pool is not None:
+            self.cpu_pool.shutdown(wait=wait)
+    
+    def __enter__(self) -> 'EvaluatorExecutor':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+# ------------------------------------------------------------------------------
+# Control Loop
+# ------------------------------------------------------------------------------
+
+def _common_prefix_length(a: bytes, b: bytes) -> int:
+    """Length of the common prefix of two byte strings (binary search on slices)."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+class PromptCacheTracker:
+    """
+    Records how much of each prompt's prefix repeats an earlier call's.
+    Providers cache by prefix, so a call reuses the longest leading run it
+    shares with a prefix sent within the cache lifetime; a prefix that only
+    grew (such as a new attractor appended) still reuses its old part.
+    """
+    
+    def __init__(self, ttl: float = 300.0, max_prefixes: int = 16):
+        """
+        Initialize the tracker.
+        
+        Args:
+            ttl: Seconds a provider keeps an unused prefix cached
+            max_prefixes: Number of distinct recent prefixes to compare against
+        """
+        self.ttl = ttl
+        self.max_prefixes = max_prefixes
+        self._recent = OrderedDict()  # prefix bytes -> time of last use
+        self.calls = 0
+        self.prefix_bytes = 0
+        self.suffix_bytes = 0
+        self.reused_bytes = 0
+        self.cached_tokens = 0
+    
+    def record(self, prompt: PromptParts, cached_tokens: Optional[int] = None) -> int:
+        """
+        Record a call.
+        
+        Args:
+            prompt: Prompt that was sent
+            cached_tokens: Cached prompt tokens reported by the provider, if any
+        
+        Returns:
+            Prefix bytes reused from an earlier call
+        """
+        prefix = prompt.prefix.encode("utf-8")
+        now = time.time()
+        reused = 0
+        for earlier, last_used in list(self._recent.items()):
+            if now - last_used > self.ttl:
+                del self._recent[earlier]
+            elif reused < len(prefix):
+                reused = max(reused, _common_prefix_length(prefix, earlier))
+        
+        if prefix:
+            self._recent.pop(prefix, None)
+            self._recent[prefix] = now
+            while len(self._recent) > self.max_prefixes:
+                self._recent.popitem(last=False)
+        
+        self.calls += 1
+        self.prefix_bytes += len(prefix)
+        self.suffix_bytes += len(prompt.suffix.encode("utf-8"))
+        self.reused_bytes += reused
+        self.cached_tokens += cached_tokens or 0
+        return reused
+    
+    def summary(self) -> Dict[str, Any]:
+        """Return the totals and the share of prompt bytes reused."""
+        total = self.prefix_bytes + self.suffix_bytes
+        return {
+            "calls": self.calls,
+            "prefix_bytes": self.prefix_bytes,
+            "suffix_bytes": self.suffix_bytes,
+            "reused_bytes": self.reused_bytes,
+            "reuse_ratio": self.reused_bytes / total if total else 0.0,
+            "cached_tokens": self.cached_tokens
+        }
+
+def _generate_prompt(model: ModelInterface, prompt: PromptParts,
+                     tracker: PromptCacheTracker) -> Tuple[str, int]:
+    """Generate from a split prompt and record prefix reuse; returns (response, reused bytes)."""
+    if hasattr(model, "generate_with_prefix"):
+        response, cached_tokens = model.generate_with_prefix(prompt.prefix, prompt.suffix)
+    else:
+        response, cached_tokens = model.generate(prompt.text), None
+    return response, tracker.record(prompt, cached_tokens)
+
+async def _agenerate_prompt(model: ModelInterface, prompt: PromptParts,
+                            tracker: PromptCacheTracker) -> Tuple[str, int]:
+    """Async version of _generate_prompt()."""
+    if hasattr(model, "agenerate_with_prefix"):
+        response, cached_tokens = await model.agenerate_with_prefix(prompt.prefix, prompt.suffix)
+    else:
+        response, cached_tokens = await model.agenerate(prompt.text), None
+    return response, tracker.record(prompt, cached_tokens)
+
+class ControlLoop:
+    """
     Main control loop for context-based LLM interactions.
     Manages the flow of information, context updates, and evaluation.
     """
     
-    def __init__(self, 
-                 model: Union[str, ModelInterface],
-                 initial_context: Dict[str, Any] = None,
-                 context_template: Optional[str] = None,
-                 max_iterations: int = 5,
-                 evaluators: List[EvaluationFunction] = None,
-                 stop_on_success: bool = True,
-                 success_threshold: float = 0.8):
+    def __init__(self, 
+                 model: Union[str, ModelInterface],
+                 initial_context: Dict[str, Any] = None,
+                 context_template: Optional[str] = None,
+                 max_iterations: int = 5,
+                 evaluators: List[EvaluationFunction] = None,
+                 stop_on_success: bool = True,
+                 success_threshold: float = 0.8,
+                 evaluator_executor: Optional[EvaluatorExecutor] = None,
+                 stream: bool = False,
+                 stream_check_chars: int = 64):
+        """
+        Initialize the control loop.
+        
+        Args:
+            model: Model name or ModelInterface instance
+            initial_context: Initial context dictionary
+            context_template: Optional template for context formatting
+            max_iterations: Maximum number of iterations
+            evaluators: List of EvaluationFunction instances
+            stop_on_success: Whether to stop iterating on first success
+            success_threshold: Threshold for considering an iteration successful
+            evaluator_executor: Optional executor to run evaluators concurrently;
+                with stop_on_success, remaining evaluators are skipped once a
+                required evaluator fails
+            stream: Whether to stream responses and let required evaluators
+                abort a generation that can no longer pass
+            stream_check_chars: New characters between mid-stream checks
+        """
+        # Set up model interface
+        if isinstance(model, str):
+            if "gpt" in model.lower():
+                self.model = OpenAIInterface(model)
+            elif "claude" in model.lower():
+                self.model = AnthropicInterface(model)
+            else:
+                raise ValueError(f"Unknown model type: {model}")
+        else:
+            self.model = model
+        
+        # Set up context manager
+        self.context_manager = ContextManager(initial_context)
+        self.context_template = context_template
+        
+        # Set up control parameters
+        self.max_iterations = max_iterations
+        self.evaluators = evaluators or []
+        self.stop_on_success = stop_on_success
+        self.success_threshold = success_threshold
+        self.evaluator_executor = evaluator_executor
+        self.stream = stream
+        self.stream_check_chars = stream_check_chars
+        
+        # Set up tracking
+        self.iterations = 0
+        self.results = []
+        self.batch_metrics: Dict[str, Any] = {}
+        self.prompt_cache = PromptCacheTracker()
+    
+    def add_evaluator(self, evaluator: EvaluationFunction) -> None:
+        """Add an evaluation function."""
+        self.evaluators.append(evaluator)
+    
+    def run(self, input_data: Any = None) -> Dict[str, Any]:
+        """
+        Run the control loop with the given input.
+        
+        Args:
+            input_data: Input data for the loop
+            
+        Returns:
+            Result dictionary with final response and metadata
+        """
+        logger.info("Starting control loop")
+        self.iterations = 0
+        self.results = []
+        
+        # Add input to context
+        if input_data:
+            self.context_manager.update("current_input", input_data)
+        
+        final_response = None
+        successful = False
+        
+        # Main control loop
+        while self.iterations < self.max_iterations:
+            self.iterations += 1
+            logger.info(f"Iteration {self.iterations}/{self.max_iterations}")
+            
+            # Get formatted context, split into a stable prefix and a volatile suffix
+            prompt = self.context_manager.get_context_parts(self.context_template)
+            
+            # Generate response from model
+            abort = None
+            try:
+                if self.stream:
+                    response, abort = self._stream_response(prompt.text)
+                    # stream() sends the joined prompt without a cacheable prefix
+                    reused = self.prompt_cache.record(PromptParts("", prompt.text))
+                else:
+                    response, reused = _generate_prompt(self.model, prompt, self.prompt_cache)
+                logger.info(f"Received response ({len(response)} chars)")
+            except Exception as e:
+                logger.error(f"Model generation failed: {e}")
+                break
+                
+            # Store the response
+            final_response = response
+            
+            # Evaluate the response
+            if abort is not None:
+                outcomes = self._aborted_outcomes(response, abort)
+            elif self.evaluator_executor is not None:
+                outcomes = self.evaluator_executor.evaluate(
+                    self.evaluators,
+                    response,
+                    self.context_manager.context,
+                    short_circuit=self.stop_on_success
+                )
+            else:
+                outcomes = [
+                    _timed_evaluation(evaluator, response, self.context_manager.context)
+                    for evaluator in self.evaluators
+                ]
+            
+            # Check if we should stop
+            if self._record_iteration(response, outcomes, aborted=abort is not None,
+                                      prefix_bytes_reused=reused) and self.stop_on_success:
+                logger.info("Stopping on successful iteration")
+                successful = True
+                break
+                
+            # Check if we've reached the maximum iterations
+            if self.iterations >= self.max_iterations:
+                logger.info(f"Reached maximum iterations ({self.max_iterations})")
+                break
+        
+        return self._final_result(successful, final_response)
+    
+    async def arun(self, input_data: Any = None) -> Dict[str, Any]:
+        """
+        Run the control loop asynchronously.
+        Same flow as run(), but the model is called through agenerate() and
+        all evaluators of an iteration run concurrently.
+        
+        Args:
+            input_data: Input data for the loop
+        
+        Returns:
+            Result dictionary with final response and metadata
+        """
+        logger.info("Starting async control loop")
+        self.iterations = 0
+        self.results = []
+        
+        # Add input to context
+        if input_data:
+            self.context_manager.update("current_input", input_data)
+        
+        final_response = None
+        successful = False
+        
+        while self.iterations < self.max_iterations:
+            self.iterations += 1
+            logger.info(f"Iteration {self.iterations}/{self.max_iterations}")
+            
+            prompt = self.context_manager.get_context_parts(self.context_template)
+            
+            abort = None
+            try:
+                if self.stream:
+                    response, abort = await self._astream_response(prompt.text)
+                    reused = self.prompt_cache.record(PromptParts("", prompt.text))
+                else:
+                    response, reused = await _agenerate_prompt(self.model, prompt, self.prompt_cache)
+                logger.info(f"Received response ({len(response)} chars)")
+            except Exception as e:
+                logger.error(f"Model generation failed: {e}")
+                break
+            
+            final_response = response
+            
+            # Evaluate the response with all evaluators at once
+            if abort is not None:
+                outcomes = self._aborted_outcomes(response, abort)
+            else:
+                outcomes = await asyncio.gather(*(
+                    _atimed_evaluation(evaluator, response, self.context_manager.context)
+                    for evaluator in self.evaluators
+                ))
+            
+            if self._record_iteration(response, outcomes, aborted=abort is not None,
+                                      prefix_bytes_reused=reused) and self.stop_on_success:
+                logger.info("Stopping on successful iteration")
+                successful = True
+                break
+            
+            if self.iterations >= self.max_iterations:
+                logger.info(f"Reached maximum iterations ({self.max_iterations})")
+                break
+        
+        return self._final_result(successful, final_response)
+    
+    def _check_partial(self, partial_response: str) -> Optional[Tuple[int, str]]:
+        """Ask the required evaluators whether a partial response can still pass."""
+        for index, evaluator in enumerate(self.evaluators):
+            if not evaluator.required:
+                continue
+            reason = evaluator.check_partial(partial_response, self.context_manager.context)
+            if reason is not None:
+                return index, reason
+        return None
+    
+    def _stream_response(self, context_str: str) -> Tuple[str, Optional[Tuple[int, str]]]:
+        """
+        Stream a response, checking it every stream_check_chars characters.
+        
+        Returns:
+            Tuple of (response text, (evaluator index, reason) if aborted or None)
+        """
+        chunks = []
+        length = checked = 0
+        stream = self.model.stream(context_str)
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                length += len(chunk)
+                if length - checked >= self.stream_check_chars:
+                    checked = length
+                    abort = self._check_partial("".join(chunks))
+                    if abort is not None:
+                        logger.info(f"Aborting generation after {length} chars: {abort[1]}")
+                        return "".join(chunks), abort
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+        return "".join(chunks), None
+    
+    async def _astream_response(self, context_str: str) -> Tuple[str, Optional[Tuple[int, str]]]:
+        """Async version of _stream_response()."""
+        chunks = []
+        length = checked = 0
+        stream = self.model.astream(context_str)
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                length += len(chunk)
+                if length - checked >= self.stream_check_chars:
+                    checked = length
+                    abort = self._check_partial("".join(chunks))
+                    if abort is not None:
+                        logger.info(f"Aborting generation after {length} chars: {abort[1]}")
+                        return "".join(chunks), abort
+        finally:
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+        return "".join(chunks), None
+    
+    def _aborted_outcomes(self, response: str,
+                          abort: Tuple[int, str]) -> List[Optional[Tuple[Tuple[bool, float, str], float]]]:
+        """Score an aborted response with the evaluator that stopped it; skip the rest."""
+        index, reason = abort
+        outcomes = [None] * len(self.evaluators)
+        (_, score, _), latency = _timed_evaluation(self.evaluators[index], response, self.context_manager.context)
+        outcomes[index] = ((False, score, f"Generation aborted: {reason}"), latency)
+        return outcomes
+    
+    def run_batch(self, inputs: Iterable[Any], max_concurrency: int = 8,
+                  timeout: Optional[float] = None):
+        """
+        Run the loop over many inputs, yielding results as they finish.
+        
+        Each input runs in its own copy of the loop with an isolated context,
+        taken from the current context without history or input. The model
+        and evaluators are shared. Aggregate metrics are kept up to date in
+        ``batch_metrics`` while results stream in.
+        
+        Args:
+            inputs: Input data for each run; consumed lazily
+            max_concurrency: Maximum number of inputs in flight
+            timeout: Seconds allowed per input (no limit if None); a timed-out
+                input keeps its slot until its model call returns
+        
+        Yields:
+            Result dictionaries as from run(), plus "index", "input",
+            "elapsed" and "error" (None, "timeout" or the exception message)
+        """
+        loop = asyncio.new_event_loop()
+        batch = self.arun_batch(inputs, max_concurrency, timeout)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(batch.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(batch.aclose())
+            loop.close()
+    
+    async def arun_batch(self, inputs: Iterable[Any], max_concurrency: int = 8,
+                         timeout: Optional[float] = None):
+        """
+        Async version of run_batch().
+        
+        Args:
+            inputs: Input data for each run; consumed lazily
+            max_concurrency: Maximum number of inputs in flight
+            timeout: Seconds allowed per input (no limit if None)
+        
+        Yields:
+            Result dictionaries in completion order
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        
+        base = self.context_manager.copy(include_history=False)
+        base.context.pop("current_input", None)
+        
+        started = time.perf_counter()
+        self.batch_metrics = {
+            "started": 0,
+            "completed": 0,
+            "successful": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "errors": 0,
+            "iterations": 0,
+            "elapsed": 0.0,
+            "throughput": 0.0,
+            "mean_latency": 0.0,
+            "max_latency": 0.0
+        }
+        
+        pending = set()
+        # Timed-out runs whose model call is still running in a worker thread
+        draining = set()
+        remaining = enumerate(inputs)
+        
+        def fill() -> None:
+            # Pull inputs only as slots free up, so huge batches stay bounded
+            while len(pending) + len(draining) < max_concurrency:
+                try:
+                    index, input_data = next(remaining)
+                except StopIteration:
+                    return
+                worker = self._spawn(base)
+                pending.add(asyncio.ensure_future(worker._arun_isolated(index, input_data, timeout, draining)))
+                self.batch_metrics["started"] += 1
+        
+        fill()
+        try:
+            while pending or draining:
+                done, _ = await asyncio.wait(pending | draining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task in draining:
+                        # The abandoned call returned; its slot is free again
+                        draining.discard(task)
+                        if not task.cancelled():
+                            task.exception()
+                        continue
+                    pending.discard(task)
+                    result = task.result()
+                    self._update_batch_metrics(result, time.perf_counter() - started)
+                    yield result
+                fill()
+        finally:
+            for task in pending | draining:
+                task.cancel()
+    
+    def _spawn(self, base: ContextManager) -> "ControlLoop":
+        """Copy the loop for one batch input, sharing the model and evaluators."""
+        worker = copy.copy(self)
+        worker.context_manager = base.copy()
+        worker.iterations = 0
+        worker.results = []
+        # Each input reports its own prefix reuse; a shared tracker would mix them
+        worker.prompt_cache = PromptCacheTracker(self.prompt_cache.ttl, self.prompt_cache.max_prefixes)
+        return worker
+    
+    async def _arun_isolated(self, index: int, input_data: Any, timeout: Optional[float],
+                             draining: Optional[Set[asyncio.Task]] = None) -> Dict[str, Any]:
+        """
+        Run one batch input, turning timeouts and errors into results.
+        
+        A timed-out run is cancelled and its result returned at once. Model
+        calls in worker threads cannot be interrupted, so the cancelled run
+        is added to ``draining`` until those calls return.
+        """
+        start = time.perf_counter()
+        error = None
+        run = asyncio.ensure_future(self.arun(input_data))
+        try:
+            done, _ = await asyncio.wait({run}, timeout=timeout)
+            if not done:
+                run.cancel()
+                if draining is not None:
+                    draining.add(run)
+                raise asyncio.TimeoutError()
+            result = run.result()
+        except asyncio.CancelledError:
+            run.cancel()
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Batch input {index} timed out after {timeout}s")
+            error = "timeout"
+        except Exception as e:
+            logger.error(f"Batch input {index} failed: {e}")
+            error = str(e)
+        
+        if error is not None:
+            last_response = self.results[-1]["response"] if self.results else None
+            result = self._final_result(False, last_response)
+        
+        result.update({
+            "index": index,
+            "input": input_data,
+            "elapsed": time.perf_counter() - start,
+            "error": error
+        })
+        return result
+    
+    def _update_batch_metrics(self, result: Dict[str, Any], elapsed: float) -> None:
+        """Fold a finished batch result into the aggregate metrics."""
+        metrics = self.batch_metrics
+        metrics["completed"] += 1
+        metrics["iterations"] += result["iterations"]
+        if result["successful"]:
+            metrics["successful"] += 1
+        else:
+            metrics["failed"] += 1
+        if result["error"] == "timeout":
+            metrics["timed_out"] += 1
+        elif result["error"] is not None:
+            metrics["errors"] += 1
+        
+        completed = metrics["completed"]
+        metrics["elapsed"] = elapsed
+        metrics["throughput"] = completed / elapsed if elapsed > 0 else 0.0
+        metrics["mean_latency"] += (result["elapsed"] - metrics["mean_latency"]) / completed
+        metrics["max_latency"] = max(metrics["max_latency"], result["elapsed"])
+    
+    def _record_iteration(self, response: str,
+                          outcomes: List[Optional[Tuple[Tuple[bool, float, str], float]]],
+                          aborted: bool = False, prefix_bytes_reused: int = 0) -> bool:
+        """
+        Store an iteration's evaluations and add it to the history.
+        
+        Args:
+            response: Model response
+            outcomes: ((success, score, feedback), latency) per evaluator, in
+                evaluator order, or None for skipped evaluators
+            aborted: Whether the generation was cancelled mid-stream
+            prefix_bytes_reused: Prompt prefix bytes repeated from an earlier call
+        
+        Returns:
+            Whether every evaluator succeeded
+        """
+        evaluation_results = []
+        overall_success = True
+        overall_score = 1.0
+        
+        for evaluator, outcome in zip(self.evaluators, outcomes):
+            if outcome is None:
+                evaluation_results.append({
+                    "evaluator": evaluator.__class__.__name__,
+                    "success": False,
+                    "score": None,
+                    "feedback": ("Skipped after the generation was aborted" if aborted
+                                 else "Skipped after a required evaluator failed"),
+                    "latency": 0.0,
+                    "skipped": True
+                })
+                overall_success = False
+                continue
+            
+            (success, score, feedback), latency = outcome
+            evaluation_results.append({
+                "evaluator": evaluator.__class__.__name__,
+                "success": success,
+                "score": score,
+                "feedback": feedback,
+                "latency": latency
+            })
+            
+            # Update overall results
+            overall_success = overall_success and success
+            overall_score *= score  # Multiply scores for a stricter measure
+        
+        # Store results
+        iteration_result = {
+            "iteration": self.iterations,
+            "response": response,
+            "evaluations": evaluation_results,
+            "success": overall_success,
+            "score": overall_score,
+            "aborted": aborted,
+            "prefix_bytes_reused": prefix_bytes_reused
+        }
+        self.results.append(iteration_result)
+        
+        # Add to history
+        self.context_manager.add_to_history(
+            f"Response: {response}\nEvaluation: {'Success' if overall_success else 'Failure'}"
+        )
+        return overall_success
+    
+    def _final_result(self, successful: bool, final_response: Optional[str]) -> Dict[str, Any]:
+        """Prepare the final result dictionary."""
+        result = {
+            "successful": successful,
+            "iterations": self.iterations,
+            "final_response": final_response,
+            "detailed_results": self.results,
+            "context": self.context_manager.context,
+            "prompt_cache": self.prompt_cache.summary()
+        }
+        
+        logger.info(f"Control loop completed: {'Success' if successful else 'Failure'}")
+        return result
+    
+    def reset(self) -> None:
+        """Reset the control loop to initial state."""
+        self.iterations = 0
+        self.results = []
+        self.context_manager.clear_history()
+
+# ------------------------------------------------------------------------------
+# History Storage
+# ------------------------------------------------------------------------------
+
+class HistoryStore:
+    """
+    Bounded history of field and residue events.
+    Keeps the most recent entries in a fixed-size ring buffer and can
+    optionally append every entry to an on-disk JSONL log, which can be
+    replayed or streamed without loading it into memory.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, log_path: Optional[str] = None):
+        """
+        Initialize the history store.
+        
+        Args:
+            max_entries: Size of the in-memory ring buffer (None for unbounded)
+            log_path: Optional path of an append-only JSONL log of all entries
+        """
+        self.max_entries = max_entries
+        self.log_path = log_path
+        self.entries = deque(maxlen=max_entries)
+        self.total = 0  # Entries ever recorded, including evicted ones
+        self._log_file = None
+    
+    def append(self, entry: Any) -> None:
+        """Record an entry in the ring buffer and the on-disk log."""
+        self.entries.append(entry)
+        self.total += 1
+        
+        if self.log_path:
+            if self._log_file is None:
+                self._log_file = open(self.log_path, "a", encoding="utf-8")
+            self._log_file.write(json.dumps(entry, default=str) + "\n")
+    
+    def extend(self, entries: Any) -> None:
+        """Record several entries."""
+        for entry in entries:
+            self.append(entry)
+    
+    def flush(self) -> None:
+        """Flush buffered log writes to disk."""
+        if self._log_file is not None:
+            self._log_file.flush()
+    
+    def close(self) -> None:
+        """Flush and close the on-disk log."""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+    
+    def __iter__(self):
+        return iter(self.entries)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return list(self.entries)[index]
+        return self.entries[index]
+    
+    def __repr__(self) -> str:
+        return f"HistoryStore(in_memory={len(self.entries)}, total={self.total}, log_path={self.log_path!r})"
+    
+    def iter_all(self):
+        """
+        Stream the full history, reading from the on-disk log if present.
+        
+        Yields:
+            History entries, oldest first
+        """
+        if self.log_path:
+            self.flush()
+            yield from self.replay(self.log_path)
+        else:
+            yield from list(self.entries)
+    
+    def tail(self, n: int) -> List[Any]:
+        """Get the n most recent entries."""
+        if n <= 0:
+            return []
+        return list(self.entries)[-n:]
+    
+    @staticmethod
+    def replay(log_path: str):
+        """
+        Stream entries from an on-disk JSONL log.
+        JSON arrays are restored as tuples, matching how field events are recorded.
+        
+        Args:
+            log_path: Path of the log to read
+        
+        Yields:
+            History entries, oldest first
+        """
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                yield tuple(entry) if isinstance(entry, list) else entry
+    
+    @classmethod
+    def from_log(cls, log_path: str, max_entries: Optional[int] = None) -> 'HistoryStore':
+        """
+        Rebuild a history store by replaying an on-disk log.
+        New entries continue to be appended to the same log.
+        
+        Args:
+            log_path: Path of the log to replay
+            max_entries: Size of the in-memory ring buffer
+        
+        Returns:
+            History store holding the most recent replayed entries
+        """
+        store = cls(max_entries=max_entries)
+        store.extend(cls.replay(log_path))
+        store.log_path = log_path
+        return store
+
+# ------------------------------------------------------------------------------
+# Neural Field Extensions
+# ------------------------------------------------------------------------------
+
+class ResonanceIndex:
+    """
+    Inverted index from tokens to field patterns.
+    Caches each pattern's token set so resonance only needs to be scored
+    against patterns that share at least one token with the trigger.
+    """
+    
+    def __init__(self, parent: Optional['ResonanceIndex'] = None):
+        """
+        Initialize an empty resonance index.
+        
+        Args:
+            parent: Optional read-only index to layer over (used by field forks)
+        """
+        self.tokens: Dict[str, frozenset] = {}  # Pattern -> token set
+        self.postings: Dict[str, Set[str]] = {}  # Token -> patterns
+        self.parent = parent
+    
+    def tokenize(self, pattern: str) -> frozenset:
+        """
+        Get the token set of a pattern, using the cache when indexed.
+        
+        Args:
+            pattern: The pattern to tokenize
+        
+        Returns:
+            Set of lowercase whitespace-separated tokens
+        """
+        words = self.tokens.get(pattern)
+        if words is None:
+            if self.parent is not None:
+                return self.parent.tokenize(pattern)
+            words = frozenset(pattern.lower().split())
+        return words
+    
+    def add(self, pattern: Any, words: Optional[frozenset] = None) -> None:
+        """Index a pattern if it is not already indexed."""
+        if pattern in self.tokens:
+            return
+        
+        if words is None:
+            words = frozenset(pattern.lower().split())
+        self.tokens[pattern] = words
+        for word in words:
+            self.postings.setdefault(word, set()).add(pattern)
+    
+    def discard(self, pattern: str) -> None:
+        """Remove a pattern from the index if present."""
+        words = self.tokens.pop(pattern, None)
+        if words is None:
+            return
+        
+        for word in words:
+            patterns = self.postings.get(word)
+            if patterns is not None:
+                patterns.discard(pattern)
+                if not patterns:
+                    del self.postings[word]
+    
+    def candidates(self, pattern: Any, words: Optional[frozenset] = None) -> Set[Any]:
+        """
+        Get indexed patterns sharing at least one token with a pattern.
+        
+        Args:
+            pattern: The pattern to look up
+            words: Token set of the pattern, if already known
+        
+        Returns:
+            Set of candidate patterns
+        """
+        result: Set[Any] = set()
+        if words is None:
+            words = self.tokenize(pattern)
+        for word in words:
+            patterns = self.postings.get(word)
+            if patterns:
+                result.update(patterns)
+        if self.parent is not None:
+            # Parent entries may be stale for this view; callers filter by state
+            result.update(self.parent.candidates(pattern, words))
+        return result
+    
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+class PatternStore:
+    """
+    Interned storage for field patterns.
+    Base patterns are stored once and referred to by integer ID. A blend
+    produced by an attractor pull is stored as a small
+    ``(base_id, attractor_id, ratio)`` triple and only turned back into
+    text when it is rendered or serialized.
+    """
+    
+    def __init__(self):
+        """Initialize an empty pattern store."""
+        self.ids: Dict[Any, int] = {}  # Base text or blend triple -> ID
+        self.entries: List[Union[str, Tuple[int, int, str]]] = []  # ID -> entry
+        self.tokens: List[frozenset] = []  # ID -> token set
+    
+    def intern(self, text: str) -> int:
+        """
+        Get the ID of a base pattern, storing it if new.
+        
+        Args:
+            text: Pattern text
+        
+        Returns:
+            Pattern ID
+        """
+        pattern_id = self.ids.get(text)
+        if pattern_id is None:
+            pattern_id = self._add(text, frozenset(text.lower().split()))
+        return pattern_id
+    
+    def blend(self, base_id: int, attractor_id: int, blend_ratio: float) -> int:
+        """
+        Get the ID of a blend of two patterns, storing it if new.
+        Equivalent to NeuralField._blend_patterns on the resolved text.
+        
+        Args:
+            base_id: ID of the pattern being pulled
+            attractor_id: ID of the attractor's pattern
+            blend_ratio: Ratio of blending (0.0 to 1.0)
+        
+        Returns:
+            Pattern ID of the blend
+        """
+        ratio = f"{blend_ratio:.2f}"
+        key = (base_id, attractor_id, ratio)
+        pattern_id = self.ids.get(key)
+        if pattern_id is None:
+            # Blended text is "<base> <ratio>↔️ <attractor>", so its tokens are the union
+            words = self.tokens[base_id] | {f"{ratio}↔️"} | self.tokens[attractor_id]
+            pattern_id = self._add(key, words)
+        return pattern_id
+    
+    def lookup(self, text: str) -> Optional[int]:
+        """Get the ID of an interned base pattern without storing it."""
+        return self.ids.get(text)
+    
+    def resolve(self, pattern_id: int) -> str:
+        """
+        Render a pattern ID back to text.
+        
+        Args:
+            pattern_id: Pattern ID
+        
+        Returns:
+            Pattern text, identical to the non-interned field's key
+        """
+        # Iterative so long blend chains do not hit the recursion limit
+        parts = []
+        stack: List[Union[int, str]] = [pattern_id]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            entry = self.entries[item]
+            if isinstance(entry, str):
+                parts.append(entry)
+            else:
+                base_id, attractor_id, ratio = entry
+                stack.extend((attractor_id, f" {ratio}↔️ ", base_id))
+        return "".join(parts)
+    
+    def _add(self, key: Any, words: frozenset) -> int:
+        pattern_id = len(self.entries)
+        self.ids[key] = pattern_id
+        self.entries.append(key)
+        self.tokens.append(frozenset(words))
+        return pattern_id
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary representation without resolving blends."""
+        return {"entries": [e if isinstance(e, str) else list(e) for e in self.entries]}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PatternStore':
+        """Create from dictionary representation."""
+        store = cls()
+        for entry in data.get("entries", []):
+            if isinstance(entry, str):
+                store.intern(entry)
+            else:
+                base_id, attractor_id, ratio = entry
+                store.blend(base_id, attractor_id, float(ratio))
+        return store
+
+class PatternRanking:
+    """
+    Incrementally maintained ranking of field patterns by strength.
+    A lazily-invalidated max-heap: every strength change pushes a new entry,
+    and entries that no longer match the field state are discarded when the
+    top of the heap is read. Decay that scales every pattern by the same
+    factor keeps the order, so the heap is rescaled in place; other bulk
+    changes mark the ranking dirty so it is rebuilt with a single heapify
+    on the next read.
+    """
+    
+    def __init__(self):
+        """Initialize an empty ranking."""
+        self.heap: List[Tuple[float, int, Any]] = []  # (-strength, insertion order, pattern)
+        self.order: Dict[Any, int] = {}  # Pattern -> insertion order, for stable ties
+        self.source: Optional[Any] = None  # State mapping the heap was built from
+        self.dirty = True
+        self._next_order = 0
+    
+    def touch(self, pattern: Any, strength: float) -> None:
+        """Record a new strength for a pattern."""
+        order = self.order.get(pattern)
+        if order is None:
+            order = self.order[pattern] = self._next_order
+            self._next_order += 1
+        heapq.heappush(self.heap, (-strength, order, pattern))
+    
+    def invalidate(self) -> None:
+        """Mark the ranking for a full rebuild on the next read."""
+        self.dirty = True
+    
+    def rescale(self, factor: float) -> None:
+        """
+        Record that every strength was multiplied by the same factor.
+        A positive factor keeps the heap ordered, and scaling the negated
+        strengths gives exactly the products stored in the state.
+        
+        Args:
+            factor: Positive multiplier applied to the whole state
+        """
+        if not self.dirty:
+            self.heap = [(neg_strength * factor, order, pattern)
+                         for neg_strength, order, pattern in self.heap]
+    
+    def discard(self, pattern: Any) -> None:
+        """Drop a removed pattern; its heap entries become stale."""
+        self.order.pop(pattern, None)
+    
+    def rebuild(self, state: Any) -> None:
+        """Rebuild the heap from a field state mapping."""
+        order = {}
+        for pattern in state:
+            previous = self.order.get(pattern)
+            if previous is None:
+                previous = self._next_order
+                self._next_order += 1
+            order[pattern] = previous
+        self.order = order
+        self.heap = [(-strength, order[pattern], pattern) for pattern, strength in state.items()]
+        heapq.heapify(self.heap)
+        self.source = state
+        self.dirty = False
+    
+    def top_k(self, state: Any, k: int) -> List[Tuple[Any, float]]:
+        """
+        Get the k strongest patterns, strongest first.
+        Ties keep insertion order, matching a stable sort of the state.
+        
+        Args:
+            state: Current field state mapping
+            k: Number of patterns to return
+        
+        Returns:
+            List of (pattern, strength) tuples
+        """
+        if self.dirty or self.source is not state or len(self.heap) > 2 * len(self.order) + 64:
+            self.rebuild(state)
+        
+        result = []
+        valid = []
+        seen = set()
+        while self.heap and len(result) < k:
+            entry = heapq.heappop(self.heap)
+            neg_strength, order, pattern = entry
+            if pattern in seen or self.order.get(pattern) != order:
+                continue
+            strength = state.get(pattern)
+            if strength is None or strength != -neg_strength:
+                continue  # Stale entry
+            seen.add(pattern)
+            valid.append(entry)
+            result.append((pattern, strength))
+        
+        for entry in valid:
+            heapq.heappush(self.heap, entry)
+        return result
+
+class CopyOnWriteDict(MutableMapping):
+    """
+    Copy-on-write view over a parent mapping.
+    Reads fall through to the parent; writes and deletions are recorded in
+    the view only, so memory grows with the number of changed entries
+    rather than the size of the parent. The parent must not be mutated
+    while the view is in use.
+    """
+    
+    def __init__(self, parent: Any, copy_value: Optional[Callable[[Any], Any]] = None):
+        """
+        Initialize the copy-on-write view.
+        
+        Args:
+            parent: Mapping to layer the view over
+            copy_value: Optional function copying mutable values on first read,
+                so in-place updates never reach the parent
+        """
+        self.parent = parent
+        self.copy_value = copy_value
+        self.changed: Dict[Any, Any] = {}  # Overrides of parent keys
+        self.added: Dict[Any, Any] = {}  # Keys new to this view, in insertion order
+        self.deleted: Set[Any] = set()  # Parent keys removed in this view
+        self.depth = getattr(parent, "depth", 0) + 1
+    
+    def __getitem__(self, key: Any) -> Any:
+        if key in self.added:
+            return self.added[key]
+        if key in self.deleted:
+            raise KeyError(key)
+        if key in self.changed:
+            return self.changed[key]
+        value = self.parent[key]
+        if self.copy_value is not None:
+            value = self.changed[key] = self.copy_value(value)
+        return value
+    
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if key in self.added:
+            self.added[key] = value
+        elif key in self.parent and key not in self.deleted:
+            self.changed[key] = value
+        else:
+            # A re-inserted key moves to the end, as it would in a dict
+            self.added[key] = value
+    
+    def __delitem__(self, key: Any) -> None:
+        if key in self.added:
+            del self.added[key]
+        elif key in self.parent and key not in self.deleted:
+            self.deleted.add(key)
+            self.changed.pop(key, None)
+        else:
+            raise KeyError(key)
+    
+    def __contains__(self, key: object) -> bool:
+        if key in self.added:
+            return True
+        return key not in self.deleted and key in self.parent
+    
+    def __iter__(self):
+        for key in self.parent:
+            if key not in self.deleted:
+                yield key
+        yield from list(self.added)
+    
+    def __len__(self) -> int:
+        return len(self.parent) - len(self.deleted) + len(self.added)
+    
+    def apply_to(self, target: Any) -> None:
+        """
+        Replay the recorded changes onto a mapping, usually the parent.
+        
+        Args:
+            target: Mapping to update
+        """
+        for key in self.deleted:
+            target.pop(key, None)
+        for key, value in self.changed.items():
+            target[key] = value
+        for key, value in self.added.items():
+            target[key] = value
+
+class FieldSnapshot:
+    """Frozen view of a NeuralField's state and attractors, used by restore()."""
+    
+    def __init__(self, state: Any, attractors: Dict[str, Dict[str, Any]]):
+        self.state = state
+        self.attractors = attractors
+
+class VectorizedFieldState(MutableMapping):
+    """
+    NumPy-backed field state.
+    Behaves like the plain ``{pattern: strength}`` dict used by NeuralField,
+    but keeps strengths in a contiguous float array and stores the
+    pattern-term matrix in column-compressed form (term -> row ids), so
+    resonance, decay and pruning run as batched array operations.
+    """
+    
+    def __init__(self, initial_capacity: int = 256):
+        """
+        Initialize the vectorized field state.
+        
+        Args:
+            initial_capacity: Number of pattern rows to preallocate
+        """
+        try:
+            import numpy as np
+            self.np = np
+        except ImportError:
+            raise ImportError("NumPy package not installed. Install with 'pip install numpy'")
+        
+        self._rows: Dict[str, int] = {}  # Pattern -> row
+        self._patterns: List[Optional[str]] = []  # Row -> pattern (None once removed)
+        self._tokens: List[frozenset] = []  # Row -> token set
+        self._postings: Dict[str, List[int]] = {}  # Term -> rows (sparse matrix columns)
+        self._strengths = np.zeros(initial_capacity, dtype=np.float64)
+        self._sizes = np.zeros(initial_capacity, dtype=np.float64)
+        self._alive = np.zeros(initial_capacity, dtype=bool)
+        self._count = 0  # Rows in use, including removed ones
+    
+    # Mapping protocol
+    
+    def __getitem__(self, pattern: str) -> float:
+        return float(self._strengths[self._rows[pattern]])
+    
+    def __setitem__(self, pattern: str, strength: float) -> None:
+        row = self._rows.get(pattern)
+        if row is None:
+            row = self._append(pattern)
+        self._strengths[row] = strength
+    
+    def __delitem__(self, pattern: str) -> None:
+        row = self._rows.pop(pattern)
+        self._patterns[row] = None
+        self._strengths[row] = 0.0
+        self._alive[row] = False
+    
+    def __iter__(self):
+        return (p for p in self._patterns if p is not None)
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __contains__(self, pattern: object) -> bool:
+        return pattern in self._rows
+    
+    def items(self):
+        strengths = self._strengths
+        return [(p, float(strengths[row])) for row, p in enumerate(self._patterns) if p is not None]
+    
+    def values(self):
+        return [s for _, s in self.items()]
+    
+    def _append(self, pattern: str) -> int:
+        """Add a new row for a pattern, growing the arrays if needed."""
+        np = self.np
+        if self._count == len(self._strengths):
+            capacity = max(1, 2 * len(self._strengths))
+            for name in ("_strengths", "_sizes", "_alive"):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype=old.dtype)
+                grown[:self._count] = old[:self._count]
+                setattr(self, name, grown)
+        
+        row = self._count
+        self._count += 1
+        words = frozenset(pattern.lower().split())
+        self._rows[pattern] = row
+        self._patterns.append(pattern)
+        self._tokens.append(words)
+        self._sizes[row] = len(words)
+        self._alive[row] = True
+        for word in words:
+            self._postings.setdefault(word, []).append(row)
+        return row
+    
+    # Batched field operations
+    
+    def resonance(self, pattern: str, bandwidth: float):
+        """
+        Calculate resonance of every row with a pattern.
+        Matches NeuralField._calculate_resonance element-wise.
+        
+        Args:
+            pattern: Pattern to compare against
+            bandwidth: Resonance bandwidth of the field
+        
+        Returns:
+            Array of resonance scores, one per row
+        """
+        np = self.np
+        n = self._count
+        words = frozenset(pattern.lower().split())
+        if not words or n == 0:
+            return np.zeros(n, dtype=np.float64)
+        
+        # Overlap = pattern-term matrix times the pattern's term indicator
+        rows = [self._postings[w] for w in words if w in self._postings]
+        if not rows:
+            return np.zeros(n, dtype=np.float64)
+        flat = np.fromiter((r for posting in rows for r in posting), dtype=np.int64)
+        overlap = np.bincount(flat, minlength=n).astype(np.float64)
+        
+        sizes = self._sizes[:n]
+        denominator = np.maximum(sizes, float(len(words)))
+        similarity = np.divide(overlap, denominator, out=np.zeros(n), where=sizes > 0)
+        return similarity * bandwidth
+    
+    def apply_resonance(self, trigger_pattern: str, bandwidth: float) -> None:
+        """Strengthen every pattern by its resonance with a trigger pattern."""
+        n = self._count
+        resonance = self.resonance(trigger_pattern, bandwidth)
+        trigger_row = self._rows.get(trigger_pattern)
+        if trigger_row is not None:
+            resonance[trigger_row] = 0.0
+        strengths = self._strengths[:n]
+        strengths += resonance * strengths * 0.2
+    
+    def decay(self, decay_rate: float, attractor_patterns: List[str], bandwidth: float) -> None:
+        """Decay all patterns, protecting those that resonate with attractors."""
+        np = self.np
+        n = self._count
+        protection = np.zeros(n, dtype=np.float64)
+        for attractor_pattern in attractor_patterns:
+            protection += self.resonance(attractor_pattern, bandwidth) * 0.5
+        
+        effective_decay = decay_rate * (1 - np.minimum(protection, 0.9))
+        self._strengths[:n] *= (1 - effective_decay)
+    
+    def best_resonance(self, attractor_patterns: List[str], bandwidth: float):
+        """Get each row's strongest resonance with any attractor."""
+        np = self.np
+        best = np.zeros(self._count, dtype=np.float64)
+        for attractor_pattern in attractor_patterns:
+            np.maximum(best, self.resonance(attractor_pattern, bandwidth), out=best)
+        return best
+    
+    def weighted_sum(self, weights) -> float:
+        """Sum of strengths weighted element-wise by a per-row array."""
+        return float(self.np.dot(weights, self._strengths[:self._count]))
+    
+    def total_strength(self) -> float:
+        """Sum of all pattern strengths."""
+        return float(self._strengths[:self._count].sum())
+    
+    def prune(self, threshold: float) -> List[str]:
+        """
+        Remove patterns whose strength is not above a threshold.
+        
+        Args:
+            threshold: Minimum strength to keep
+        
+        Returns:
+            Patterns that were removed
+        """
+        np = self.np
+        n = self._count
+        dead_rows = np.nonzero(self._alive[:n] & ~(self._strengths[:n] > threshold))[0]
+        removed = [self._patterns[row] for row in dead_rows]
+        for pattern in removed:
+            del self[pattern]
+        
+        # Compact once removed rows dominate the arrays
+        if self._count > 64 and len(self._rows) < self._count // 2:
+            self._compact()
+        return removed
+    
+    def top_k(self, k: int) -> List[Tuple[str, float]]:
+        """
+        Get the k strongest patterns, strongest first.
+        Ties keep insertion order, as with a stable sort over the dict.
+        """
+        np = self.np
+        n = self._count
+        if n == 0 or k <= 0:
+            return []
+        
+        strengths = np.where(self._alive[:n], self._strengths[:n], -np.inf)
+        if k < n:
+            candidates = np.argpartition(-strengths, k - 1)[:k]
+            # Include rows tied with the k-th value so the stable order is exact
+            kth = strengths[candidates].min()
+            candidates = np.nonzero(strengths >= kth)[0]
+        else:
+            candidates = np.arange(n)
+        order = candidates[np.argsort(-strengths[candidates], kind="stable")]
+        return [(self._patterns[row], float(self._strengths[row]))
+                for row in order[:k] if self._alive[row]]
+    
+    def _compact(self) -> None:
+        """Drop removed rows and rebuild the term postings."""
+        np = self.np
+        live = np.nonzero(self._alive[:self._count])[0]
+        capacity = max(len(self._strengths) // 2, len(live), 1)
+        
+        for name in ("_strengths", "_sizes", "_alive"):
+            old = getattr(self, name)
+            compacted = np.zeros(capacity, dtype=old.dtype)
+            compacted[:len(live)] = old[live]
+            setattr(self, name, compacted)
+        
+        self._patterns = [self._patterns[row] for row in live]
+        self._tokens = [self._tokens[row] for row in live]
+        self._rows = {p: row for row, p in enumerate(self._patterns)}
+        self._postings = {}
+        for row, words in enumerate(self._tokens):
+            for word in words:
+                self._postings.setdefault(word, []).append(row)
+        self._count = len(live)
+
+class LazyDecayState(MutableMapping):
+    """
+    Field state that applies decay lazily.
+    Tracks a global tick and the tick each pattern was last written, and
+    applies ``factor ** (tick - last_touched)`` in closed form when a value
+    is read. Advancing the tick is O(1); dead patterns are evicted in
+    periodic sweeps.
+    
+    Values agree with step-by-step eager decay up to floating-point
+    rounding (relative error around 1e-15 per elapsed tick), provided the
+    owner calls sweep() whenever the decay factors change. The tick at
+    which each pattern dies is worked out when it is written, so
+    membership and size checks never evaluate the power.
+    """
+    
+    def __init__(self, decay_factor: Callable[[str], float], threshold: float = 0.01):
         """
-        Initialize the control loop.
+        Initialize the lazy decay state.
         
         Args:
-            model: Model name or ModelInterface instance
-            initial_context: Initial context dictionary
-            context_template: Optional template for context formatting
-            max_iterations: Maximum number of iterations
-            evaluators: List of EvaluationFunction instances
-            stop_on_success: Whether to stop iterating on first success
-            success_threshold: Threshold for considering an iteration successful
+            decay_factor: Function returning a pattern's per-tick decay
+                multiplier, i.e. (1 - effective_decay)
+            threshold: Strength at or below which a decayed pattern is dead
         """
-        # Set up model interface
-        if isinstance(model, str):
-            if "gpt" in model.lower():
-                self.model = OpenAIInterface(model)
-            elif "claude" in model.lower():
-                self.model = AnthropicInterface(model)
-            else:
-                raise ValueError(f"Unknown model type: {model}")
-        else:
-            self.model = model
-        
-        # Set up context manager
-        self.context_manager = ContextManager(initial_context)
-        self.context_template = context_template
+        self.decay_factor = decay_factor
+        self.threshold = threshold
+        self.tick = 0
+        self._values: Dict[str, float] = {}  # Strength as of last touch
+        self._touched: Dict[str, int] = {}  # Tick of last touch
+        self._factors: Dict[str, float] = {}  # Per-tick decay multiplier
+        self._deaths: Dict[str, float] = {}  # Tick at which each pattern dies
+        self._dying: Dict[int, int] = {}  # Future death tick -> number of patterns
+        self._dead = 0  # Stored patterns that have died but not been swept
+    
+    def _death_tick(self, value: float, factor: float) -> float:
+        """
+        Get the number of ticks after which a decayed value is dead.
         
-        # Set up control parameters
-        self.max_iterations = max_iterations
-        self.evaluators = evaluators or []
-        self.stop_on_success = stop_on_success
-        self.success_threshold = success_threshold
+        Args:
+            value: Strength at the time of writing
+            factor: Per-tick decay multiplier
         
-        # Set up tracking
-        self.iterations = 0
-        self.results = []
+        Returns:
+            Smallest elapsed tick count (at least 1) where eager decay would
+            prune the value, or infinity if it never decays that far
+        """
+        if not value * factor > self.threshold:
+            return 1
+        if factor >= 1.0 or self.threshold <= 0:
+            return math.inf
+        # Start from the logarithmic estimate, then settle on the exact
+        # power check used by _current so both agree at the boundary
+        ticks = max(1, int(math.log(self.threshold / value) / math.log(factor)))
+        while ticks > 1 and not value * factor ** (ticks - 1) > self.threshold:
+            ticks -= 1
+        while value * factor ** ticks > self.threshold:
+            ticks += 1
+        return ticks
     
-    def add_evaluator(self, evaluator: EvaluationFunction) -> None:
-        """Add an evaluation function."""
-        self.evaluators.append(evaluator)
+    def _current(self, pattern: str) -> Optional[float]:
+        """Get a pattern's decayed strength, or None if it has died."""
+        # Eager decay would already have pruned a dead pattern
+        if self.tick >= self._deaths[pattern]:
+            return None
+        elapsed = self.tick - self._touched[pattern]
+        value = self._values[pattern]
+        if elapsed:
+            value *= self._factors[pattern] ** elapsed
+        return value
     
-    def run(self, input_data: Any = None) -> Dict[str, Any]:
+    # Mapping protocol
+    
+    def __getitem__(self, pattern: str) -> float:
+        value = self._current(pattern)
+        if value is None:
+            raise KeyError(pattern)
+        return value
+    
+    def __setitem__(self, pattern: str, strength: float) -> None:
+        if pattern in self._values:
+            self._forget_death(pattern)
+        factor = self.decay_factor(pattern)
+        death = self.tick + self._death_tick(strength, factor)
+        self._values[pattern] = strength
+        self._touched[pattern] = self.tick
+        self._factors[pattern] = factor
+        self._deaths[pattern] = death
+        if death != math.inf:
+            self._dying[death] = self._dying.get(death, 0) + 1
+    
+    def __delitem__(self, pattern: str) -> None:
+        if self._current(pattern) is None:
+            raise KeyError(pattern)
+        self._discard(pattern)
+    
+    def __contains__(self, pattern: object) -> bool:
+        return pattern in self._values and self.tick < self._deaths[pattern]
+    
+    def __iter__(self):
+        tick = self.tick
+        deaths = self._deaths
+        return (p for p in list(self._values) if tick < deaths[p])
+    
+    def __len__(self) -> int:
+        return len(self._values) - self._dead
+    
+    def _forget_death(self, pattern: str) -> None:
+        """Remove a stored pattern from the live-entry counts."""
+        death = self._deaths[pattern]
+        if death <= self.tick:
+            self._dead -= 1
+        elif death != math.inf:
+            self._dying[death] -= 1
+            if not self._dying[death]:
+                del self._dying[death]
+    
+    def _discard(self, pattern: str) -> None:
+        self._forget_death(pattern)
+        del self._values[pattern]
+        del self._touched[pattern]
+        del self._factors[pattern]
+        del self._deaths[pattern]
+    
+    # Lazy decay operations
+    
+    def advance(self, ticks: int = 1) -> None:
+        """Advance the global decay clock."""
+        for _ in range(ticks):
+            self.tick += 1
+            self._dead += self._dying.pop(self.tick, 0)
+    
+    def sweep(self) -> List[str]:
         """
-        Run the control loop with the given input.
+        Fold pending decay into stored values and evict dead patterns.
+        Decay factors are refreshed, so call this whenever they change to
+        keep values in step with eager decay.
         
-        Args:
-            input_data: Input data for the loop
-            
         Returns:
-            Result dictionary with final response and metadata
+            Patterns that were evicted
         """
-        logger.info("Starting control loop")
-        self.iterations = 0
-        self.results = []
-        
-        # Add input to context
-        if input_data:
-            self.context_manager.update("current_input", input_data)
-        
-        final_response = None
-        successful = False
-        
-        # Main control loop
-        while self.iterations < self.max_iterations:
-            self.iterations += 1
-            logger.info(f"Iteration {self.iterations}/{self.max_iterations}")
-            
-            # Get formatted context
-            context_str = self.context_manager.get_context_str(self.context_template)
-            
-            # Generate response from model
-            try:
-                response = self.model.generate(context_str)
-                logger.info(f"Received response ({len(response)} chars)")
-            except Exception as e:
-                logger.error(f"Model generation failed: {e}")
-                break
-                
-            # Store the response
-            final_response = response
-            
-            # Evaluate the response
-            evaluation_results = []
-            overall_success = True
-            overall_score = 1.0
-            
-            for evaluator in self.evaluators:
-                success, score, feedback = evaluator.evaluate(
-                    response, 
-                    self.context_manager.context
-                )
-                evaluation_results.append({
-                    "evaluator": evaluator.__class__.__name__,
-                    "success": success,
-                    "score": score,
-                    "feedback": feedback
-                })
-                
-                # Update overall results
-                overall_success = overall_success and success
-                overall_score *= score  # Multiply scores for a stricter measure
-            
-            # Store results
-            iteration_result = {
-                "iteration": self.iterations,
-                "response": response,
-                "evaluations": evaluation_results,
-                "success": overall_success,
-                "score": overall_score
-            }
-            self.results.append(iteration_result)
-            
-            # Add to history
-            self.context_manager.add_to_history(
-                f"Response: {response}\nEvaluation: {'Success' if overall_success else 'Failure'}"
-            )
-            
-            # Check if we should stop
-            if overall_success and self.stop_on_success:
-                logger.info("Stopping on successful iteration")
-                successful = True
-                break
-                
-            # Check if we've reached the maximum iterations
-            if self.iterations >= self.max_iterations:
-                logger.info(f"Reached maximum iterations ({self.max_iterations})")
-                break
-        
-        # Prepare final result
-        result = {
-            "successful": successful,
-            "iterations": self.iterations,
-            "final_response": final_response,
-            "detailed_results": self.results,
-            "context": self.context_manager.context
-        }
-        
-        logger.info(f"Control loop completed: {'Success' if successful else 'Failure'}")
-        return result
-    
-    def reset(self) -> None:
-        """Reset the control loop to initial state."""
-        self.iterations = 0
-        self.results = []
-        self.context_manager.clear_history()
-
-# ------------------------------------------------------------------------------
-# Neural Field Extensions
-# ------------------------------------------------------------------------------
+        removed = []
+        for pattern in list(self._values):
+            value = self._current(pattern)
+            if value is None:
+                self._discard(pattern)
+                removed.append(pattern)
+            else:
+                self[pattern] = value
+        return removed
 
 class NeuralField:
     """
@@ -611,7 +3699,14 @@ class NeuralField:
                  decay_rate: float = 0.05,
                  boundary_permeability: float = 0.8,
                  resonance_bandwidth: float = 0.6,
-                 attractor_formation_threshold: float = 0.7):
+                 attractor_formation_threshold: float = 0.7,
+                 use_resonance_index: bool = False,
+                 backend: str = "dict",
+                 lazy_decay: bool = False,
+                 sweep_interval: int = 10,
+                 history_size: Optional[int] = None,
+                 history_path: Optional[str] = None,
+                 intern_patterns: bool = False):
         """
         Initialize the neural field.
         
@@ -620,16 +3715,51 @@ class NeuralField:
             boundary_permeability: How easily new information enters
             resonance_bandwidth: How broadly patterns resonate
             attractor_formation_threshold: Threshold for attractor formation
+            use_resonance_index: Whether to score resonance through an
+                inverted token index instead of scanning every pattern
+            backend: Field state storage, "dict" or "numpy" (vectorized)
+            lazy_decay: Whether to defer pattern decay until values are read
+            sweep_interval: Decay steps between dead-pattern sweeps in lazy mode
+            history_size: Number of history entries kept in memory (None for all)
+            history_path: Optional JSONL file that receives the full history
+            intern_patterns: Whether to key the field by interned pattern IDs,
+                storing attractor blends as ID triples instead of strings
         """
-        self.state = {}  # Field state
+        if lazy_decay and backend != "dict":
+            raise ValueError("Lazy decay is only supported with the dict backend")
+        if intern_patterns and backend != "dict":
+            raise ValueError("Pattern interning is only supported with the dict backend")
+        
+        if backend == "dict":
+            self.state = LazyDecayState(self._decay_factor) if lazy_decay else {}  # Field state
+        elif backend == "numpy":
+            self.state = VectorizedFieldState()
+        else:
+            raise ValueError(f"Unknown field backend: {backend}")
+        self.backend = backend
+        self.lazy_decay = lazy_decay
+        self.sweep_interval = sweep_interval
         self.attractors = {}  # Stable attractors
-        self.history = []  # Field evolution history
+        self.history = HistoryStore(history_size, history_path)  # Field evolution history
         
         # Field properties
         self.decay_rate = decay_rate
         self.boundary_permeability = boundary_permeability
         self.resonance_bandwidth = resonance_bandwidth
         self.attractor_threshold = attractor_formation_threshold
+        
+        # Optional resonance engine
+        self.resonance_index = ResonanceIndex() if use_resonance_index else None
+    
+        # Optional pattern interning (state and attractors are keyed by pattern ID)
+        self.patterns = PatternStore() if intern_patterns else None
+    
+        # Incremental top-pattern ranking and cached stability organization
+        self.ranking = PatternRanking() if backend == "dict" else None
+        self._organization_cache: Optional[float] = None
+    
+        # Field this one was forked from, if any
+        self.parent: Optional['NeuralField'] = None
     
     def inject(self, pattern: str, strength: float = 1.0) -> 'NeuralField':
         """
@@ -644,6 +3774,10 @@ class NeuralField:
         """
         # Apply boundary filtering
         effective_strength = strength * self.boundary_permeability
+        self._organization_cache = None
+        
+        if self.patterns is not None:
+            pattern = self.patterns.intern(pattern)
         
         # Check resonance with existing attractors
         for attractor_id, attractor in self.attractors.items():
@@ -663,9 +3797,13 @@ class NeuralField:
             self.state[pattern] += effective_strength
         else:
             self.state[pattern] = effective_strength
+            if self.resonance_index is not None:
+                self.resonance_index.add(pattern, self._pattern_tokens(pattern))
+        if self.ranking is not None:
+            self.ranking.touch(pattern, self.state[pattern])
             
-        # Record history
-        self.history.append(("inject", pattern, effective_strength))
+        # Record history with pattern text, so it is readable without the pattern store
+        self.history.append(("inject", self.resolve_pattern(pattern), effective_strength))
         
         # Check for attractor formation
         if pattern in self.state and self.state[pattern] > self.attractor_threshold:
@@ -686,13 +3824,18 @@ class NeuralField:
         Returns:
             ID of the formed attractor
         """
+        if self.patterns is not None and isinstance(pattern, str):
+            pattern = self.patterns.intern(pattern)
+        self._organization_cache = None
+        
         attractor_id = f"attractor_{len(self.attractors)}"
         self.attractors[attractor_id] = {
             'pattern': pattern,
             'strength': self.state[pattern],
-            'formation_time': len(self.history),
+            'formation_time': self.history.total,
             'basin_width': self.resonance_bandwidth
         }
+        self._refresh_lazy_decay()
         return attractor_id
     
     def _process_resonance(self, trigger_pattern: str) -> 'NeuralField':
@@ -705,9 +3848,22 @@ class NeuralField:
         Returns:
             Self for chaining
         """
+        if self.backend == "numpy":
+            self.state.apply_resonance(trigger_pattern, self.resonance_bandwidth)
+            return self
+        
+        # Only patterns sharing a token with the trigger can resonate with it
+        if self.resonance_index is not None:
+            candidates = self.resonance_index.candidates(
+                trigger_pattern, self._pattern_tokens(trigger_pattern)
+            )
+            candidate_items = [(p, self.state[p]) for p in candidates if p in self.state]
+        else:
+            candidate_items = self.state.items()
+        
         # For each existing pattern, calculate resonance with trigger
         resonance_effects = {}
-        for pattern, strength in self.state.items():
+        for pattern, strength in candidate_items:
             if pattern != trigger_pattern:
                 resonance = self._calculate_resonance(pattern, trigger_pattern)
                 effect = resonance * strength * 0.2
@@ -716,6 +3872,8 @@ class NeuralField:
         # Apply resonance effects
         for pattern, effect in resonance_effects.items():
             self.state[pattern] += effect
+            if effect and self.ranking is not None:
+                self.ranking.touch(pattern, self.state[pattern])
         
         return self
     
@@ -727,26 +3885,91 @@ class NeuralField:
             Self for chaining
         """
         # Apply decay to field state
-        for pattern in list(self.state.keys()):
-            # Patterns that resonate with attractors decay more slowly
-            attractor_protection = 0
-            for attractor in self.attractors.values():
-                resonance = self._calculate_resonance(pattern, attractor['pattern'])
-                attractor_protection += resonance * 0.5
-            
-            effective_decay = self.decay_rate * (1 - min(attractor_protection, 0.9))
-            self.state[pattern] *= (1 - effective_decay)
+        uniform_factor = None
+        if self.lazy_decay:
+            # Decay is applied in closed form when values are read
+            self.state.advance()
+        elif self.backend == "numpy":
+            attractor_patterns = [a['pattern'] for a in self.attractors.values()]
+            self.state.decay(self.decay_rate, attractor_patterns, self.resonance_bandwidth)
+        else:
+            factors = {pattern: self._decay_factor(pattern) for pattern in self.state}
+            for pattern, factor in factors.items():
+                self.state[pattern] *= factor
+            if len(set(factors.values())) == 1:
+                uniform_factor = next(iter(factors.values()))
+        
+        # A uniform factor keeps the ranking order and the strength-weighted
+        # organization; anything else needs a rebuild
+        if uniform_factor is None:
+            self._organization_cache = None
+            if self.ranking is not None:
+                self.ranking.invalidate()
+        elif self.ranking is not None:
+            self.ranking.rescale(uniform_factor)
             
         # Apply minimal decay to attractors
         for attractor_id in list(self.attractors.keys()):
             self.attractors[attractor_id]['strength'] *= (1 - self.decay_rate * 0.2)
             
         # Remove patterns that have decayed below threshold
-        self.state = {k: v for k, v in self.state.items() if v > 0.01}
+        if self.lazy_decay:
+            removed = self.state.sweep() if self.state.tick % self.sweep_interval == 0 else []
+        elif self.backend == "numpy":
+            removed = self.state.prune(0.01)
+        else:
+            # Prune in place so copy-on-write forks only record the deletions
+            removed = [k for k, v in self.state.items() if not v > 0.01]
+            for k in removed:
+                del self.state[k]
+        self._discard_patterns(removed)
+        
+        attractor_count = len(self.attractors)
         self.attractors = {k: v for k, v in self.attractors.items() if v['strength'] > 0.1}
+        if len(self.attractors) != attractor_count:
+            self._organization_cache = None
+            self._refresh_lazy_decay()
         
         return self
     
+    def _discard_patterns(self, removed: List[Any]) -> None:
+        """Drop patterns removed from the state from the derived indexes."""
+        if removed:
+            self._organization_cache = None
+        for k in removed:
+            if self.resonance_index is not None:
+                self.resonance_index.discard(k)
+            if self.ranking is not None:
+                self.ranking.discard(k)
+        
+    def _refresh_lazy_decay(self) -> None:
+        """
+        Fold pending lazy decay after the attractor set changed.
+        Decay factors depend on the attractors, so ticks already elapsed
+        are applied at the old factors before the new ones take over.
+        """
+        if self.lazy_decay:
+            self._discard_patterns(self.state.sweep())
+    
+    def _decay_factor(self, pattern: str) -> float:
+        """
+        Get the per-step decay multiplier of a pattern.
+        
+        Args:
+            pattern: The pattern to decay
+        
+        Returns:
+            Multiplier applied to the pattern's strength on each decay step
+        """
+        # Patterns that resonate with attractors decay more slowly
+        attractor_protection = 0
+        for attractor in self.attractors.values():
+            resonance = self._calculate_resonance(pattern, attractor['pattern'])
+            attractor_protection += resonance * 0.5
+        
+        effective_decay = self.decay_rate * (1 - min(attractor_protection, 0.9))
+        return 1 - effective_decay
+    
     def _calculate_resonance(self, pattern1: str, pattern2: str) -> float:
         """
         Calculate resonance between two patterns.
@@ -759,8 +3982,8 @@ class NeuralField:
             Resonance score (0.0 to 1.0)
         """
         # Simple word overlap similarity
-        words1 = set(pattern1.lower().split())
-        words2 = set(pattern2.lower().split())
+        words1 = self._pattern_tokens(pattern1)
+        words2 = self._pattern_tokens(pattern2)
         
         if not words1 or not words2:
             return 0.0
@@ -773,6 +3996,58 @@ class NeuralField:
         
         return resonance
     
+    def _pattern_tokens(self, pattern: Any) -> Set[str]:
+        """
+        Get the word set of a pattern, using cached tokens when available.
+        
+        Args:
+            pattern: Pattern text, or pattern ID when interning
+        
+        Returns:
+            Set of lowercase words
+        """
+        if self.patterns is not None and isinstance(pattern, int):
+            return self.patterns.tokens[pattern]
+        if self.resonance_index is not None:
+            return self.resonance_index.tokenize(pattern)
+        return set(pattern.lower().split())
+    
+    def resolve_pattern(self, pattern: Any) -> str:
+        """
+        Get the text of a field pattern.
+        
+        Args:
+            pattern: State or attractor key (pattern ID when interning)
+        
+        Returns:
+            Pattern text
+        """
+        if self.patterns is not None and isinstance(pattern, int):
+            return self.patterns.resolve(pattern)
+        return pattern
+    
+    def get_patterns(self) -> List[Tuple[str, float]]:
+        """Get (pattern text, strength) pairs for the field state."""
+        return [(self.resolve_pattern(p), s) for p, s in self.state.items()]
+    
+    def get_attractors(self) -> List[Tuple[str, float]]:
+        """Get (pattern text, strength) pairs for the field attractors."""
+        return [(self.resolve_pattern(a['pattern']), a['strength']) for a in self.attractors.values()]
+    
+    def resolved_attractors(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the attractors with pattern text in place of interned IDs.
+        
+        Returns:
+            Attractor dictionary shaped like ``self.attractors``
+        """
+        if self.patterns is None:
+            return self.attractors
+        return {
+            attractor_id: dict(attractor, pattern=self.resolve_pattern(attractor['pattern']))
+            for attractor_id, attractor in self.attractors.items()
+        }
+    
     def _blend_patterns(self, pattern1: str, pattern2: str, blend_ratio: float) -> str:
         """
         Blend two patterns based on ratio.
@@ -785,6 +4060,9 @@ class NeuralField:
         Returns:
             Blended pattern
         """
+        if self.patterns is not None:
+            return self.patterns.blend(pattern1, pattern2, blend_ratio)
+        
         # Simple concatenation with weighting indication
         return f"{pattern1} {blend_ratio:.2f}↔️ {pattern2}"
     
@@ -802,19 +4080,30 @@ class NeuralField:
         avg_strength = sum(a['strength'] for a in self.attractors.values()) / len(self.attractors)
         
         # Measure pattern organization around attractors
-        organization = 0
-        for pattern, strength in self.state.items():
-            best_resonance = max(
-                self._calculate_resonance(pattern, a['pattern']) 
-                for a in self.attractors.values()
-            ) if self.attractors else 0
-            
-            organization += best_resonance * strength
-            
-        if self.state:
-            organization /= sum(self.state.values())
+        if self._organization_cache is not None:
+            organization = self._organization_cache
+        elif self.backend == "numpy":
+            attractor_patterns = [a['pattern'] for a in self.attractors.values()]
+            best_resonance = self.state.best_resonance(attractor_patterns, self.resonance_bandwidth)
+            organization = self.state.weighted_sum(best_resonance)
+            total_strength = self.state.total_strength() if self.state else 0
         else:
             organization = 0
+            for pattern, strength in self.state.items():
+                best_resonance = max(
+                    self._calculate_resonance(pattern, a['pattern']) 
+                    for a in self.attractors.values()
+                ) if self.attractors else 0
+            
+                organization += best_resonance * strength
+            total_strength = sum(self.state.values()) if self.state else 0
+            
+        if self._organization_cache is None:
+            if self.state:
+                organization /= total_strength
+            else:
+                organization = 0
+            self._organization_cache = organization
         
         # Combine metrics
         stability = (avg_strength * 0.6) + (organization * 0.4)
@@ -829,18 +4118,14 @@ class NeuralField:
         """
         parts = []
         
-        # Add attractors
-        if self.attractors:
-            parts.append("# Field Attractors")
-            for attractor_id, attractor in self.attractors.items():
-                parts.append(f"- {attractor_id} (Strength: {attractor['strength']:.2f}): {attractor['pattern'][:100]}...")
-            parts.append("")
-        
         # Add most active patterns
         parts.append("# Active Patterns")
-        active_patterns = sorted(self.state.items(), key=lambda x: x[1], reverse=True)[:5]
+        if self.backend == "numpy":
+            active_patterns = self.state.top_k(5)
+        else:
+            active_patterns = self.ranking.top_k(self.state, 5)
         for pattern, strength in active_patterns:
-            parts.append(f"- ({strength:.2f}): {pattern[:100]}...")
+            parts.append(f"- ({strength:.2f}): {self.resolve_pattern(pattern)[:100]}...")
         
         # Add field metrics
         parts.append("")
@@ -848,7 +4133,176 @@ class NeuralField:
         parts.append(f"Active Patterns: {len(self.state)}")
         parts.append(f"Attractor Count: {len(self.attractors)}")
         
-        return "\n".join(parts)
+        return self._attractor_section() + "\n".join(parts)
+    
+    def _attractor_section(self) -> str:
+        """Render the attractors that open the context representation."""
+        if not self.attractors:
+            return ""
+        lines = ["# Field Attractors"]
+        for attractor_id, attractor in self.attractors.items():
+            lines.append(f"- {attractor_id} (Strength: {attractor['strength']:.2f}): {self.resolve_pattern(attractor['pattern'])[:100]}...")
+        return "\n".join(lines) + "\n\n"
+    
+    def get_context_parts(self) -> PromptParts:
+        """
+        Render the field for prompt caching.
+        Attractor patterns rarely change, so they form the stable prefix;
+        their strengths move on every injection and are listed in the suffix
+        with the rest of the context representation.
+        
+        Returns:
+            PromptParts with the same information as get_context_representation()
+        """
+        rest = self.get_context_representation()[len(self._attractor_section()):]
+        if not self.attractors:
+            return PromptParts("", rest)
+        
+        prefix = ["# Field Attractors"]
+        strengths = ["# Attractor Strengths"]
+        for attractor_id, attractor in self.attractors.items():
+            prefix.append(f"- {attractor_id}: {self.resolve_pattern(attractor['pattern'])[:100]}...")
+            strengths.append(f"- {attractor_id}: {attractor['strength']:.2f}")
+        return PromptParts("\n".join(prefix) + "\n\n", "\n".join(strengths) + "\n\n" + rest)
+    
+    def to_bytes(self, compression: Optional[str] = None) -> bytes:
+        """
+        Serialize the field with BinaryFieldFormat.
+        
+        Args:
+            compression: None, "zlib" or "zstd"
+        
+        Returns:
+            Serialized bytes
+        """
+        return BinaryFieldFormat.dumps(field=self, compression=compression)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'NeuralField':
+        """Create a field from bytes produced by to_bytes()."""
+        field = BinaryFieldFormat.loads(data)["field"]
+        if field is None:
+            raise ValueError("Serialized data contains no neural field")
+        return field
+    
+    # Maximum copy-on-write layers stacked by snapshot() before flattening
+    snapshot_depth_limit = 8
+    
+    def _require_forkable(self) -> None:
+        """Check that the field's state supports copy-on-write layering."""
+        if self.backend != "dict" or self.lazy_decay:
+            raise ValueError("Snapshots and forks require the dict backend without lazy decay")
+    
+    def _reset_derived_state(self) -> None:
+        """Rebuild indexes and caches after the state was swapped out."""
+        if self.resonance_index is not None:
+            self.resonance_index = ResonanceIndex()
+            for pattern in self.state:
+                self.resonance_index.add(pattern, self._pattern_tokens(pattern))
+        self.ranking.invalidate()
+        self._organization_cache = None
+    
+    def snapshot(self) -> FieldSnapshot:
+        """
+        Take a cheap snapshot of the field state and attractors.
+        The current state becomes a frozen base and the field keeps writing to
+        a copy-on-write layer over it, so later memory grows only with the
+        entries changed since the snapshot. History is not rewound.
+        
+        Returns:
+            Snapshot to pass to restore()
+        """
+        self._require_forkable()
+        if getattr(self.state, "depth", 0) >= self.snapshot_depth_limit:
+            self.state = dict(self.state.items())
+        
+        base = self.state
+        self.state = CopyOnWriteDict(base)
+        self.ranking.source = self.state  # Same contents, heap stays valid
+        attractors = {k: dict(v) for k, v in self.attractors.items()}
+        return FieldSnapshot(base, attractors)
+    
+    def restore(self, snapshot: FieldSnapshot) -> 'NeuralField':
+        """
+        Return the field to a snapshot taken with snapshot().
+        
+        Args:
+            snapshot: Snapshot to restore
+        
+        Returns:
+            Self for chaining
+        """
+        self._require_forkable()
+        self.state = CopyOnWriteDict(snapshot.state)
+        self.attractors = {k: dict(v) for k, v in snapshot.attractors.items()}
+        self._reset_derived_state()
+        return self
+    
+    def fork(self) -> 'NeuralField':
+        """
+        Create a copy-on-write fork of the field.
+        The fork reads through to this field and records its own changes, so
+        it costs O(attractors) to create. This field must not be mutated
+        while forks are in use; pass the chosen fork to commit().
+        
+        Returns:
+            Forked field
+        """
+        self._require_forkable()
+        child = copy.copy(self)
+        child.state = CopyOnWriteDict(self.state)
+        child.attractors = CopyOnWriteDict(self.attractors, copy_value=dict)
+        child.history = HistoryStore(self.history.max_entries)
+        child.history.total = self.history.total
+        if self.resonance_index is not None:
+            child.resonance_index = ResonanceIndex(parent=self.resonance_index)
+        child.ranking = PatternRanking()
+        child.parent = self
+        return child
+    
+    def commit(self, fork: 'NeuralField') -> 'NeuralField':
+        """
+        Apply a fork's changes to this field.
+        Other forks of this field become invalid afterwards.
+        
+        Args:
+            fork: Field returned by fork()
+        
+        Returns:
+            Self for chaining
+        """
+        if getattr(fork, "parent", None) is not self:
+            raise ValueError("Can only commit a fork of this field")
+        
+        state = fork.state
+        if isinstance(state, CopyOnWriteDict) and state.parent is self.state:
+            state.apply_to(self.state)
+            if self.resonance_index is not None:
+                for pattern in state.deleted:
+                    self.resonance_index.discard(pattern)
+                for pattern in state.added:
+                    self.resonance_index.add(pattern, self._pattern_tokens(pattern))
+            self.ranking.invalidate()
+            self._organization_cache = None
+        else:
+            self.state = dict(state.items())
+            self._reset_derived_state()
+        
+        self.attractors = {k: v for k, v in fork.attractors.items()}
+        self.history.extend(fork.history)
+        self.history.total = fork.history.total
+        fork.parent = None
+        return self
+
+    def close(self) -> None:
+        """Flush and close the field's on-disk history log."""
+        self.history.close()
+    
+    def __enter__(self) -> 'NeuralField':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
 class NeuralFieldControlLoop(ControlLoop):
     """Control loop implementation using neural field for context management."""
@@ -886,7 +4340,14 @@ class NeuralFieldControlLoop(ControlLoop):
             decay_rate=field_params.get('decay_rate', 0.05),
             boundary_permeability=field_params.get('boundary_permeability', 0.8),
             resonance_bandwidth=field_params.get('resonance_bandwidth', 0.6),
-            attractor_formation_threshold=field_params.get('attractor_threshold', 0.7)
+            attractor_formation_threshold=field_params.get('attractor_threshold', 0.7),
+            use_resonance_index=field_params.get('use_resonance_index', False),
+            backend=field_params.get('backend', 'dict'),
+            lazy_decay=field_params.get('lazy_decay', False),
+            sweep_interval=field_params.get('sweep_interval', 10),
+            history_size=field_params.get('history_size'),
+            history_path=field_params.get('history_path'),
+            intern_patterns=field_params.get('intern_patterns', False)
         )
         
         # Initialize attractors if provided
@@ -923,12 +4384,12 @@ class NeuralFieldControlLoop(ControlLoop):
             # Apply field decay
             self.field.decay()
             
-            # Get field representation
-            context_str = self.field.get_context_representation()
+            # Get field representation, with the attractors as a cacheable prefix
+            prompt = self.field.get_context_parts()
             
             # Generate response from model
             try:
-                response = self.model.generate(context_str)
+                response, reused = _generate_prompt(self.model, prompt, self.prompt_cache)
                 logger.info(f"Received response ({len(response)} chars)")
             except Exception as e:
                 logger.error(f"Model generation failed: {e}")
@@ -948,7 +4409,7 @@ class NeuralFieldControlLoop(ControlLoop):
             # Create a mock context for evaluators
             mock_context = {
                 "current_input": input_data,
-                "history": self.field.history
+                "history": list(self.field.history)
             }
             
             for evaluator in self.evaluators:
@@ -977,7 +4438,8 @@ class NeuralFieldControlLoop(ControlLoop):
                 "evaluations": evaluation_results,
                 "success": overall_success,
                 "score": overall_score,
-                "field_stability": self.field.measure_field_stability()
+                "field_stability": self.field.measure_field_stability(),
+                "prefix_bytes_reused": reused
             }
             self.results.append(iteration_result)
             
@@ -1000,9 +4462,10 @@ class NeuralFieldControlLoop(ControlLoop):
             "detailed_results": self.results,
             "field_state": {
                 "stability": self.field.measure_field_stability(),
-                "attractors": self.field.attractors,
+                "attractors": self.field.resolved_attractors(),
                 "active_patterns": len(self.field.state)
-            }
+            },
+            "prompt_cache": self.prompt_cache.summary()
         }
         
         logger.info(f"Neural field control loop completed: {'Success' if successful else 'Failure'}")
@@ -1013,11 +4476,19 @@ class NeuralFieldControlLoop(ControlLoop):
         self.iterations = 0
         self.results = []
         # Reset field state
+        self.field.close()
         self.field = NeuralField(
             decay_rate=self.field.decay_rate,
             boundary_permeability=self.field.boundary_permeability,
             resonance_bandwidth=self.field.resonance_bandwidth,
-            attractor_formation_threshold=self.field.attractor_threshold
+            attractor_formation_threshold=self.field.attractor_threshold,
+            use_resonance_index=self.field.resonance_index is not None,
+            backend=self.field.backend,
+            lazy_decay=self.field.lazy_decay,
+            sweep_interval=self.field.sweep_interval,
+            history_size=self.field.history.max_entries,
+            history_path=self.field.history.log_path,
+            intern_patterns=self.field.patterns is not None
         )
 
 # ------------------------------------------------------------------------------
@@ -1272,29 +4743,30 @@ class ProtocolShellControlLoop(ControlLoop):
             # Format protocol for model
             protocol_str = self.protocol.format()
             
-            # Add instruction for model
-            context_str = f"""
+            # Protocol and instructions repeat every iteration, so they lead as a
+            # cacheable prefix; the per-iteration context follows
+            prompt = PromptParts(f"""
 # Protocol Execution
 Below is a protocol shell definition. Your task is to execute this protocol 
 by following each step and providing the expected output.
 
 {protocol_str}
 
-# Current Context
-Input: {input_data}
-Iteration: {self.iterations}/{self.max_iterations}
-
 # Instructions
 1. Follow each step in the protocol's process section
 2. Provide reasoning for each step
 3. Return a final output that matches the expected output schema
 
+""", f"""# Current Context
+Input: {input_data}
+Iteration: {self.iterations}/{self.max_iterations}
+
 Please execute the protocol now:
-"""
+""")
             
             # Generate response from model
             try:
-                response = self.model.generate(context_str)
+                response, reused = _generate_prompt(self.model, prompt, self.prompt_cache)
                 logger.info(f"Received response ({len(response)} chars)")
             except Exception as e:
                 logger.error(f"Model generation failed: {e}")
@@ -1348,7 +4820,8 @@ Please execute the protocol now:
                 "extracted_output": extracted_output,
                 "evaluations": evaluation_results,
                 "success": overall_success,
-                "score": overall_score
+                "score": overall_score,
+                "prefix_bytes_reused": reused
             }
             self.results.append(iteration_result)
             
@@ -1374,7 +4847,8 @@ Please execute the protocol now:
                 "intent": self.protocol.intent,
                 "status": self.protocol.state["status"],
                 "output": self.protocol.state["output"]
-            }
+            },
+            "prompt_cache": self.prompt_cache.summary()
         }
         
         logger.info(f"Protocol shell control loop completed: {'Success' if successful else 'Failure'}")
@@ -1451,7 +4925,8 @@ class RecursiveFieldControlLoop:
                  protocol_template: Dict[str, Any] = None,
                  max_iterations: int = 10,
                  evaluators: List[EvaluationFunction] = None,
-                 recursion_depth: int = 3):
+                 recursion_depth: int = 3,
+                 num_candidates: int = 1):
         """
         Initialize the recursive field control loop.
         
@@ -1462,6 +4937,9 @@ class RecursiveFieldControlLoop:
             max_iterations: Maximum number of iterations
             evaluators: List of EvaluationFunction instances
             recursion_depth: Maximum depth of recursive self-improvement
+            num_candidates: Responses generated per iteration, each scored on
+                its own fork of the field (the best one is committed); more
+                than one needs the dict backend without lazy decay
         """
         # Set up model
         if isinstance(model, str):
@@ -1480,7 +4958,14 @@ class RecursiveFieldControlLoop:
             decay_rate=field_params.get('decay_rate', 0.05),
             boundary_permeability=field_params.get('boundary_permeability', 0.8),
             resonance_bandwidth=field_params.get('resonance_bandwidth', 0.6),
-            attractor_formation_threshold=field_params.get('attractor_threshold', 0.7)
+            attractor_formation_threshold=field_params.get('attractor_threshold', 0.7),
+            use_resonance_index=field_params.get('use_resonance_index', False),
+            backend=field_params.get('backend', 'dict'),
+            lazy_decay=field_params.get('lazy_decay', False),
+            sweep_interval=field_params.get('sweep_interval', 10),
+            history_size=field_params.get('history_size'),
+            history_path=field_params.get('history_path'),
+            intern_patterns=field_params.get('intern_patterns', False)
         )
         
         # Set up default protocol template
@@ -1520,12 +5005,17 @@ class RecursiveFieldControlLoop:
         self.max_iterations = max_iterations
         self.evaluators = evaluators or []
         self.recursion_depth = recursion_depth
+        self.num_candidates = max(1, num_candidates)
+        if self.num_candidates > 1 and (self.field.backend != "dict" or self.field.lazy_decay):
+            # Candidates are scored on forks, which need copy-on-write dict state
+            raise ValueError("num_candidates > 1 requires the dict field backend without lazy decay")
         
         # Execution state
         self.iterations = 0
         self.recursion_level = 0
         self.results = []
         self.context = {}
+        self.prompt_cache = PromptCacheTracker()
     
     def run(self, input_data: Any = None) -> Dict[str, Any]:
         """
@@ -1563,24 +5053,18 @@ class RecursiveFieldControlLoop:
             
             # Format protocol for model
             protocol_str = protocol.format()
-            field_str = self.field.get_context_representation()
+            field_parts = self.field.get_context_parts()
             
-            context_str = f"""
+            # Stable parts first (instructions, protocol, attractors) so the
+            # provider can cache them; the changing field state and context follow
+            prompt = PromptParts(f"""
 # Recursive Field Protocol
 Below is a protocol shell definition and the current state of the neural field.
 Your task is to execute this protocol, interact with the field, and generate a response.
 
-## Neural Field State
-{field_str}
-
 ## Protocol
 {protocol_str}
 
-## Current Context
-Input: {input_data}
-Iteration: {self.iterations}/{self.max_iterations}
-Recursion Level: {self.recursion_level}/{self.recursion_depth}
-
 ## Instructions
 1. Follow each step in the protocol's process section
 2. Analyze the neural field state and identify key patterns
@@ -1588,13 +5072,25 @@ Recursion Level: {self.recursion_level}/{self.recursion_depth}
 4. Suggest field updates (new patterns to inject or strengthen)
 5. Return output matching the protocol's output schema
 
+## Neural Field State
+{field_parts.prefix}""", f"""{field_parts.suffix}
+
+## Current Context
+Input: {input_data}
+Iteration: {self.iterations}/{self.max_iterations}
+Recursion Level: {self.recursion_level}/{self.recursion_depth}
+
 Please execute the protocol now:
-"""
+""")
             
             # Generate response from model
+            reused_before = self.prompt_cache.reused_bytes
             try:
-                response = self.model.generate(context_str)
-                logger.info(f"Received response ({len(response)} chars)")
+                if self.num_candidates > 1:
+                    response, extracted_output, evaluation_results = self._select_candidate(prompt)
+                else:
+                    response, _ = _generate_prompt(self.model, prompt, self.prompt_cache)
+                    logger.info(f"Received response ({len(response)} chars)")
             except Exception as e:
                 logger.error(f"Model generation failed: {e}")
                 break
@@ -1602,32 +5098,23 @@ Please execute the protocol now:
             # Store the response
             final_response = response
             
-            # Update context and field
-            self.context["latest_response"] = response
-            self.field.inject(f"Response: {response}", strength=0.8)
+            if self.num_candidates > 1:
+                # Field was already updated by the committed fork
+                self.context["latest_response"] = response
+                if extracted_output:
+                    self.context.update(extracted_output)
+            else:
+                # Update context and field
+                self.context["latest_response"] = response
+                extracted_output = self._apply_response(response)
+                if extracted_output:
+                    self.context.update(extracted_output)
             
-            # Try to extract structured output
-            extracted_output = self._extract_output_from_response(response)
-            if extracted_output:
-                # Process field update suggestions
-                if "field_update" in extracted_output:
-                    field_updates = extracted_output["field_update"]
-                    if isinstance(field_updates, list):
-                        for update in field_updates:
-                            if isinstance(update, str):
-                                self.field.inject(update, strength=0.7)
-                    elif isinstance(field_updates, str):
-                        self.field.inject(field_updates, strength=0.7)
+                # Evaluate the response
+                evaluation_results = self._evaluate_response(response)
                 
-                # Update context
-                self.context.update(extracted_output)
-            
-            # Evaluate the response
-            evaluation_results = self._evaluate_response(response)
             overall_success = all(result["success"] for result in evaluation_results)
-            overall_score = 1.0
-            for result in evaluation_results:
-                overall_score *= result.get("score", 1.0)
+            overall_score = self._score_evaluations(evaluation_results)
             
             # Store results
             iteration_result = {
@@ -1638,7 +5125,8 @@ Please execute the protocol now:
                 "evaluations": evaluation_results,
                 "success": overall_success,
                 "score": overall_score,
-                "field_stability": self.field.measure_field_stability()
+                "field_stability": self.field.measure_field_stability(),
+                "prefix_bytes_reused": self.prompt_cache.reused_bytes - reused_before
             }
             self.results.append(iteration_result)
             
@@ -1676,15 +5164,93 @@ Please execute the protocol now:
             "detailed_results": self.results,
             "field_state": {
                 "stability": self.field.measure_field_stability(),
-                "attractors": self.field.attractors,
+                "attractors": self.field.resolved_attractors(),
                 "active_patterns": len(self.field.state)
             },
-            "context": self.context
+            "context": self.context,
+            "prompt_cache": self.prompt_cache.summary()
         }
         
         logger.info(f"Recursive field control loop completed: {'Success' if successful else 'Failure'}")
         return result
     
+    def _apply_response(self, response: str) -> Optional[Dict[str, Any]]:
+        """
+        Inject a response and its suggested field updates into the field.
+        
+        Args:
+            response: Model response
+        
+        Returns:
+            Extracted structured output, if any
+        """
+        self.field.inject(f"Response: {response}", strength=0.8)
+        
+        # Try to extract structured output
+        extracted_output = self._extract_output_from_response(response)
+        if extracted_output and "field_update" in extracted_output:
+            # Process field update suggestions
+            field_updates = extracted_output["field_update"]
+            if isinstance(field_updates, list):
+                for update in field_updates:
+                    if isinstance(update, str):
+                        self.field.inject(update, strength=0.7)
+            elif isinstance(field_updates, str):
+                self.field.inject(field_updates, strength=0.7)
+        
+        return extracted_output
+    
+    @staticmethod
+    def _score_evaluations(evaluation_results: List[Dict[str, Any]]) -> float:
+        """Combine evaluation scores into an overall score."""
+        overall_score = 1.0
+        for result in evaluation_results:
+            overall_score *= result.get("score", 1.0)
+        return overall_score
+    
+    def _select_candidate(self, prompt: PromptParts) -> Tuple[str, Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Generate several candidate responses and keep the best one.
+        Each candidate is applied and evaluated on its own fork of the field;
+        only the winning fork is committed back.
+        
+        Args:
+            prompt: Prompt for the model
+        
+        Returns:
+            Tuple of (response, extracted_output, evaluation_results)
+        """
+        base_field = self.field
+        best = None
+        best_key = None
+        
+        try:
+            for i in range(self.num_candidates):
+                response, _ = _generate_prompt(self.model, prompt, self.prompt_cache)
+                logger.info(f"Received candidate {i + 1}/{self.num_candidates} ({len(response)} chars)")
+                
+                # Apply and evaluate against a fork so candidates don't interfere
+                self.field = base_field.fork()
+                extracted_output = self._apply_response(response)
+                evaluation_results = self._evaluate_response(response)
+                
+                key = (
+                    all(result["success"] for result in evaluation_results),
+                    self._score_evaluations(evaluation_results)
+                )
+                if best is None or key > best_key:
+                    best = (self.field, response, extracted_output, evaluation_results)
+                    best_key = key
+        finally:
+            self.field = base_field
+        
+        if best is None:
+            raise RuntimeError("No candidate responses generated")
+        
+        fork, response, extracted_output, evaluation_results = best
+        self.field.commit(fork)
+        return response, extracted_output, evaluation_results
+    
     def _generate_protocol(self) -> ProtocolShell:
         """
         Generate a protocol shell for the current iteration.
@@ -1700,9 +5266,10 @@ Please execute the protocol now:
                 if var_name == "current_input":
                     input_params[key] = self.context.get("current_input", "")
                 elif var_name == "field_state":
-                    input_params[key] = "See Neural Field State section above"
+                    input_params[key] = "See Neural Field State section below"
                 elif var_name == "iteration":
-                    input_params[key] = self.iterations
+                    # Keeps the protocol, and so the prompt prefix, the same every iteration
+                    input_params[key] = "See Current Context section below"
                 else:
                     input_params[key] = self.context.get(var_name, f"<{var_name}>")
             else:
@@ -1875,11 +5442,19 @@ Generate an improved response that will score higher on all evaluation metrics.
         self.context = {}
         
         # Reset field
+        self.field.close()
         self.field = NeuralField(
             decay_rate=self.field.decay_rate,
             boundary_permeability=self.field.boundary_permeability,
             resonance_bandwidth=self.field.resonance_bandwidth,
-            attractor_formation_threshold=self.field.attractor_threshold
+            attractor_formation_threshold=self.field.attractor_threshold,
+            use_resonance_index=self.field.resonance_index is not None,
+            backend=self.field.backend,
+            lazy_decay=self.field.lazy_decay,
+            sweep_interval=self.field.sweep_interval,
+            history_size=self.field.history.max_entries,
+            history_path=self.field.history.log_path,
+            intern_patterns=self.field.patterns is not None
         )
 
 # ------------------------------------------------------------------------------
@@ -1935,6 +5510,12 @@ class SymbolicResidue:
             "interactions": self.interactions
         }
     
+    def copy(self) -> 'SymbolicResidue':
+        """Create a copy that does not share the interaction log."""
+        residue = copy.copy(self)
+        residue.interactions = list(self.interactions)
+        return residue
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'SymbolicResidue':
         """Create from dictionary representation."""
@@ -1949,13 +5530,97 @@ class SymbolicResidue:
         residue.interactions = data.get("interactions", [])
         return residue
 
+class ResidueIndex:
+    """
+    Secondary indexes over a tracker's residues.
+    Keeps residue IDs sorted by descending strength, both overall and per
+    state, so threshold, state and top-N queries use binary search instead
+    of scanning every residue. Each residue keeps the sequence number it was
+    first indexed with, which breaks strength ties and restores surfacing
+    order in query results.
+    """
+    
+    def __init__(self):
+        self.entries: Dict[str, Tuple[Tuple[float, int, str], str]] = {}  # ID -> (sort key, state)
+        self.by_strength: List[Tuple[float, int, str]] = []
+        self.by_state: Dict[str, List[Tuple[float, int, str]]] = {}
+        self.next_seq = 0
+    
+    def update(self, residue_id: str, residue: 'SymbolicResidue') -> None:
+        """Index a new residue or re-index one whose strength or state changed."""
+        old = self.entries.get(residue_id)
+        if old is None:
+            seq = self.next_seq
+            self.next_seq += 1
+        else:
+            seq = old[0][1]
+            self._remove(old)
+        
+        key = (-residue.strength, seq, residue_id)
+        self.entries[residue_id] = (key, residue.state)
+        bisect.insort(self.by_strength, key)
+        bisect.insort(self.by_state.setdefault(residue.state, []), key)
+    
+    def discard(self, residue_id: str) -> None:
+        """Remove a residue from the index."""
+        old = self.entries.pop(residue_id, None)
+        if old is not None:
+            self._remove(old)
+    
+    def _remove(self, entry: Tuple[Tuple[float, int, str], str]) -> None:
+        key, state = entry
+        for keys in (self.by_strength, self.by_state[state]):
+            del keys[bisect.bisect_left(keys, key)]
+    
+    def rebuild(self, residues: Dict[str, 'SymbolicResidue']) -> None:
+        """Re-index every residue, in dictionary order."""
+        self.__init__()
+        for residue_id, residue in residues.items():
+            self.update(residue_id, residue)
+    
+    def above(self, min_strength: float, state: Optional[str] = None) -> List[str]:
+        """Get IDs of residues with strength >= min_strength, in surfacing order."""
+        keys = self.by_strength if state is None else self.by_state.get(state, [])
+        end = bisect.bisect_right(keys, (-min_strength, float("inf")))
+        return [rid for _, _, rid in sorted(keys[:end], key=lambda k: k[1])]
+    
+    def in_state(self, state: str) -> List[str]:
+        """Get IDs of residues in a state, in surfacing order."""
+        return [rid for _, _, rid in sorted(self.by_state.get(state, []), key=lambda k: k[1])]
+    
+    def strongest(self, n: int, state: Optional[str] = None) -> List[str]:
+        """Get IDs of the n strongest residues, strongest first."""
+        keys = self.by_strength if state is None else self.by_state.get(state, [])
+        return [rid for _, _, rid in keys[:n]]
+    
+    def copy(self) -> 'ResidueIndex':
+        """Create an independent copy of the index."""
+        index = ResidueIndex()
+        index.entries = dict(self.entries)
+        index.by_strength = list(self.by_strength)
+        index.by_state = {state: list(keys) for state, keys in self.by_state.items()}
+        index.next_seq = self.next_seq
+        return index
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+
 class SymbolicResidueTracker:
     """Tracks and manages symbolic residue in neural fields."""
     
-    def __init__(self):
-        """Initialize the residue tracker."""
+    def __init__(self, history_size: Optional[int] = None, history_path: Optional[str] = None):
+        """
+        Initialize the residue tracker.
+        
+        Args:
+            history_size: Number of history entries kept in memory (None for all)
+            history_path: Optional JSONL file that receives the full history
+        """
         self.residues: Dict[str, SymbolicResidue] = {}
-        self.history: List[Dict[str, Any]] = []
+        self.history = HistoryStore(history_size, history_path)
+        
+        # State and strength indexes, kept current by surface/integrate/echo
+        self.index = ResidueIndex()
     
     def surface(self, content: str, source: str, strength: float = 1.0) -> str:
         """
@@ -1971,6 +5636,7 @@ class SymbolicResidueTracker:
         """
         residue = SymbolicResidue(content, source, strength)
         self.residues[residue.id] = residue
+        self.index.update(residue.id, residue)
         
         self.history.append({
             "action": "surface",
@@ -1995,6 +5661,7 @@ class SymbolicResidueTracker:
         residue = self.residues[residue_id]
         residue.state = "integrated"
         residue.interact(target, "integration", strength_delta)
+        self.index.update(residue_id, residue)
         
         self.history.append({
             "action": "integrate",
@@ -2018,6 +5685,7 @@ class SymbolicResidueTracker:
         residue = self.residues[residue_id]
         residue.state = "echo"
         residue.interact(target, "echo", strength_delta)
+        self.index.update(residue_id, residue)
         
         self.history.append({
             "action": "echo",
@@ -2026,19 +5694,75 @@ class SymbolicResidueTracker:
             "timestamp": time.time()
         })
     
+    def reindex(self) -> None:
+        """
+        Rebuild the state and strength indexes.
+        Needed after residues are changed other than through surface(),
+        integrate() or echo(); added or removed residues are detected
+        automatically.
+        """
+        self.index.rebuild(self.residues)
+    
+    def _checked_index(self) -> ResidueIndex:
+        if len(self.index) != len(self.residues):
+            self.reindex()
+        return self.index
+    
     def get_active_residues(self, min_strength: float = 0.5) -> List[SymbolicResidue]:
         """Get active residues above the specified strength threshold."""
-        return [r for r in self.residues.values() if r.strength >= min_strength]
+        return [self.residues[rid] for rid in self._checked_index().above(min_strength)]
     
     def get_residues_by_state(self, state: str) -> List[SymbolicResidue]:
         """Get residues in the specified state."""
-        return [r for r in self.residues.values() if r.state == state]
+        return [self.residues[rid] for rid in self._checked_index().in_state(state)]
+    
+    def get_strongest_residues(self, n: int, state: Optional[str] = None) -> List[SymbolicResidue]:
+        """
+        Get the strongest residues.
+        
+        Args:
+            n: Maximum number of residues to return
+            state: Optional state to restrict the query to
+        
+        Returns:
+            Up to n residues, strongest first (ties in surfacing order)
+        """
+        return [self.residues[rid] for rid in self._checked_index().strongest(n, state)]
+    
+    def fork(self) -> 'SymbolicResidueTracker':
+        """
+        Create a copy-on-write fork of the tracker.
+        Residues are copied only when the fork reads them.
+        
+        Returns:
+            Forked tracker
+        """
+        child = SymbolicResidueTracker(history_size=self.history.max_entries)
+        child.residues = CopyOnWriteDict(self.residues, copy_value=SymbolicResidue.copy)
+        child.index = self._checked_index().copy()
+        child.history.total = self.history.total
+        return child
+    
+    def commit(self, fork: 'SymbolicResidueTracker') -> None:
+        """
+        Apply a fork's changes to this tracker.
+        
+        Args:
+            fork: Tracker returned by fork()
+        """
+        if isinstance(fork.residues, CopyOnWriteDict) and fork.residues.parent is self.residues:
+            fork.residues.apply_to(self.residues)
+        else:
+            self.residues = dict(fork.residues.items())
+        self.index = fork._checked_index()
+        self.history.extend(fork.history)
+        self.history.total = fork.history.total
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary representation."""
         return {
             "residues": {rid: r.to_dict() for rid, r in self.residues.items()},
-            "history": self.history
+            "history": list(self.history)
         }
     
     @classmethod
@@ -2048,8 +5772,21 @@ class SymbolicResidueTracker:
         
         for rid, rdata in data.get("residues", {}).items():
             tracker.residues[rid] = SymbolicResidue.from_dict(rdata)
+        tracker.reindex()
         
-        tracker.history = data.get("history", [])
+        tracker.history.extend(data.get("history", []))
+        return tracker
+
+    def to_bytes(self, compression: Optional[str] = None) -> bytes:
+        """Serialize the tracker with BinaryFieldFormat."""
+        return BinaryFieldFormat.dumps(tracker=self, compression=compression)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SymbolicResidueTracker':
+        """Create a tracker from bytes produced by to_bytes()."""
+        tracker = BinaryFieldFormat.loads(data)["tracker"]
+        if tracker is None:
+            raise ValueError("Serialized data contains no residue tracker")
         return tracker
 
 class ResidueEnhancedNeuralField(NeuralField):
@@ -2059,10 +5796,21 @@ class ResidueEnhancedNeuralField(NeuralField):
                  decay_rate: float = 0.05,
                  boundary_permeability: float = 0.8,
                  resonance_bandwidth: float = 0.6,
-                 attractor_formation_threshold: float = 0.7):
+                 attractor_formation_threshold: float = 0.7,
+                 use_resonance_index: bool = False,
+                 backend: str = "dict",
+                 lazy_decay: bool = False,
+                 sweep_interval: int = 10,
+                 history_size: Optional[int] = None,
+                 history_path: Optional[str] = None,
+                 intern_patterns: bool = False):
         """Initialize the residue-enhanced neural field."""
-        super().__init__(decay_rate, boundary_permeability, resonance_bandwidth, attractor_formation_threshold)
-        self.residue_tracker = SymbolicResidueTracker()
+        super().__init__(decay_rate, boundary_permeability, resonance_bandwidth, attractor_formation_threshold,
+                         use_resonance_index=use_resonance_index, backend=backend,
+                         lazy_decay=lazy_decay, sweep_interval=sweep_interval,
+                         history_size=history_size, history_path=history_path,
+                         intern_patterns=intern_patterns)
+        self.residue_tracker = SymbolicResidueTracker(history_size=history_size)
     
     def inject(self, pattern: str, strength: float = 1.0, source: str = "manual") -> 'ResidueEnhancedNeuralField':
         """
@@ -2111,12 +5859,25 @@ class ResidueEnhancedNeuralField(NeuralField):
         # Echo weak residues
         active_patterns = set(self.state.keys())
         for residue in self.residue_tracker.get_residues_by_state("surfaced"):
-            if residue.content not in active_patterns and residue.strength < 0.5:
+            content_key = self.patterns.lookup(residue.content) if self.patterns is not None else residue.content
+            if content_key not in active_patterns and residue.strength < 0.5:
                 # Create echo
                 self.residue_tracker.echo(residue.id, "field", -0.1)
         
         return self
     
+    def fork(self) -> 'ResidueEnhancedNeuralField':
+        """Create a copy-on-write fork of the field and its residue tracker."""
+        child = super().fork()
+        child.residue_tracker = self.residue_tracker.fork()
+        return child
+    
+    def commit(self, fork: 'ResidueEnhancedNeuralField') -> 'ResidueEnhancedNeuralField':
+        """Apply a fork's field and residue changes to this field."""
+        super().commit(fork)
+        self.residue_tracker.commit(fork.residue_tracker)
+        return self
+    
     def get_context_representation(self) -> str:
         """Get context representation with residue information."""
         # Get standard representation
@@ -2126,31 +5887,422 @@ class ResidueEnhancedNeuralField(NeuralField):
         parts = [base_repr, "\n# Symbolic Residue"]
         
         # Add surfaced residues
-        surfaced = self.residue_tracker.get_residues_by_state("surfaced")
+        surfaced = self.residue_tracker.get_strongest_residues(3, state="surfaced")
         if surfaced:
             parts.append("## Surfaced Residue")
-            for residue in sorted(surfaced, key=lambda r: r.strength, reverse=True)[:3]:
+            for residue in surfaced:
                 parts.append(f"- ({residue.strength:.2f}) {residue.content[:100]}...")
         
         # Add integrated residues
-        integrated = self.residue_tracker.get_residues_by_state("integrated")
+        integrated = self.residue_tracker.get_strongest_residues(3, state="integrated")
         if integrated:
             parts.append("## Integrated Residue")
-            for residue in sorted(integrated, key=lambda r: r.strength, reverse=True)[:3]:
+            for residue in integrated:
                 # Find most recent integration
                 target = next((i["target"] for i in reversed(residue.interactions) 
                               if i["type"] == "integration"), "unknown")
                 parts.append(f"- ({residue.strength:.2f}) {residue.content[:50]}... → {target}")
         
         # Add echo residues
-        echo = self.residue_tracker.get_residues_by_state("echo")
+        echo = self.residue_tracker.get_strongest_residues(3, state="echo")
         if echo:
             parts.append("## Echo Residue")
-            for residue in sorted(echo, key=lambda r: r.strength, reverse=True)[:3]:
+            for residue in echo:
                 parts.append(f"- ({residue.strength:.2f}) {residue.content[:50]}...")
         
         return "\n".join(parts)
 
+# ------------------------------------------------------------------------------
+# Binary Serialization
+# ------------------------------------------------------------------------------
+
+class BinaryFieldFormat:
+    """
+    Versioned columnar binary format for neural fields and residue trackers.
+    
+    A file is an 8-byte prefix (magic, format version, compression) followed
+    by a body holding a JSON metadata block and 8-byte aligned typed columns.
+    Strengths and timestamps are stored as native arrays and every string
+    lives once in a shared string table, so uncompressed files can be memory
+    mapped and their columns read without an intermediate copy.
+    History entries are stored as JSON lines in the string table.
+    """
+    
+    MAGIC = b"NFLD"
+    VERSION = 1
+    COMPRESSION = {None: 0, "zlib": 1, "zstd": 2}
+    _PREFIX = struct.Struct("<4sHH")
+    _META_LENGTH = struct.Struct("<I")
+    
+    def __init__(self):
+        """Initialize an empty writer."""
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.columns: Dict[str, array] = {}
+    
+    def _string(self, value: str) -> int:
+        """Add a string to the string table and return its index."""
+        index = self.string_ids.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.string_ids[value] = index
+            self.strings.append(value)
+        return index
+    
+    def _column(self, name: str, typecode: str, values: Any) -> None:
+        self.columns[name] = array(typecode, values)
+    
+    def _json_column(self, name: str, entries: Any) -> None:
+        self._column(name, 'q', (self._string(json.dumps(e, default=str)) for e in entries))
+    
+    # Writing
+    
+    def _write_field(self, field: 'NeuralField') -> Dict[str, Any]:
+        """Add a field's columns and return its metadata."""
+        interned = field.patterns is not None
+        if interned:
+            kinds, first, second, ratios = array('B'), array('q'), array('q'), array('d')
+            for entry in field.patterns.entries:
+                if isinstance(entry, str):
+                    kinds.append(0)
+                    first.append(self._string(entry))
+                    second.append(0)
+                    ratios.append(0.0)
+                else:
+                    base_id, attractor_id, ratio = entry
+                    kinds.append(1)
+                    first.append(base_id)
+                    second.append(attractor_id)
+                    ratios.append(float(ratio))
+            self.columns.update({
+                "pattern_kind": kinds, "pattern_a": first,
+                "pattern_b": second, "pattern_ratio": ratios
+            })
+        
+        key = (lambda p: p) if interned else self._string
+        items = list(field.state.items())
+        self._column("state_key", 'q', (key(p) for p, _ in items))
+        self._column("state_strength", 'd', (s for _, s in items))
+        
+        attractors = list(field.attractors.items())
+        self._column("attractor_id", 'q', (self._string(aid) for aid, _ in attractors))
+        self._column("attractor_pattern", 'q', (key(a['pattern']) for _, a in attractors))
+        self._column("attractor_strength", 'd', (a['strength'] for _, a in attractors))
+        self._column("attractor_formation", 'q', (a['formation_time'] for _, a in attractors))
+        self._column("attractor_basin", 'd', (a['basin_width'] for _, a in attractors))
+        
+        self._json_column("field_history", field.history)
+        
+        return {
+            "type": type(field).__name__,
+            "decay_rate": field.decay_rate,
+            "boundary_permeability": field.boundary_permeability,
+            "resonance_bandwidth": field.resonance_bandwidth,
+            "attractor_threshold": field.attractor_threshold,
+            "use_resonance_index": field.resonance_index is not None,
+            "backend": field.backend,
+            "lazy_decay": field.lazy_decay,
+            "sweep_interval": field.sweep_interval,
+            "history_size": field.history.max_entries,
+            "history_total": field.history.total,
+            "intern_patterns": interned
+        }
+    
+    def _write_tracker(self, tracker: 'SymbolicResidueTracker') -> Dict[str, Any]:
+        """Add a residue tracker's columns and return its metadata."""
+        residues = list(tracker.residues.items())
+        self._column("residue_key", 'q', (self._string(rid) for rid, _ in residues))
+        self._column("residue_id", 'q', (self._string(r.id) for _, r in residues))
+        self._column("residue_content", 'q', (self._string(r.content) for _, r in residues))
+        self._column("residue_source", 'q', (self._string(r.source) for _, r in residues))
+        self._column("residue_state", 'q', (self._string(r.state) for _, r in residues))
+        self._column("residue_strength", 'd', (r.strength for _, r in residues))
+        self._column("residue_timestamp", 'd', (r.timestamp for _, r in residues))
+        
+        # Interaction logs are flattened, residue i owns rows offsets[i]:offsets[i + 1]
+        offsets = array('Q', [0])
+        targets, types, deltas, stamps = array('q'), array('q'), array('d'), array('d')
+        for _, residue in residues:
+            for interaction in residue.interactions:
+                targets.append(self._string(interaction["target"]))
+                types.append(self._string(interaction["type"]))
+                deltas.append(interaction["strength_delta"])
+                stamps.append(interaction["timestamp"])
+            offsets.append(len(targets))
+        self.columns.update({
+            "interaction_offset": offsets, "interaction_target": targets,
+            "interaction_type": types, "interaction_delta": deltas,
+            "interaction_timestamp": stamps
+        })
+        
+        self._json_column("tracker_history", tracker.history)
+        
+        return {
+            "history_size": tracker.history.max_entries,
+            "history_total": tracker.history.total
+        }
+    
+    def _pack(self, meta: Dict[str, Any]) -> bytes:
+        """Lay out the string table, columns and metadata as the body."""
+        encoded = [s.encode("utf-8") for s in self.strings]
+        offsets = array('Q', [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        columns = {"string_offset": offsets, "string_data": array('B', b"".join(encoded))}
+        columns.update(self.columns)
+        
+        layout = {}
+        blobs = []
+        position = 0
+        for name, column in columns.items():
+            data = column.tobytes()
+            layout[name] = [column.typecode, position, len(column)]
+            data += b"\0" * (-len(data) % 8)
+            blobs.append(data)
+            position += len(data)
+        
+        meta = dict(meta, byteorder=sys.byteorder, columns=layout)
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        head = self._META_LENGTH.pack(len(meta_bytes)) + meta_bytes
+        head += b"\0" * (-len(head) % 8)
+        return head + b"".join(blobs)
+    
+    @classmethod
+    def dumps(cls,
+              field: Optional['NeuralField'] = None,
+              tracker: Optional['SymbolicResidueTracker'] = None,
+              compression: Optional[str] = None,
+              level: Optional[int] = None) -> bytes:
+        """
+        Serialize a field and/or residue tracker.
+        
+        Args:
+            field: Field to serialize (its residue tracker is included for
+                residue-enhanced fields)
+            tracker: Residue tracker to serialize
+            compression: None, "zlib" or "zstd"
+            level: Optional compression level
+        
+        Returns:
+            Serialized bytes
+        """
+        if compression not in cls.COMPRESSION:
+            raise ValueError(f"Unknown compression: {compression}")
+        if tracker is None and isinstance(field, ResidueEnhancedNeuralField):
+            tracker = field.residue_tracker
+        
+        writer = cls()
+        meta = {}
+        if field is not None:
+            meta["field"] = writer._write_field(field)
+        if tracker is not None:
+            meta["tracker"] = writer._write_tracker(tracker)
+        
+        body = writer._pack(meta)
+        if compression == "zlib":
+            body = zlib.compress(body, 6 if level is None else level)
+        elif compression == "zstd":
+            body = cls._zstd().ZstdCompressor(level=3 if level is None else level).compress(body)
+        return cls._PREFIX.pack(cls.MAGIC, cls.VERSION, cls.COMPRESSION[compression]) + body
+    
+    @classmethod
+    def save(cls, path: str, field: Optional['NeuralField'] = None,
+             tracker: Optional['SymbolicResidueTracker'] = None,
+             compression: Optional[str] = None, level: Optional[int] = None) -> None:
+        """Serialize a field and/or residue tracker to a file."""
+        with open(path, "wb") as f:
+            f.write(cls.dumps(field, tracker, compression, level))
+    
+    # Reading
+    
+    @staticmethod
+    def _zstd():
+        try:
+            import zstandard
+            return zstandard
+        except ImportError:
+            raise ImportError("zstandard package not installed. Install with 'pip install zstandard'")
+    
+    @classmethod
+    def loads(cls, data: Union[bytes, bytearray, memoryview, mmap.mmap]) -> Dict[str, Any]:
+        """
+        Deserialize bytes produced by dumps().
+        
+        Args:
+            data: Serialized bytes or any buffer, such as a memory map
+        
+        Returns:
+            Dictionary with "field" and "tracker" entries (None if absent)
+        """
+        with memoryview(data) as view:
+            if view.nbytes < cls._PREFIX.size:
+                raise ValueError("Not a neural field binary: data too short")
+            magic, version, compression = cls._PREFIX.unpack_from(view)
+            if magic != cls.MAGIC:
+                raise ValueError("Not a neural field binary: bad magic")
+            if version > cls.VERSION:
+                raise ValueError(f"Unsupported neural field binary version {version}")
+            
+            body = view[cls._PREFIX.size:]
+            if compression == cls.COMPRESSION["zlib"]:
+                body = memoryview(zlib.decompress(body))
+            elif compression == cls.COMPRESSION["zstd"]:
+                body = memoryview(cls._zstd().ZstdDecompressor().decompress(body))
+            elif compression != 0:
+                raise ValueError(f"Unknown compression code {compression}")
+            
+            try:
+                return cls._read(body)
+            finally:
+                body.release()
+    
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> Dict[str, Any]:
+        """
+        Deserialize a file written by save().
+        
+        Args:
+            path: File to read
+            use_mmap: Whether to memory map the file instead of reading it
+        
+        Returns:
+            Dictionary with "field" and "tracker" entries (None if absent)
+        """
+        with open(path, "rb") as f:
+            if not use_mmap:
+                return cls.loads(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return cls.loads(mapped)
+    
+    @classmethod
+    def _read(cls, body: memoryview) -> Dict[str, Any]:
+        """Rebuild objects from an uncompressed body."""
+        if body.nbytes < cls._META_LENGTH.size:
+            raise ValueError("Corrupt neural field binary: missing metadata")
+        (meta_length,) = cls._META_LENGTH.unpack_from(body)
+        start = cls._META_LENGTH.size
+        if start + meta_length > body.nbytes:
+            raise ValueError("Corrupt neural field binary: truncated metadata")
+        meta = json.loads(bytes(body[start:start + meta_length]).decode("utf-8"))
+        start += meta_length
+        start += -start % 8
+        swap = meta["byteorder"] != sys.byteorder
+        
+        def column(name: str) -> Any:
+            typecode, offset, count = meta["columns"][name]
+            size = array(typecode).itemsize
+            if start + offset + count * size > body.nbytes:
+                raise ValueError(f"Corrupt neural field binary: truncated column {name}")
+            raw = body[start + offset:start + offset + count * size]
+            if swap:
+                values = array(typecode, raw.tobytes())
+                values.byteswap()
+                return values
+            return raw.cast(typecode)
+        
+        offsets = column("string_offset")
+        data = column("string_data")
+        strings = [str(data[offsets[i]:offsets[i + 1]], "utf-8") for i in range(len(offsets) - 1)]
+        
+        result = {"field": None, "tracker": None}
+        if "tracker" in meta:
+            result["tracker"] = cls._read_tracker(meta["tracker"], column, strings)
+        if "field" in meta:
+            result["field"] = cls._read_field(meta["field"], column, strings)
+            if isinstance(result["field"], ResidueEnhancedNeuralField) and result["tracker"] is not None:
+                result["field"].residue_tracker = result["tracker"]
+        return result
+    
+    @staticmethod
+    def _read_field(meta: Dict[str, Any], column: Callable, strings: List[str]) -> 'NeuralField':
+        field_cls = ResidueEnhancedNeuralField if meta["type"] == "ResidueEnhancedNeuralField" else NeuralField
+        field = field_cls(
+            decay_rate=meta["decay_rate"],
+            boundary_permeability=meta["boundary_permeability"],
+            resonance_bandwidth=meta["resonance_bandwidth"],
+            attractor_formation_threshold=meta["attractor_threshold"],
+            use_resonance_index=meta["use_resonance_index"],
+            backend=meta["backend"],
+            lazy_decay=meta["lazy_decay"],
+            sweep_interval=meta["sweep_interval"],
+            history_size=meta["history_size"],
+            intern_patterns=meta["intern_patterns"]
+        )
+        
+        if meta["intern_patterns"]:
+            entries = []
+            for kind, a, b, ratio in zip(column("pattern_kind"), column("pattern_a"),
+                                         column("pattern_b"), column("pattern_ratio")):
+                entries.append(strings[a] if kind == 0 else [a, b, ratio])
+            field.patterns = PatternStore.from_dict({"entries": entries})
+            key = int
+        else:
+            key = strings.__getitem__
+        
+        for pattern, strength in zip(column("state_key"), column("state_strength")):
+            pattern = key(pattern)
+            field.state[pattern] = strength
+            if field.resonance_index is not None:
+                field.resonance_index.add(pattern, field._pattern_tokens(pattern))
+        if field.ranking is not None:
+            field.ranking.invalidate()
+        
+        for aid, pattern, strength, formation, basin in zip(
+                column("attractor_id"), column("attractor_pattern"), column("attractor_strength"),
+                column("attractor_formation"), column("attractor_basin")):
+            field.attractors[strings[aid]] = {
+                'pattern': key(pattern),
+                'strength': strength,
+                'formation_time': formation,
+                'basin_width': basin
+            }
+        field._refresh_lazy_decay()
+        
+        field.history.extend(
+            tuple(entry) if isinstance(entry, list) else entry
+            for entry in (json.loads(strings[i]) for i in column("field_history"))
+        )
+        field.history.total = meta["history_total"]
+        return field
+    
+    @staticmethod
+    def _read_tracker(meta: Dict[str, Any], column: Callable, strings: List[str]) -> 'SymbolicResidueTracker':
+        tracker = SymbolicResidueTracker(history_size=meta["history_size"])
+        
+        offsets = column("interaction_offset")
+        targets = column("interaction_target")
+        types = column("interaction_type")
+        deltas = column("interaction_delta")
+        stamps = column("interaction_timestamp")
+        
+        rows = zip(column("residue_key"), column("residue_id"), column("residue_content"),
+                   column("residue_source"), column("residue_state"),
+                   column("residue_strength"), column("residue_timestamp"))
+        for i, (key, rid, content, source, state, strength, timestamp) in enumerate(rows):
+            residue = SymbolicResidue(
+                content=strings[content],
+                source=strings[source],
+                strength=strength,
+                state=strings[state]
+            )
+            residue.id = strings[rid]
+            residue.timestamp = timestamp
+            residue.interactions = [
+                {
+                    "target": strings[targets[j]],
+                    "type": strings[types[j]],
+                    "strength_delta": deltas[j],
+                    "timestamp": stamps[j]
+                }
+                for j in range(offsets[i], offsets[i + 1])
+            ]
+            tracker.residues[strings[key]] = residue
+        tracker.reindex()
+        
+        tracker.history.extend(json.loads(strings[i]) for i in column("tracker_history"))
+        tracker.history.total = meta["history_total"]
+        return tracker
+
 # ------------------------------------------------------------------------------
 # Usage Examples
 # ------------------------------------------------------------------------------
@@ -2388,6 +6540,305 @@ def recursive_field_example():
     print(f"Field stability: {result['field_state']['stability']}")
     print(f"Final response: {result['final_response'][:100]}...")
 
+def resonance_index_benchmark(num_patterns: int = 10000, vocabulary_size: int = 5000):
+    """
+    Benchmark field injection with and without the resonance index.
+    Uses synthetic patterns, so no model API is required.
+    
+    Args:
+        num_patterns: Number of patterns to inject
+        vocabulary_size: Number of distinct words to draw patterns from
+    """
+    import random
+    
+    rng = random.Random(42)
+    vocabulary = [f"term{i}" for i in range(vocabulary_size)]
+    patterns = [" ".join(rng.sample(vocabulary, 8)) for _ in range(num_patterns)]
+    
+    timings = {}
+    fields = {}
+    for use_index in (False, True):
+        field = NeuralField(use_resonance_index=use_index)
+        start = time.perf_counter()
+        for pattern in patterns:
+            field.inject(pattern, strength=0.5)
+        timings[use_index] = time.perf_counter() - start
+        fields[use_index] = field
+    
+    # Both engines must produce the same field
+    identical = fields[False].state == fields[True].state
+    
+    print(f"Injected {num_patterns} patterns")
+    print(f"Full scan:       {timings[False]:.2f}s")
+    print(f"Resonance index: {timings[True]:.2f}s")
+    print(f"Speedup:         {timings[False] / max(timings[True], 1e-9):.1f}x")
+    print(f"Identical state: {identical}")
+
+def binary_serialization_example(num_patterns: int = 2000):
+    """Round-trip a residue-enhanced field through the binary format and compare sizes."""
+    import random
+    
+    vocabulary = [f"term{i}" for i in range(500)]
+    rng = random.Random(0)
+    field = ResidueEnhancedNeuralField(attractor_formation_threshold=10.0)
+    for i in range(num_patterns):
+        field.inject(" ".join(rng.sample(vocabulary, 6)), strength=rng.random())
+        if i % 50 == 0:
+            field.decay()
+    tracker = field.residue_tracker
+    
+    start = time.time()
+    json_data = json.dumps(tracker.to_dict())
+    json_time = time.time() - start
+    
+    results = {}
+    for compression in (None, "zlib"):
+        start = time.time()
+        data = tracker.to_bytes(compression=compression)
+        restored = SymbolicResidueTracker.from_bytes(data)
+        results[compression] = (len(data), time.time() - start, restored.to_dict() == tracker.to_dict())
+    
+    restored_field = NeuralField.from_bytes(field.to_bytes(compression="zlib"))
+    
+    print(f"Residues: {len(tracker.residues)}")
+    print(f"JSON dump:       {len(json_data)} bytes, {json_time:.3f}s")
+    for compression, (size, elapsed, identical) in results.items():
+        print(f"Binary ({compression or 'raw'}): {size} bytes, {elapsed:.3f}s round trip, matches dict format: {identical}")
+    print(f"Field state preserved: {dict(restored_field.state.items()) == dict(field.state.items())}")
+
+def async_evaluation_benchmark(num_evaluators: int = 5, latency: float = 0.2, iterations: int = 3):
+    """Compare sequential and concurrent model evaluation using a fake async model."""
+    def make_loop():
+        evaluators = [
+            ModelEvaluator(
+                FakeAsyncModel(['{"success": false, "score": 0.5, "feedback": "Needs work"}'], latency=latency),
+                "Evaluate this response: {response}"
+            )
+            for _ in range(num_evaluators)
+        ]
+        return ControlLoop(
+            model=FakeAsyncModel(["Draft answer"], latency=latency),
+            max_iterations=iterations,
+            evaluators=evaluators
+        )
+    
+    start = time.time()
+    sequential = make_loop().run("Explain attractors")
+    sequential_time = time.time() - start
+    
+    start = time.time()
+    concurrent = asyncio.run(make_loop().arun("Explain attractors"))
+    concurrent_time = time.time() - start
+    
+    print(f"{iterations} iterations, {num_evaluators} evaluators, {latency:.2f}s model latency")
+    print(f"Sequential run(): {sequential_time:.2f}s")
+    print(f"Async arun():     {concurrent_time:.2f}s")
+    print(f"Speedup:          {sequential_time / max(concurrent_time, 1e-9):.1f}x")
+    def outcomes(result):
+        return [[(e["success"], e["score"]) for e in r["evaluations"]] for r in result["detailed_results"]]
+    print(f"Same evaluations: {outcomes(sequential) == outcomes(concurrent)}")
+
+def budget_allocation_example():
+    """Fit a context with history and retrieved chunks into a small token budget."""
+    context_manager = ContextManager(
+        {
+            "system": "You are a helpful assistant that answers questions accurately and concisely.",
+            "goal": "Explain how attractors form in a neural field."
+        },
+        max_tokens=220,
+        reserved_tokens=50
+    )
+    for i in range(8):
+        context_manager.add_to_history(f"Step {i} discussed field decay, resonance and boundary permeability in detail.")
+    context_manager.update("current_input", "How do attractors interact with new patterns?")
+    
+    field = NeuralField()
+    field.inject("Attractors pull resonant patterns toward them", strength=1.0)
+    chunks = [
+        ContextSection("chunk:attractors", "# Retrieved\nAttractors are stable patterns that strengthen when similar input arrives.\n\n", utility=4.0),
+        ContextSection("chunk:history", "# Retrieved\nNeural fields were first described in computational neuroscience.\n\n", utility=0.5),
+        ContextSection("field", f"# Field\n{field.get_context_representation()}\n\n", utility=3.0)
+    ]
+    
+    for method in ("dp", "greedy"):
+        allocation = context_manager.allocate_context(extra_sections=chunks, method=method)
+        print(f"{method}: {allocation.tokens}/{allocation.budget} tokens, utility {allocation.utility:.2f}")
+        print(f"  dropped: {', '.join(allocation.dropped_names) or 'nothing'}")
+
+def evaluation_cache_example(iterations: int = 4, latency: float = 0.1):
+    """Show repeated responses being graded from the cache instead of the model."""
+    import os
+    import tempfile
+    
+    path = os.path.join(tempfile.mkdtemp(), "evaluations.sqlite")
+    grader = FakeAsyncModel(['{"success": false, "score": 0.6, "feedback": "Add an example"}'], latency=latency)
+    
+    def run_loop(cache):
+        evaluator = ModelEvaluator(grader, "Evaluate this response: {response}", cache=cache)
+        loop = ControlLoop(
+            model=FakeAsyncModel(["Attractors are stable patterns."], latency=0.0),
+            max_iterations=iterations,
+            evaluators=[evaluator],
+            stop_on_success=False
+        )
+        start = time.time()
+        loop.run("Explain attractors")
+        return evaluator, time.time() - start
+    
+    first_cache = EvaluationCache(path=path, ttl=3600)
+    evaluator, elapsed = run_loop(first_cache)
+    first_cache.close()
+    print(f"First run:  {elapsed:.2f}s, {evaluator.cache_info()}")
+    
+    # A fresh process would start with an empty memory tier and read from disk
+    evaluator, elapsed = run_loop(EvaluationCache(path=path, ttl=3600))
+    print(f"Second run: {elapsed:.2f}s, {evaluator.cache_info()}")
+    print(f"Grading model calls: {grader.calls}")
+
+def batch_run_example(num_inputs: int = 40, max_concurrency: int = 10, latency: float = 0.05):
+    """Run many inputs through one loop configuration with bounded concurrency."""
+    loop = ControlLoop(
+        model=FakeAsyncModel(["Attractors are stable patterns in the field."], latency=latency),
+        initial_context={"system": "Answer in one sentence."},
+        max_iterations=2,
+        evaluators=[SimpleKeywordEvaluator(["attractor"])]
+    )
+    questions = (f"Question {i}: what is an attractor?" for i in range(num_inputs))
+    
+    finished = []
+    for result in loop.run_batch(questions, max_concurrency=max_concurrency, timeout=1.0):
+        finished.append(result["index"])
+    
+    metrics = loop.batch_metrics
+    print(f"Completed {metrics['completed']} inputs in {metrics['elapsed']:.2f}s "
+          f"({metrics['throughput']:.1f} inputs/s, mean latency {metrics['mean_latency']:.3f}s)")
+    print(f"Successful: {metrics['successful']}, timed out: {metrics['timed_out']}, errors: {metrics['errors']}")
+    print(f"First results to finish: {finished[:5]}")
+
+def streaming_abort_example(latency: float = 0.5):
+    """Cancel a generation as soon as a forbidden pattern makes it unable to pass."""
+    answer = ("As an AI language model I cannot browse the internet. " +
+              "Attractors are stable configurations that draw nearby patterns toward them. " * 8)
+    
+    for stream in (False, True):
+        model = FakeAsyncModel([answer], latency=latency, chunk_size=8)
+        loop = ControlLoop(
+            model=model,
+            max_iterations=1,
+            evaluators=[PatternMatchEvaluator([r"attractor"], [r"as an ai language model"])],
+            stream=stream
+        )
+        start = time.time()
+        result = loop.run("Explain attractors")
+        iteration = result["detailed_results"][0]
+        print(f"stream={stream}: {time.time() - start:.2f}s, {len(result['final_response'])}/{len(answer)} chars, "
+              f"aborted={iteration['aborted']}")
+        print(f"  {iteration['evaluations'][0]['feedback']}")
+
+def client_registry_example(num_requests: int = 6) -> Dict[str, Any]:
+    """
+    Exercise client reuse, rate limiting and retries against a local stub HTTP server.
+    
+    Returns:
+        Registry stats plus the replies and the HTTP requests and
+        connections the server saw
+    """
+    import http.client
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        # Keep-alive, so a reused client keeps its connection
+        protocol_version = "HTTP/1.1"
+        requests = 0
+        connections = set()
+        
+        def do_POST(self):
+            StubHandler.requests += 1
+            StubHandler.connections.add(self.client_address)
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            # Every third request is rate limited
+            if StubHandler.requests % 3 == 1:
+                status, body = 429, {"error": "rate limited"}
+            else:
+                status, body = 200, {"choices": [{"message": {"content": "stub reply"}}]}
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    class StubError(Exception):
+        def __init__(self, status_code: int):
+            super().__init__(f"HTTP {status_code}")
+            self.status_code = status_code
+    
+    class StubClient:
+        """JSON client holding one keep-alive connection."""
+        
+        def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+            url = urlparse(base_url)
+            self.connection = http.client.HTTPConnection(url.hostname, url.port)
+        
+        def create(self, **payload) -> Dict[str, Any]:
+            self.connection.request("POST", "/v1/chat/completions", json.dumps(payload),
+                                    {"Content-Type": "application/json"})
+            response = self.connection.getresponse()
+            data = json.loads(response.read())
+            if response.status != 200:
+                raise StubError(response.status)
+            return data
+        
+        def close(self) -> None:
+            self.connection.close()
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    
+    registry = ClientRegistry(RetryPolicy(max_retries=3, base_delay=0.05))
+    registry.register_factory("stub", StubClient)
+    registry.set_rate_limit("stub-model", requests_per_minute=600, tokens_per_minute=100000)
+    
+    start = time.time()
+    replies = []
+    for i in range(num_requests):
+        client = registry.client("stub", base_url=base_url)
+        reply = registry.call("stub-model", client.create, model="stub-model",
+                              messages=[{"role": "user", "content": f"Request {i}"}], tokens=200)
+        replies.append(reply["choices"][0]["message"]["content"])
+    elapsed = time.time() - start
+    
+    stats = registry.stats()
+    print(f"{len(replies)} replies in {elapsed:.2f}s from {StubHandler.requests} HTTP requests")
+    print(f"Clients: {stats['clients']}, connections: {len(StubHandler.connections)}, retries: {stats['retries']}")
+    registry.clear()
+    server.shutdown()
+    server.server_close()
+    return dict(stats, replies=replies, requests=StubHandler.requests,
+                connections=len(StubHandler.connections))
+
+def prompt_prefix_caching_example(iterations: int = 4):
+    """Measure how much of each iteration's prompt repeats as a cacheable prefix."""
+    loop = RecursiveFieldControlLoop(
+        model=FakeAsyncModel(["The field settles around attractors."], latency=0.0),
+        field_params={"attractor_threshold": 0.9},
+        max_iterations=iterations,
+        evaluators=[SimpleKeywordEvaluator(["resonance"])],
+        recursion_depth=0
+    )
+    result = loop.run("Describe field resonance")
+    
+    for iteration in result["detailed_results"]:
+        print(f"Iteration {iteration['iteration']}: {iteration['prefix_bytes_reused']} prefix bytes reused")
+    summary = result["prompt_cache"]
+    print(f"Prefix {summary['prefix_bytes']} bytes, suffix {summary['suffix_bytes']} bytes, "
+          f"{summary['reuse_ratio']:.0%} of prompt bytes reusable from a provider cache")
+
 if __name__ == "__main__":
     # Example usage
     print("Running basic control loop example...")
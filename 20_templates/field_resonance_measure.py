@@ -35,6 +35,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger("field_resonance")
 
+# ------------------------------------------------------------------------------
+# Field Access
+# ------------------------------------------------------------------------------
+
+def field_patterns(field: Any) -> List[Tuple[str, float]]:
+    """
+    Extract (pattern, strength) pairs from a field.
+    Fields with a get_patterns() method, such as those with interned
+    patterns, return pattern text; otherwise the state mapping is read.
+    
+    Args:
+        field: Neural field
+    
+    Returns:
+        List of (pattern, strength) tuples, empty if the field has no patterns
+    """
+    try:
+        if hasattr(field, "get_patterns"):
+            return field.get_patterns()
+        return [(pattern, strength) for pattern, strength in field.state.items()]
+    except (AttributeError, TypeError):
+        logger.warning("Could not extract patterns from field, using empty list")
+        return []
+
+def field_attractors(field: Any) -> List[Tuple[str, float]]:
+    """
+    Extract (pattern, strength) pairs for the attractors of a field.
+    Fields with a get_attractors() method return pattern text; otherwise
+    the attractor dictionary is read.
+    
+    Args:
+        field: Neural field
+    
+    Returns:
+        List of (pattern, strength) tuples, empty if the field has no attractors
+    """
+    try:
+        if hasattr(field, "get_attractors"):
+            return field.get_attractors()
+        return [(attractor['pattern'], attractor['strength'])
+                for attractor in field.attractors.values()]
+    except (AttributeError, TypeError):
+        logger.warning("Could not extract attractors from field, using empty list")
+        return []
+
 # ------------------------------------------------------------------------------
 # Resonance Measurement
 # ------------------------------------------------------------------------------
@@ -316,15 +361,7 @@ class CoherenceMeasurer:
     def _sample_patterns(self, field: Any) -> List[Tuple[str, float]]:
         """Sample patterns from the field based on sampling strategy."""
         # Extract patterns from field
-        try:
-            patterns = [(pattern, strength) for pattern, strength in field.state.items()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                patterns = field.get_patterns()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract patterns from field, using empty list")
-                return []
+        patterns = field_patterns(field)
         
         if not patterns:
             return []
@@ -347,18 +384,7 @@ class CoherenceMeasurer:
     
     def _get_attractors(self, field: Any) -> List[Tuple[str, float]]:
         """Extract attractors from the field."""
-        try:
-            attractors = [(attractor['pattern'], attractor['strength']) 
-                         for attractor in field.attractors.values()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                attractors = field.get_attractors()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract attractors from field, using empty list")
-                return []
-        
-        return attractors
+        return field_attractors(field)
 
 # ------------------------------------------------------------------------------
 # Stability Measurement
@@ -408,18 +434,7 @@ class StabilityMeasurer:
     
     def _get_attractors(self, field: Any) -> List[Tuple[str, float]]:
         """Extract attractors from the field."""
-        try:
-            attractors = [(attractor['pattern'], attractor['strength']) 
-                         for attractor in field.attractors.values()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                attractors = field.get_attractors()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract attractors from field, using empty list")
-                return []
-        
-        return attractors
+        return field_attractors(field)
 
 # ------------------------------------------------------------------------------
 # Comprehensive Field Metrics
@@ -574,32 +589,11 @@ class FieldResonanceMeasurer:
     
     def _get_attractors(self, field: Any) -> List[Tuple[str, float]]:
         """Extract attractors from the field."""
-        try:
-            attractors = [(attractor['pattern'], attractor['strength']) 
-                         for attractor in field.attractors.values()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                attractors = field.get_attractors()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract attractors from field, using empty list")
-                return []
-        
-        return attractors
+        return field_attractors(field)
     
     def _get_patterns(self, field: Any) -> List[Tuple[str, float]]:
         """Extract patterns from the field."""
-        try:
-            patterns = [(pattern, strength) for pattern, strength in field.state.items()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                patterns = field.get_patterns()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract patterns from field, using empty list")
-                return []
-        
-        return patterns
+        return field_patterns(field)
     
     def _calculate_entropy(self, field: Any) -> float:
         """
@@ -848,32 +842,11 @@ class FieldAnalyzer:
     
     def _get_attractors(self, field: Any) -> List[Tuple[str, float]]:
         """Extract attractors from the field."""
-        try:
-            attractors = [(attractor['pattern'], attractor['strength']) 
-                         for attractor in field.attractors.values()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                attractors = field.get_attractors()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract attractors from field, using empty list")
-                return []
-        
-        return attractors
+        return field_attractors(field)
     
     def _get_patterns(self, field: Any) -> List[Tuple[str, float]]:
         """Extract patterns from the field."""
-        try:
-            patterns = [(pattern, strength) for pattern, strength in field.state.items()]
-        except AttributeError:
-            # Handle case where field structure is different
-            try:
-                patterns = field.get_patterns()
-            except (AttributeError, TypeError):
-                logger.warning("Could not extract patterns from field, using empty list")
-                return []
-        
-        return patterns
+        return field_patterns(field)
     
     def _analyze_attractors(self, attractors: List[Tuple[str, float]]) -> Dict[str, Any]:
         """
@@ -136,6 +136,186 @@ class AnthropicInterface(ModelInterface):
 # Neural Field Components
 # ------------------------------------------------------------------------------
 
+class ResonanceIndex:
+    """
+    Inverted index from tokens to field patterns.
+    Caches each pattern's token set so resonance only needs to be scored
+    against patterns that share at least one token with the trigger.
+    """
+    
+    def __init__(self):
+        """Initialize an empty resonance index."""
+        self.tokens: Dict[str, frozenset] = {}  # Pattern -> token set
+        self.postings: Dict[str, Set[str]] = {}  # Token -> patterns
+    
+    def tokenize(self, pattern: str) -> frozenset:
+        """
+        Get the token set of a pattern, using the cache when indexed.
+        
+        Args:
+            pattern: The pattern to tokenize
+        
+        Returns:
+            Set of lowercase whitespace-separated tokens
+        """
+        words = self.tokens.get(pattern)
+        if words is None:
+            words = frozenset(pattern.lower().split())
+        return words
+    
+    def add(self, pattern: Any, words: Optional[frozenset] = None) -> None:
+        """Index a pattern if it is not already indexed."""
+        if pattern in self.tokens:
+            return
+        
+        if words is None:
+            words = frozenset(pattern.lower().split())
+        self.tokens[pattern] = words
+        for word in words:
+            self.postings.setdefault(word, set()).add(pattern)
+    
+    def discard(self, pattern: str) -> None:
+        """Remove a pattern from the index if present."""
+        words = self.tokens.pop(pattern, None)
+        if words is None:
+            return
+        
+        for word in words:
+            patterns = self.postings.get(word)
+            if patterns is not None:
+                patterns.discard(pattern)
+                if not patterns:
+                    del self.postings[word]
+    
+    def candidates(self, pattern: Any, words: Optional[frozenset] = None) -> Set[Any]:
+        """
+        Get indexed patterns sharing at least one token with a pattern.
+        
+        Args:
+            pattern: The pattern to look up
+            words: Token set of the pattern, if already known
+        
+        Returns:
+            Set of candidate patterns
+        """
+        result: Set[Any] = set()
+        for word in (words if words is not None else self.tokenize(pattern)):
+            patterns = self.postings.get(word)
+            if patterns:
+                result.update(patterns)
+        return result
+    
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+class PatternStore:
+    """
+    Interned storage for field patterns.
+    Base patterns are stored once and referred to by integer ID. A blend
+    produced by an attractor pull is stored as a small
+    ``(base_id, attractor_id, ratio)`` triple and only turned back into
+    text when it is rendered or serialized.
+    """
+    
+    def __init__(self):
+        """Initialize an empty pattern store."""
+        self.ids: Dict[Any, int] = {}  # Base text or blend triple -> ID
+        self.entries: List[Union[str, Tuple[int, int, str]]] = []  # ID -> entry
+        self.tokens: List[frozenset] = []  # ID -> token set
+    
+    def intern(self, text: str) -> int:
+        """
+        Get the ID of a base pattern, storing it if new.
+        
+        Args:
+            text: Pattern text
+        
+        Returns:
+            Pattern ID
+        """
+        pattern_id = self.ids.get(text)
+        if pattern_id is None:
+            pattern_id = self._add(text, frozenset(text.lower().split()))
+        return pattern_id
+    
+    def blend(self, base_id: int, attractor_id: int, blend_ratio: float) -> int:
+        """
+        Get the ID of a blend of two patterns, storing it if new.
+        Equivalent to NeuralField._blend_patterns on the resolved text.
+        
+        Args:
+            base_id: ID of the pattern being pulled
+            attractor_id: ID of the attractor's pattern
+            blend_ratio: Ratio of blending (0.0 to 1.0)
+        
+        Returns:
+            Pattern ID of the blend
+        """
+        ratio = f"{blend_ratio:.2f}"
+        key = (base_id, attractor_id, ratio)
+        pattern_id = self.ids.get(key)
+        if pattern_id is None:
+            # Blended text is "<base> <ratio>↔️ <attractor>", so its tokens are the union
+            words = self.tokens[base_id] | {f"{ratio}↔️"} | self.tokens[attractor_id]
+            pattern_id = self._add(key, words)
+        return pattern_id
+    
+    def lookup(self, text: str) -> Optional[int]:
+        """Get the ID of an interned base pattern without storing it."""
+        return self.ids.get(text)
+    
+    def resolve(self, pattern_id: int) -> str:
+        """
+        Render a pattern ID back to text.
+        
+        Args:
+            pattern_id: Pattern ID
+        
+        Returns:
+            Pattern text, identical to the non-interned field's key
+        """
+        # Iterative so long blend chains do not hit the recursion limit
+        parts = []
+        stack: List[Union[int, str]] = [pattern_id]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            entry = self.entries[item]
+            if isinstance(entry, str):
+                parts.append(entry)
+            else:
+                base_id, attractor_id, ratio = entry
+                stack.extend((attractor_id, f" {ratio}↔️ ", base_id))
+        return "".join(parts)
+    
+    def _add(self, key: Any, words: frozenset) -> int:
+        pattern_id = len(self.entries)
+        self.ids[key] = pattern_id
+        self.entries.append(key)
+        self.tokens.append(frozenset(words))
+        return pattern_id
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary representation without resolving blends."""
+        return {"entries": [e if isinstance(e, str) else list(e) for e in self.entries]}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PatternStore':
+        """Create from dictionary representation."""
+        store = cls()
+        for entry in data.get("entries", []):
+            if isinstance(entry, str):
+                store.intern(entry)
+            else:
+                base_id, attractor_id, ratio = entry
+                store.blend(base_id, attractor_id, float(ratio))
+        return store
+
 class NeuralField:
     """
     Neural field implementation for recursive context engineering.
@@ -146,7 +326,9 @@ class NeuralField:
                  decay_rate: float = 0.05,
                  boundary_permeability: float = 0.8,
                  resonance_bandwidth: float = 0.6,
-                 attractor_formation_threshold: float = 0.7):
+                 attractor_formation_threshold: float = 0.7,
+                 use_resonance_index: bool = False,
+                 intern_patterns: bool = False):
         """
         Initialize the neural field.
         
@@ -155,6 +337,10 @@ class NeuralField:
             boundary_permeability: How easily new information enters
             resonance_bandwidth: How broadly patterns resonate
             attractor_formation_threshold: Threshold for attractor formation
+            use_resonance_index: Whether to score resonance through an
+                inverted token index instead of scanning every pattern
+            intern_patterns: Whether to key the field by interned pattern IDs,
+                storing attractor blends as ID triples instead of strings
         """
         self.state = {}  # Field state
         self.attractors = {}  # Stable attractors
@@ -165,6 +351,12 @@ class NeuralField:
         self.boundary_permeability = boundary_permeability
         self.resonance_bandwidth = resonance_bandwidth
         self.attractor_threshold = attractor_formation_threshold
+        
+        # Optional resonance engine
+        self.resonance_index = ResonanceIndex() if use_resonance_index else None
+    
+        # Optional pattern interning (state and attractors are keyed by pattern ID)
+        self.patterns = PatternStore() if intern_patterns else None
     
     def inject(self, pattern: str, strength: float = 1.0) -> 'NeuralField':
         """
@@ -180,6 +372,9 @@ class NeuralField:
         # Apply boundary filtering
         effective_strength = strength * self.boundary_permeability
         
+        if self.patterns is not None:
+            pattern = self.patterns.intern(pattern)
+        
         # Check resonance with existing attractors
         for attractor_id, attractor in self.attractors.items():
             resonance = self._calculate_resonance(pattern, attractor['pattern'])
@@ -198,9 +393,11 @@ class NeuralField:
             self.state[pattern] += effective_strength
         else:
             self.state[pattern] = effective_strength
+            if self.resonance_index is not None:
+                self.resonance_index.add(pattern, self._pattern_tokens(pattern))
             
-        # Record history
-        self.history.append(("inject", pattern, effective_strength))
+        # Record history with pattern text, so it is readable without the pattern store
+        self.history.append(("inject", self.resolve_pattern(pattern), effective_strength))
         
         # Check for attractor formation
         if pattern in self.state and self.state[pattern] > self.attractor_threshold:
@@ -221,6 +418,9 @@ class NeuralField:
         Returns:
             ID of the formed attractor
         """
+        if self.patterns is not None and isinstance(pattern, str):
+            pattern = self.patterns.intern(pattern)
+        
         attractor_id = f"attractor_{len(self.attractors)}"
         self.attractors[attractor_id] = {
             'pattern': pattern,
@@ -240,9 +440,18 @@ class NeuralField:
         Returns:
             Self for chaining
         """
+        # Only patterns sharing a token with the trigger can resonate with it
+        if self.resonance_index is not None:
+            candidates = self.resonance_index.candidates(
+                trigger_pattern, self._pattern_tokens(trigger_pattern)
+            )
+            candidate_items = [(p, self.state[p]) for p in candidates if p in self.state]
+        else:
+            candidate_items = self.state.items()
+        
         # For each existing pattern, calculate resonance with trigger
         resonance_effects = {}
-        for pattern, strength in self.state.items():
+        for pattern, strength in candidate_items:
             if pattern != trigger_pattern:
                 resonance = self._calculate_resonance(pattern, trigger_pattern)
                 effect = resonance * strength * 0.2
@@ -277,6 +486,10 @@ class NeuralField:
             self.attractors[attractor_id]['strength'] *= (1 - self.decay_rate * 0.2)
             
         # Remove patterns that have decayed below threshold
+        if self.resonance_index is not None:
+            for k, v in self.state.items():
+                if not v > 0.01:
+                    self.resonance_index.discard(k)
         self.state = {k: v for k, v in self.state.items() if v > 0.01}
         self.attractors = {k: v for k, v in self.attractors.items() if v['strength'] > 0.1}
         
@@ -294,8 +507,8 @@ class NeuralField:
             Resonance score (0.0 to 1.0)
         """
         # Simple word overlap similarity
-        words1 = set(pattern1.lower().split())
-        words2 = set(pattern2.lower().split())
+        words1 = self._pattern_tokens(pattern1)
+        words2 = self._pattern_tokens(pattern2)
         
         if not words1 or not words2:
             return 0.0
@@ -308,6 +521,44 @@ class NeuralField:
         
         return resonance
     
+    def _pattern_tokens(self, pattern: Any) -> Set[str]:
+        """
+        Get the word set of a pattern, using cached tokens when available.
+        
+        Args:
+            pattern: Pattern text, or pattern ID when interning
+        
+        Returns:
+            Set of lowercase words
+        """
+        if self.patterns is not None and isinstance(pattern, int):
+            return self.patterns.tokens[pattern]
+        if self.resonance_index is not None:
+            return self.resonance_index.tokenize(pattern)
+        return set(pattern.lower().split())
+    
+    def resolve_pattern(self, pattern: Any) -> str:
+        """
+        Get the text of a field pattern.
+        
+        Args:
+            pattern: State or attractor key (pattern ID when interning)
+        
+        Returns:
+            Pattern text
+        """
+        if self.patterns is not None and isinstance(pattern, int):
+            return self.patterns.resolve(pattern)
+        return pattern
+    
+    def get_patterns(self) -> List[Tuple[str, float]]:
+        """Get (pattern text, strength) pairs for the field state."""
+        return [(self.resolve_pattern(p), s) for p, s in self.state.items()]
+    
+    def get_attractors(self) -> List[Tuple[str, float]]:
+        """Get (pattern text, strength) pairs for the field attractors."""
+        return [(self.resolve_pattern(a['pattern']), a['strength']) for a in self.attractors.values()]
+    
     def _blend_patterns(self, pattern1: str, pattern2: str, blend_ratio: float) -> str:
         """
         Blend two patterns based on ratio.
@@ -320,6 +571,9 @@ class NeuralField:
         Returns:
             Blended pattern
         """
+        if self.patterns is not None:
+            return self.patterns.blend(pattern1, pattern2, blend_ratio)
+        
         # Simple concatenation with weighting indication
         return f"{pattern1} {blend_ratio:.2f}↔️ {pattern2}"
     
@@ -368,14 +622,14 @@ class NeuralField:
         if self.attractors:
             parts.append("# Field Attractors")
             for attractor_id, attractor in self.attractors.items():
-                parts.append(f"- {attractor_id} (Strength: {attractor['strength']:.2f}): {attractor['pattern'][:100]}...")
+                parts.append(f"- {attractor_id} (Strength: {attractor['strength']:.2f}): {self.resolve_pattern(attractor['pattern'])[:100]}...")
             parts.append("")
         
         # Add most active patterns
         parts.append("# Active Patterns")
         active_patterns = sorted(self.state.items(), key=lambda x: x[1], reverse=True)[:5]
         for pattern, strength in active_patterns:
-            parts.append(f"- ({strength:.2f}): {pattern[:100]}...")
+            parts.append(f"- ({strength:.2f}): {self.resolve_pattern(pattern)[:100]}...")
         
         # Add field metrics
         parts.append("")
@@ -796,7 +1050,9 @@ class RecursiveFramework:
             decay_rate=field_params.get('decay_rate', 0.05),
             boundary_permeability=field_params.get('boundary_permeability', 0.8),
             resonance_bandwidth=field_params.get('resonance_bandwidth', 0.6),
-            attractor_formation_threshold=field_params.get('attractor_threshold', 0.7)
+            attractor_formation_threshold=field_params.get('attractor_threshold', 0.7),
+            use_resonance_index=field_params.get('use_resonance_index', False),
+            intern_patterns=field_params.get('intern_patterns', False)
         )
         
         # Set up residue tracker
@@ -26,11 +26,13 @@ Usage:
 
 import math
 import re
+import hashlib
 import time
 import json
 import logging
+import threading
 from typing import Dict, List, Any, Optional, Union, Tuple, Set, Callable
-from collections import Counter
+from collections import Counter, OrderedDict
 
 # Configure logging
 logging.basicConfig(
@@ -59,20 +61,189 @@ def tokenize(text: str) -> List[str]:
     # Split into tokens
     return text.split()
 
+class TokenCounter:
+    """
+    Token counting service shared by budgeting and pruning code.
+    Loads the model's tiktoken encoding once, caches counts in an LRU keyed
+    by a hash of the text, and falls back to a character-based estimate when
+    tiktoken is not installed or does not know the model. The cache is
+    guarded by a lock, since model interfaces count tokens from worker
+    threads; encoding happens outside it.
+    """
+    
+    def __init__(self, model: str = "gpt-4", cache_size: int = 4096, chars_per_token: float = 4.0):
+        """
+        Initialize the token counter.
+        
+        Args:
+            model: Model whose tokenizer to use
+            cache_size: Maximum number of cached counts
+            chars_per_token: Characters per token for the fallback estimate
+        """
+        self.model = model
+        self.cache_size = cache_size
+        self.chars_per_token = chars_per_token
+        self.encoding = self._load_encoding(model)
+        self._cache: 'OrderedDict[bytes, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _load_encoding(model: str) -> Any:
+        """Load the tiktoken encoding for a model, or None if unavailable."""
+        try:
+            import tiktoken
+        except ImportError:
+            logger.info("tiktoken not installed, estimating token counts from text length")
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            logger.warning(f"No tiktoken encoding for {model}, using cl100k_base")
+            return tiktoken.get_encoding("cl100k_base")
+    
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    
+    def estimate(self, text: str) -> int:
+        """Estimate the token count from text length."""
+        return math.ceil(len(text) / self.chars_per_token)
+    
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a string.
+        
+        Args:
+            text: Input text
+        
+        Returns:
+            Token count
+        """
+        key = self._key(text)
+        with self._lock:
+            count = self._cache.get(key)
+            if count is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return count
+            self.misses += 1
+        
+        if self.encoding is not None:
+            count = len(self.encoding.encode(text, disallowed_special=()))
+        else:
+            count = self.estimate(text)
+        self._store(key, count)
+        return count
+    
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens in several strings.
+        Cached strings are looked up and the rest are encoded in one batch.
+        
+        Args:
+            texts: Input texts
+        
+        Returns:
+            Token count per text
+        """
+        counts: List[Optional[int]] = []
+        missing: Dict[bytes, List[int]] = {}
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            for i, key in enumerate(keys):
+                count = self._cache.get(key)
+                if count is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self.hits += 1
+                    self._cache.move_to_end(key)
+                counts.append(count)
+            self.misses += len(missing)
+        
+        if missing:
+            pending = [texts[positions[0]] for positions in missing.values()]
+            if self.encoding is not None:
+                new_counts = [len(t) for t in self.encoding.encode_batch(pending, disallowed_special=())]
+            else:
+                new_counts = [self.estimate(text) for text in pending]
+            for (key, positions), count in zip(missing.items(), new_counts):
+                for i in positions:
+                    counts[i] = count
+                self._store(key, count)
+        
+        return counts
+    
+    def calibrate(self, texts: List[str], counts: Optional[List[int]] = None) -> float:
+        """
+        Fit the fallback estimate's characters-per-token ratio.
+        
+        Args:
+            texts: Sample texts
+            counts: Known token counts for the samples (counted with the
+                loaded encoding if None)
+        
+        Returns:
+            The new characters-per-token ratio
+        """
+        if counts is None:
+            if self.encoding is None:
+                raise ValueError("Token counts are required when tiktoken is unavailable")
+            counts = [len(t) for t in self.encoding.encode_batch(texts, disallowed_special=())]
+        total_tokens = sum(counts)
+        if total_tokens:
+            self.chars_per_token = sum(len(text) for text in texts) / total_tokens
+        return self.chars_per_token
+    
+    def _store(self, key: bytes, count: int) -> None:
+        with self._lock:
+            self._cache[key] = count
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def cache_info(self) -> Dict[str, int]:
+        """Get cache statistics."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+_token_counters: Dict[str, TokenCounter] = {}
+_token_counters_lock = threading.Lock()
+
+def get_token_counter(model: str = "gpt-4") -> TokenCounter:
+    """Get the shared token counter for a model, creating it on first use."""
+    with _token_counters_lock:
+        counter = _token_counters.get(model)
+        if counter is None:
+            counter = _token_counters[model] = TokenCounter(model)
+        return counter
+
 def count_tokens(text: str) -> int:
     """
-    Estimate the number of tokens in text.
-    This is a rough approximation for planning purposes.
+    Count the number of tokens in text.
+    Uses the model tokenizer when tiktoken is installed, otherwise a rough
+    length-based estimate.
     
     Args:
         text: Input text
         
     Returns:
-        Estimated token count
+        Token count
     """
-    # Rough approximation: average token is ~4 characters
-    # More accurate would be to use the specific tokenizer for your model
-    return len(text) // 4
+    return get_token_counter().count(text)
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """
+    Count the number of tokens in several texts at once.
+    
+    Args:
+        texts: Input texts
+    
+    Returns:
+        Token count per text
+    """
+    return get_token_counter().count_batch(texts)
 
 def extract_sentences(text: str) -> List[str]:
     """
@@ -618,29 +789,31 @@ def score_field_stability_impact(response: str, field: Any, before_state: Option
         return 0.5  # Neutral score
 
 def _get_field_attractors(field: Any) -> List[Tuple[str, float]]:
-    """Extract attractors from a field object."""
+    """
+    Extract attractors from a field object.
+    Prefers the field's get_attractors(), which returns pattern text even
+    when the field interns its patterns.
+    """
     try:
-        # Try to access attractors directly
+        if hasattr(field, "get_attractors"):
+            return field.get_attractors()
         return [(attractor['pattern'], attractor['strength']) 
                 for attractor in field.attractors.values()]
     except (AttributeError, TypeError):
-        # Try alternative methods
-        try:
-            return field.get_attractors()
-        except (AttributeError, TypeError):
-            return []
+        return []
 
 def _get_field_patterns(field: Any) -> List[Tuple[str, float]]:
-    """Extract patterns from a field object."""
+    """
+    Extract patterns from a field object.
+    Prefers the field's get_patterns(), which returns pattern text even
+    when the field interns its patterns.
+    """
     try:
-        # Try to access state directly
+        if hasattr(field, "get_patterns"):
+            return field.get_patterns()
         return [(pattern, strength) for pattern, strength in field.state.items()]
     except (AttributeError, TypeError):
-        # Try alternative methods
-        try:
-            return field.get_patterns()
-        except (AttributeError, TypeError):
-            return []
+        return []
 
 # ------------------------------------------------------------------------------
 # Protocol Scoring Functions
@@ -0,0 +1,168 @@
+"""Round-trip tests for BinaryFieldFormat."""
+
+import pytest
+
+from control_loop import (
+    BinaryFieldFormat, NeuralField, ResidueEnhancedNeuralField, SymbolicResidueTracker
+)
+
+
+PATTERNS = [
+    ("context engineering organizes information patterns", 1.0),
+    ("attractors stabilize the field", 0.9),
+    ("context patterns resonate with attractors", 0.8),
+    ("unrelated weather report", 0.3),
+    ("unicode pattern: café → naïve", 0.6),
+]
+
+FIELD_CONFIGS = {
+    "dict": {},
+    "interned": {"intern_patterns": True},
+    "lazy": {"lazy_decay": True, "sweep_interval": 2},
+    "indexed": {"use_resonance_index": True},
+    "numpy": {"backend": "numpy"},
+}
+
+
+def build_field(field_cls=NeuralField, **params):
+    if params.get("backend") == "numpy":
+        pytest.importorskip("numpy")
+    field = field_cls(attractor_formation_threshold=0.5, history_size=16, **params)
+    for pattern, strength in PATTERNS:
+        field.inject(pattern, strength)
+    field.decay()
+    field.inject(PATTERNS[0][0], 0.5)
+    return field
+
+
+def field_dict(field):
+    """Everything a field round trip must preserve, as plain data."""
+    data = {
+        "type": type(field).__name__,
+        "state": dict(field.state),
+        "attractors": field.attractors,
+        "resolved_attractors": field.resolved_attractors(),
+        "patterns": field.get_patterns(),
+        "history": list(field.history),
+        "history_total": field.history.total,
+        "params": (field.decay_rate, field.boundary_permeability, field.resonance_bandwidth,
+                   field.attractor_threshold, field.backend, field.lazy_decay,
+                   field.sweep_interval, field.history.max_entries,
+                   field.resonance_index is not None),
+        "pattern_store": field.patterns.to_dict() if field.patterns is not None else None,
+    }
+    if isinstance(field, ResidueEnhancedNeuralField):
+        data["residues"] = field.residue_tracker.to_dict()
+    return data
+
+
+def round_trip(obj_kwargs, compression, mode, tmp_path):
+    if mode == "bytes":
+        return BinaryFieldFormat.loads(BinaryFieldFormat.dumps(compression=compression, **obj_kwargs))
+    path = str(tmp_path / "field.nfld")
+    BinaryFieldFormat.save(path, compression=compression, **obj_kwargs)
+    return BinaryFieldFormat.load(path, use_mmap=(mode == "mmap"))
+
+
+@pytest.mark.parametrize("mode", ["mmap", "read", "bytes"])
+@pytest.mark.parametrize("compression", [None, "zlib"])
+@pytest.mark.parametrize("config", sorted(FIELD_CONFIGS))
+def test_field_round_trip(config, compression, mode, tmp_path):
+    field = build_field(**FIELD_CONFIGS[config])
+    
+    loaded = round_trip({"field": field}, compression, mode, tmp_path)
+    
+    assert loaded["tracker"] is None
+    assert type(loaded["field"]) is NeuralField
+    assert field_dict(loaded["field"]) == field_dict(field)
+
+
+@pytest.mark.parametrize("mode", ["mmap", "read", "bytes"])
+@pytest.mark.parametrize("compression", [None, "zlib"])
+@pytest.mark.parametrize("intern_patterns", [False, True])
+def test_residue_field_round_trip(intern_patterns, compression, mode, tmp_path):
+    field = build_field(ResidueEnhancedNeuralField, intern_patterns=intern_patterns)
+    assert field.residue_tracker.residues
+    
+    loaded = round_trip({"field": field}, compression, mode, tmp_path)
+    
+    assert loaded["field"].residue_tracker is loaded["tracker"]
+    assert field_dict(loaded["field"]) == field_dict(field)
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_tracker_round_trip(compression):
+    tracker = build_field(ResidueEnhancedNeuralField).residue_tracker
+    
+    loaded = SymbolicResidueTracker.from_bytes(tracker.to_bytes(compression))
+    
+    assert loaded.to_dict() == tracker.to_dict()
+
+
+def test_loaded_field_keeps_evolving_like_the_original():
+    field = build_field(intern_patterns=True)
+    loaded = BinaryFieldFormat.loads(BinaryFieldFormat.dumps(field))["field"]
+    
+    for f in (field, loaded):
+        f.inject("a fresh pattern about context", 0.7)
+        f.decay()
+    
+    assert field_dict(loaded) == field_dict(field)
+
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    field = build_field(ResidueEnhancedNeuralField)
+    
+    loaded = BinaryFieldFormat.loads(BinaryFieldFormat.dumps(field, compression="zstd"))
+    
+    assert field_dict(loaded["field"]) == field_dict(field)
+
+
+def test_unknown_compression_is_rejected_on_write():
+    with pytest.raises(ValueError, match="Unknown compression"):
+        BinaryFieldFormat.dumps(build_field(), compression="lzma")
+
+
+def corrupt_header(data, magic=None, version=None, compression=None):
+    old_magic, old_version, old_compression = BinaryFieldFormat._PREFIX.unpack_from(data)
+    prefix = BinaryFieldFormat._PREFIX.pack(
+        old_magic if magic is None else magic,
+        old_version if version is None else version,
+        old_compression if compression is None else compression
+    )
+    return prefix + data[BinaryFieldFormat._PREFIX.size:]
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"magic": b"JUNK"}, "bad magic"),
+    ({"version": BinaryFieldFormat.VERSION + 1}, "Unsupported neural field binary version"),
+    ({"compression": 7}, "Unknown compression code"),
+])
+def test_corrupt_header_is_rejected(change, message):
+    data = BinaryFieldFormat.dumps(build_field())
+    
+    with pytest.raises(ValueError, match=message):
+        BinaryFieldFormat.loads(corrupt_header(data, **change))
+
+
+def test_truncated_data_is_rejected():
+    data = BinaryFieldFormat.dumps(build_field())
+    
+    with pytest.raises(ValueError, match="too short"):
+        BinaryFieldFormat.loads(data[:3])
+    with pytest.raises(ValueError, match="missing metadata"):
+        BinaryFieldFormat.loads(data[:BinaryFieldFormat._PREFIX.size + 2])
+    with pytest.raises(ValueError, match="truncated metadata"):
+        BinaryFieldFormat.loads(data[:BinaryFieldFormat._PREFIX.size + 16])
+    with pytest.raises(ValueError, match="truncated column"):
+        BinaryFieldFormat.loads(data[:-8])
+
+
+def test_corrupt_compressed_body_is_rejected():
+    import zlib
+    data = BinaryFieldFormat.dumps(build_field(), compression="zlib")
+    prefix_size = BinaryFieldFormat._PREFIX.size
+    
+    with pytest.raises(zlib.error):
+        BinaryFieldFormat.loads(data[:prefix_size] + b"\xff" * 16)
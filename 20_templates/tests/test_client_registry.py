@@ -0,0 +1,45 @@
+"""Tests for the shared client registry."""
+
+import threading
+
+from control_loop import ClientRegistry, RetryPolicy, client_registry_example
+
+
+def test_client_registry_example_reuses_one_client_and_retries_rate_limits():
+    stats = client_registry_example(num_requests=6)
+    
+    assert stats["replies"] == ["stub reply"] * 6
+    # The stub rate limits every third HTTP request: 6 replies need 3 retries
+    assert stats["requests"] == 9
+    assert stats["calls"] == 9
+    assert stats["retries"] == 3
+    assert stats["clients"] == 1
+    assert stats["connections"] == 1
+
+
+def test_call_counters_are_exact_across_threads():
+    registry = ClientRegistry(RetryPolicy(max_retries=1, base_delay=0.0))
+    failures = set()
+    lock = threading.Lock()
+    
+    def flaky(i):
+        # Each request times out once, then succeeds
+        with lock:
+            if i not in failures:
+                failures.add(i)
+                raise TimeoutError("slow")
+        return i
+    
+    def worker(start):
+        for i in range(start, start + 200):
+            assert registry.call("model", flaky, i) == i
+    
+    threads = [threading.Thread(target=worker, args=(n * 200,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    stats = registry.stats()
+    assert stats["calls"] == 2 * 1600
+    assert stats["retries"] == 1600
@@ -0,0 +1,100 @@
+"""Tests for the base ControlLoop."""
+
+import asyncio
+import re
+import threading
+import time
+
+from control_loop import ControlLoop, FakeAsyncModel, ModelInterface, SimpleKeywordEvaluator
+
+
+class SlowBlockingModel(ModelInterface):
+    """Blocking model that records how many generate() calls overlap."""
+    
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+    
+    def generate(self, context, max_tokens=1000):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return "slow reply"
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class CachingModel(ModelInterface):
+    """Model that reports a different cached-token count for each input."""
+    
+    def generate(self, context, max_tokens=1000):
+        return "cached reply"
+    
+    def generate_with_prefix(self, prefix, suffix, max_tokens=1000):
+        index = int(re.search(r"input (\d+)", prefix + suffix).group(1))
+        # Finish out of order so concurrent calls interleave
+        time.sleep(0.01 * (4 - index))
+        return "cached reply", 100 * (index + 1)
+
+
+def test_batch_workers_track_prompt_prefixes_separately():
+    loop = ControlLoop(
+        FakeAsyncModel(["A reply without the keyword"], latency=0),
+        max_iterations=2,
+        evaluators=[SimpleKeywordEvaluator(["missing"])],
+    )
+    
+    results = list(loop.run_batch([f"input {i}" for i in range(4)], max_concurrency=4))
+    
+    assert len(results) == 4
+    for result in results:
+        assert result["error"] is None
+        assert result["prompt_cache"]["calls"] == result["iterations"] == 2
+    assert loop.prompt_cache.calls == 0
+
+
+def test_timed_out_calls_keep_their_batch_slot_until_they_return():
+    model = SlowBlockingModel(latency=0.3)
+    loop = ControlLoop(model, max_iterations=1)
+    
+    results = list(loop.run_batch([f"input {i}" for i in range(6)], max_concurrency=2, timeout=0.05))
+    
+    assert [result["error"] for result in results] == ["timeout"] * 6
+    assert model.calls == 6
+    # Abandoned generate() calls still count against max_concurrency
+    assert model.peak <= 2
+    assert model.in_flight == 0
+
+
+def test_cached_tokens_are_reported_per_call():
+    loop = ControlLoop(CachingModel(), max_iterations=2,
+                       evaluators=[SimpleKeywordEvaluator(["missing"])])
+    
+    results = list(loop.run_batch([f"input {i}" for i in range(4)], max_concurrency=4))
+    
+    for result in results:
+        assert result["prompt_cache"]["cached_tokens"] == 2 * 100 * (result["index"] + 1)
+
+
+def test_streamed_calls_do_not_count_prefix_reuse():
+    for stream in (False, True):
+        for use_async in (False, True):
+            loop = ControlLoop(FakeAsyncModel(["A reply without the keyword"], latency=0),
+                               initial_context={"goal": "Answer the question"},
+                               max_iterations=3, stream=stream,
+                               evaluators=[SimpleKeywordEvaluator(["missing"])])
+            result = asyncio.run(loop.arun("input")) if use_async else loop.run("input")
+            summary = result["prompt_cache"]
+            assert summary["calls"] == 3
+            if stream:
+                # stream() sends no cacheable prefix, so nothing is reused
+                assert summary["reused_bytes"] == summary["prefix_bytes"] == 0
+            else:
+                assert summary["reused_bytes"] > 0
@@ -0,0 +1,86 @@
+"""Tests for the response evaluators."""
+
+import threading
+import time
+
+import pytest
+
+from control_loop import EvaluationFunction, EvaluatorExecutor, PatternMatchEvaluator
+
+
+def test_check_partial_defers_lookaround_patterns():
+    evaluator = PatternMatchEvaluator([], ["foo(?!barbaz)", "x(?!yz)"])
+    
+    # Both lookaheads hit the prefix, but the finished text clears them
+    assert evaluator.check_partial("ok foob xy", {}) is None
+    success, score, _ = evaluator.evaluate("ok foobarbaz xyz", {})
+    assert (success, score) == (True, 1.0)
+
+
+def test_check_partial_defers_end_anchors():
+    evaluator = PatternMatchEvaluator([], ["done$", r"end\Z"])
+    assert evaluator.check_partial("done end", {}) is None
+
+
+def test_check_partial_aborts_on_stable_hits():
+    evaluator = PatternMatchEvaluator([], ["forbidden", r"bad\d+", "never"])
+    
+    assert evaluator.check_partial("this is forbidden and bad42", {}) is not None
+    assert evaluator.check_partial("this is forbidden", {}) is None
+
+
+def test_check_partial_waits_for_word_boundary():
+    evaluator = PatternMatchEvaluator([], [r"\bcat\b", r"\bdog\b", "never"])
+    
+    # "cat" might still grow into "category"
+    assert evaluator.check_partial("a dog and a cat", {}) is None
+    assert evaluator.check_partial("a dog and a cat ", {}) is not None
+
+
+class SleepyEvaluator(EvaluationFunction):
+    """I/O-bound evaluator that records when it starts and finishes."""
+    
+    io_bound = True
+    
+    def __init__(self, delay, success=True, error=None):
+        self.delay = delay
+        self.success = success
+        self.error = error
+        self.started = threading.Event()
+        self.finished = threading.Event()
+    
+    def evaluate(self, response, context):
+        self.started.set()
+        time.sleep(self.delay)
+        self.finished.set()
+        if self.error is not None:
+            raise self.error
+        return self.success, 1.0 if self.success else 0.0, "done"
+
+
+def test_short_circuit_cancels_queued_and_drains_running_evaluators():
+    failing = SleepyEvaluator(0.0, success=False)
+    running = SleepyEvaluator(0.2)
+    queued = SleepyEvaluator(0.0)
+    
+    # One worker: "running" starts once "failing" is done, "queued" waits behind it
+    with EvaluatorExecutor(max_workers=1) as executor:
+        results = executor.evaluate([failing, running, queued], "response", {}, short_circuit=True)
+        
+        # Nothing is left running once evaluate() returns
+        assert running.finished.is_set()
+        assert not queued.started.is_set()
+    
+    assert results[0][0][0] is False
+    assert results[1][0] == (True, 1.0, "done")
+    assert results[2] is None
+
+
+def test_evaluator_error_drains_running_evaluators():
+    broken = SleepyEvaluator(0.0, error=RuntimeError("boom"))
+    running = SleepyEvaluator(0.2)
+    
+    with EvaluatorExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError, match="boom"):
+            executor.evaluate([broken, running], "response", {})
+        assert running.finished.is_set()
@@ -0,0 +1,38 @@
+"""Tests for field_resonance_measure against control_loop neural fields."""
+
+from control_loop import NeuralField
+from field_resonance_measure import FieldAnalyzer, FieldResonanceMeasurer, field_attractors, field_patterns
+
+
+def build_field(intern_patterns):
+    field = NeuralField(attractor_formation_threshold=0.5, intern_patterns=intern_patterns)
+    for pattern in [
+        "context engineering organizes information patterns",
+        "information patterns resonate with context",
+        "the field organizes engineering context",
+        "gardens and weather",
+    ]:
+        field.inject(pattern)
+    field.decay()
+    return field
+
+
+def test_interned_field_reads_as_text():
+    plain, interned = build_field(False), build_field(True)
+    
+    assert field_patterns(interned) == field_patterns(plain)
+    assert field_attractors(interned) == field_attractors(plain)
+    assert all(isinstance(pattern, str) for pattern, _ in field_patterns(interned))
+
+
+def test_metrics_match_for_interned_field():
+    measurer = FieldResonanceMeasurer()
+    plain, interned = build_field(False), build_field(True)
+    
+    assert measurer.get_field_metrics(interned) == measurer.get_field_metrics(plain)
+    assert FieldAnalyzer(measurer).analyze_field(interned) == FieldAnalyzer(measurer).analyze_field(plain)
+
+
+def test_field_without_state_reads_as_empty():
+    assert field_patterns(object()) == []
+    assert field_attractors(object()) == []
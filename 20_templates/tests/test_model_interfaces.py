@@ -0,0 +1,78 @@
+"""Tests for the provider model interfaces, using fake SDK clients."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from control_loop import AnthropicInterface, ClientRegistry, OpenAIInterface
+
+
+class FakeStream:
+    """SDK stream that blocks after the first event until released or closed."""
+    
+    def __init__(self, events):
+        self.events = events
+        self.release = threading.Event()
+        self.closed = False
+    
+    def __iter__(self):
+        for index, event in enumerate(self.events):
+            if index == 1:
+                self.release.wait(5)
+            if self.closed:
+                raise ConnectionError("stream closed")
+            yield event
+    
+    def close(self):
+        # Closing the HTTP stream interrupts a blocked read
+        self.closed = True
+        self.release.set()
+
+
+def _openai_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def _registry(provider, create):
+    registry = ClientRegistry()
+    if provider == "openai":
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    else:
+        client = SimpleNamespace(completions=SimpleNamespace(create=create))
+    registry.register_factory(provider, lambda **kwargs: client)
+    return registry
+
+
+def test_openai_astream_yields_incrementally_and_closes_the_stream():
+    stream = FakeStream([_openai_chunk("Hello"), _openai_chunk(" world")])
+    requests = []
+    
+    def create(**kwargs):
+        requests.append(kwargs)
+        return stream
+    
+    model = OpenAIInterface("gpt-4", registry=_registry("openai", create))
+    
+    async def first_chunk():
+        chunks = model.astream("Say hello")
+        first = await asyncio.wait_for(chunks.__anext__(), 2)
+        await chunks.aclose()
+        return first
+    
+    # The second event is held back, so the first chunk must arrive on its own
+    assert asyncio.run(first_chunk()) == "Hello"
+    assert stream.closed
+    assert requests[0]["stream"] is True
+
+
+def test_anthropic_astream_yields_every_chunk():
+    stream = FakeStream([SimpleNamespace(completion="Hi"), SimpleNamespace(completion=""),
+                         SimpleNamespace(completion=" there")])
+    stream.release.set()
+    model = AnthropicInterface("claude-3", registry=_registry("anthropic", lambda **kwargs: stream))
+    
+    async def collect():
+        return [chunk async for chunk in model.astream("Greet me")]
+    
+    assert asyncio.run(collect()) == ["Hi", " there"]
+    assert stream.closed
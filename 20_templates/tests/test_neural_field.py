@@ -0,0 +1,243 @@
+"""Tests for NeuralField and the neural field control loops."""
+
+import random
+
+import pytest
+
+from control_loop import (
+    EvaluationFunction, FakeAsyncModel, HistoryStore, NeuralField, NeuralFieldControlLoop,
+    RecursiveFieldControlLoop
+)
+
+
+RESPONSES = [
+    "The field organizes around context engineering patterns",
+    "Context patterns resonate with the engineering attractor",
+    "A response about unrelated weather and gardens",
+]
+
+ATTRACTORS = [
+    "context engineering organizes information patterns",
+    "attractors stabilize the field",
+]
+
+
+class RecordingEvaluator(EvaluationFunction):
+    """Passes nothing and records the context each evaluation saw."""
+    
+    def __init__(self):
+        self.contexts = []
+    
+    def evaluate(self, response, context):
+        self.contexts.append(context)
+        return False, 0.5, "keep going"
+
+
+def run_neural_loop(intern_patterns, history_path):
+    evaluator = RecordingEvaluator()
+    loop = NeuralFieldControlLoop(
+        FakeAsyncModel(RESPONSES, latency=0),
+        field_params={
+            "intern_patterns": intern_patterns,
+            "initial_attractors": ATTRACTORS,
+            "attractor_threshold": 0.5,
+            "history_path": str(history_path),
+        },
+        max_iterations=4,
+        evaluators=[evaluator],
+    )
+    result = loop.run("explain context engineering patterns")
+    loop.field.close()
+    return result, evaluator
+
+
+def test_interned_neural_loop_matches_plain_loop(tmp_path):
+    plain, plain_eval = run_neural_loop(False, tmp_path / "plain.jsonl")
+    interned, interned_eval = run_neural_loop(True, tmp_path / "interned.jsonl")
+    
+    assert interned["field_state"] == plain["field_state"]
+    assert plain["field_state"]["attractors"]
+    for attractor in interned["field_state"]["attractors"].values():
+        assert isinstance(attractor["pattern"], str)
+    
+    assert [c["history"] for c in interned_eval.contexts] == [c["history"] for c in plain_eval.contexts]
+    assert list(HistoryStore.replay(tmp_path / "interned.jsonl")) == \
+        list(HistoryStore.replay(tmp_path / "plain.jsonl"))
+
+
+def test_interned_recursive_loop_matches_plain_loop():
+    results = []
+    for intern_patterns in (False, True):
+        loop = RecursiveFieldControlLoop(
+            FakeAsyncModel(RESPONSES, latency=0),
+            field_params={"intern_patterns": intern_patterns, "attractor_threshold": 0.5},
+            max_iterations=3,
+            recursion_depth=0,
+        )
+        for attractor in ATTRACTORS:
+            loop.field.inject(attractor)
+        results.append(loop.run("explain context engineering patterns"))
+    
+    plain, interned = results
+    assert interned["field_state"] == plain["field_state"]
+    assert all(isinstance(a["pattern"], str) for a in interned["field_state"]["attractors"].values())
+
+
+@pytest.mark.parametrize("field_params", [{"backend": "numpy"}, {"lazy_decay": True}])
+def test_recursive_loop_rejects_candidates_on_unforkable_fields(field_params):
+    if field_params.get("backend") == "numpy":
+        pytest.importorskip("numpy")
+    model = FakeAsyncModel(RESPONSES, latency=0)
+    
+    with pytest.raises(ValueError, match="num_candidates"):
+        RecursiveFieldControlLoop(model, field_params=field_params, num_candidates=2)
+    assert model.calls == 0
+    
+    # A single candidate never forks the field
+    loop = RecursiveFieldControlLoop(model, field_params=field_params, max_iterations=1,
+                                     recursion_depth=0)
+    assert loop.run("explain context engineering patterns")["iterations"] == 1
+
+
+def test_field_context_manager_closes_history_log(tmp_path):
+    path = tmp_path / "field.jsonl"
+    with NeuralField(history_path=str(path)) as field:
+        field.inject("a pattern")
+        log_file = field.history._log_file
+        assert not log_file.closed
+    
+    assert log_file.closed
+    assert field.history._log_file is None
+    assert [entry[1] for entry in HistoryStore.replay(path)] == ["a pattern"]
+
+
+def test_reset_closes_the_old_field_history(tmp_path):
+    path = tmp_path / "history.jsonl"
+    loops = [
+        NeuralFieldControlLoop(FakeAsyncModel(RESPONSES, latency=0),
+                               field_params={"history_path": str(path)}, max_iterations=1),
+        RecursiveFieldControlLoop(FakeAsyncModel(RESPONSES, latency=0),
+                                  field_params={"history_path": str(path)}, max_iterations=1,
+                                  recursion_depth=0),
+    ]
+    for loop in loops:
+        loop.field.inject("before reset")
+        old_field = loop.field
+        log_file = old_field.history._log_file
+        
+        loop.reset()
+        
+        assert log_file.closed
+        assert loop.field is not old_field
+        assert loop.field.history.log_path == str(path)
+        loop.field.inject("after reset")
+        loop.field.close()
+    
+    patterns = [entry[1] for entry in HistoryStore.replay(path)]
+    assert patterns == ["before reset", "after reset"] * 2
+
+
+def uniform_decay_field():
+    """Field whose attractor shares no words with any pattern, so decay is uniform."""
+    field = NeuralField(attractor_formation_threshold=10.0)
+    for i, pattern in enumerate(RESPONSES):
+        field.inject(pattern, 0.2 + 0.1 * i)
+    field.attractors["attractor_0"] = {
+        'pattern': "zebra quartz", 'strength': 1.0, 'formation_time': 0, 'basin_width': 0.6
+    }
+    return field
+
+
+def test_uniform_decay_keeps_ranking_and_stability_caches(monkeypatch):
+    field = uniform_decay_field()
+    field.get_context_representation()
+    
+    rebuilds = []
+    original_rebuild = field.ranking.rebuild
+    monkeypatch.setattr(field.ranking, "rebuild", lambda state: rebuilds.append(1) or original_rebuild(state))
+    resonance_calls = []
+    original_resonance = field._calculate_resonance
+    monkeypatch.setattr(field, "_calculate_resonance",
+                        lambda a, b: resonance_calls.append(1) or original_resonance(a, b))
+    
+    field.decay()
+    resonance_calls.clear()  # Decay factors are computed per pattern
+    rendered = field.get_context_representation()
+    
+    assert rebuilds == []
+    assert resonance_calls == []
+    
+    # The cached values match a field that recomputes everything
+    fresh = uniform_decay_field()
+    fresh.decay()
+    assert rendered == fresh.get_context_representation()
+    assert field.ranking.top_k(field.state, 5) == sorted(field.state.items(), key=lambda kv: -kv[1])
+
+
+def test_pruning_decay_drops_removed_patterns():
+    field = uniform_decay_field()
+    field.inject("weak pattern", 0.0125)
+    field.get_context_representation()
+    
+    field.decay()
+    
+    assert "weak pattern" not in field.state
+    assert "weak pattern" not in field.ranking.order
+    assert field._organization_cache is None
+    assert [p for p, _ in field.ranking.top_k(field.state, 10)] == \
+        [p for p, _ in sorted(field.state.items(), key=lambda kv: -kv[1])]
+
+
+def test_resonant_decay_rebuilds_ranking():
+    field = NeuralField(attractor_formation_threshold=0.5)
+    for pattern in ATTRACTORS + RESPONSES:
+        field.inject(pattern, 1.0)
+    field.get_context_representation()
+    assert field.attractors
+    
+    field.decay()
+    
+    assert field.ranking.dirty
+    assert field.ranking.top_k(field.state, 5) == \
+        sorted(field.state.items(), key=lambda kv: -kv[1])[:5]
+
+
+def run_random_field(seed, steps=40, **params):
+    """Drive a field through a seeded mix of injections and decays."""
+    rng = random.Random(seed)
+    words = "context field attractor pattern resonance memory token signal noise drift".split()
+    field = NeuralField(attractor_formation_threshold=0.9, decay_rate=0.1, **params)
+    for _ in range(steps):
+        for _ in range(rng.randint(0, 3)):
+            field.inject(" ".join(rng.sample(words, 3)), rng.uniform(0.1, 1.2))
+        field.decay()
+    return field
+
+
+@pytest.mark.parametrize("sweep_interval", [1, 3, 10])
+def test_lazy_decay_tracks_eager_decay(sweep_interval):
+    for seed in range(2):
+        eager = run_random_field(seed)
+        lazy = run_random_field(seed, lazy_decay=True, sweep_interval=sweep_interval)
+        
+        # Documented tolerance: floating-point rounding of the closed form
+        assert lazy.get_attractors() == [
+            (pattern, pytest.approx(strength, rel=1e-12)) for pattern, strength in eager.get_attractors()
+        ]
+        assert list(lazy.state) == list(eager.state)
+        for pattern, strength in eager.state.items():
+            assert lazy.state[pattern] == pytest.approx(strength, rel=1e-12)
+
+
+def test_lazy_state_size_and_iteration_skip_the_power(monkeypatch):
+    field = run_random_field(0, lazy_decay=True, sweep_interval=10)
+    state = field.state
+    live = [p for p in state._values if state._current(p) is not None]
+    
+    def fail(pattern):
+        raise AssertionError("decayed value computed")
+    monkeypatch.setattr(state, "_current", fail)
+    
+    assert len(state) == len(live)
+    assert list(state) == live
+    assert all(p in state for p in live)
@@ -0,0 +1,47 @@
+"""Tests for the shared token counters."""
+
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+import control_loop
+import scoring_functions
+
+
+class SlowLookupDict(OrderedDict):
+    """LRU storage that yields to other threads right after each lookup."""
+    
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        time.sleep(0.0001)
+        return value
+
+
+@pytest.mark.parametrize("module", [control_loop, scoring_functions])
+def test_token_counter_is_thread_safe(module):
+    counter = module.TokenCounter(cache_size=4)
+    counter._cache = SlowLookupDict()
+    texts = [f"text number {i}" for i in range(6)]
+    errors = []
+    
+    def worker(offset):
+        try:
+            for i in range(60):
+                counter.count(texts[(i + offset) % len(texts)])
+            counter.count_batch(texts)
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    info = counter.cache_info()
+    assert info["size"] <= 4
+    assert info["hits"] + info["misses"] == 8 * (60 + len(texts))
+    assert counter.count_batch(texts) == [counter.count(text) for text in texts]